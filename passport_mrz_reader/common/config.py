@@ -0,0 +1,123 @@
+"""A configuration of the whole pipeline saved as a JSON file, so a
+configuration chosen by test_suite/autotune.py can be used without copying
+its options into code:
+
+    preprocessors, engine, postprocessors = load_config(path)
+    mrz_text = process(image, preprocessors, engine, postprocessors)
+
+The file holds the name and options of the engine, and the options of the
+pre- and post-processors that are set. Anything else in it, like the
+accuracy and latency it was measured with, is kept for reference and ignored
+when loading.
+"""
+
+import json
+import os
+from dataclasses import asdict
+from typing import Optional
+
+from passport_mrz_reader.common.engines import (
+    DeepLearning,
+    EasyOcr,
+    Template,
+    Tesseract,
+)
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+)
+
+CONFIG_PATH = f"{os.path.dirname(__file__)}/config.json"
+ENGINES = {
+    "tesseract": Tesseract,
+    "easyocr": EasyOcr,
+    "deeplearning": DeepLearning,
+    "template": Template,
+}
+
+
+def engine_name(engine: Engine) -> str:
+    """The name of the engine in ENGINES"""
+    for name, engine_type in ENGINES.items():
+        if isinstance(engine, engine_type):
+            return name
+    raise ValueError(f"Unknown engine {type(engine).__name__}")
+
+
+def _set_options(options) -> dict:
+    """The options of a pre- or post-processor configuration that are set"""
+    return {
+        name: value
+        for name, value in asdict(options).items()
+        if value is not None
+    }
+
+
+def config_to_dict(
+    config: tuple[PreProcessors, Engine, PostProcessors],
+    measured: Optional[dict] = None,
+) -> dict:
+    """The JSON object of a configuration
+
+    Args:
+        config: tuple of (pre-processors, engine, post-processors)
+        measured: What the configuration was measured to do, kept for
+            reference only
+    """
+    preprocessors, engine, postprocessors = config
+    config_dict = {
+        "engine": engine_name(engine),
+        "engine_options": dict(engine.options),
+        "preprocessors": _set_options(preprocessors),
+        "postprocessors": _set_options(postprocessors),
+    }
+    if measured is not None:
+        config_dict["measured"] = measured
+    return config_dict
+
+
+def config_from_dict(
+    config_dict: dict,
+) -> tuple[PreProcessors, Engine, PostProcessors]:
+    """The configuration of a JSON object made by config_to_dict"""
+    if config_dict["engine"] not in ENGINES:
+        raise ValueError(f"Unknown engine {config_dict['engine']}")
+    try:
+        return (
+            PreProcessors(**config_dict.get("preprocessors", {})),
+            ENGINES[config_dict["engine"]](
+                config_dict.get("engine_options", {})
+            ),
+            PostProcessors(**config_dict.get("postprocessors", {})),
+        )
+    except TypeError as error:
+        raise ValueError(f"Invalid configuration: {error}") from error
+
+
+def load_config(
+    path: str = CONFIG_PATH,
+) -> tuple[PreProcessors, Engine, PostProcessors]:
+    """Load a configuration saved by save_config, ready to pass to process
+
+    Returns: tuple of (pre-processors, engine, post-processors)
+    """
+    with open(path, encoding="utf-8") as file:
+        return config_from_dict(json.load(file))
+
+
+def save_config(
+    config: tuple[PreProcessors, Engine, PostProcessors],
+    path: str = CONFIG_PATH,
+    measured: Optional[dict] = None,
+):
+    """Save a configuration
+
+    Args:
+        config: tuple of (pre-processors, engine, post-processors)
+        path: The JSON file to save to
+        measured: What the configuration was measured to do, kept for
+            reference only
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(config_to_dict(config, measured), file, indent=2)
@@ -1,12 +1,15 @@
 """
-The engines capable of doing the main OCR task
+The engines capable of doing the main OCR task.
+
+The modules doing the OCR are imported when an engine is first used, since
+importing them loads their models.
 """
+
+# pylint: disable=import-outside-toplevel
+import importlib
 from typing import TypedDict, Optional
 
 from passport_mrz_reader.common.interfaces import PostProcessorMetadata, Engine
-from passport_mrz_reader.pure_tesseract import tesseract_predict
-from passport_mrz_reader.easy_ocr import easy_ocr_predict
-from passport_mrz_reader.deep_learning import tensor_flow_predictor
 
 
 class TesseractOptions(TypedDict):
@@ -19,10 +22,19 @@ class Tesseract(Engine):
     def __init__(self, options: TesseractOptions):
         self.options = options
 
+    def load(self, threads: Optional[int] = None):
+        """Import the Tesseract wrapper, Tesseract itself runs in its own
+        process"""
+        importlib.import_module(
+            "passport_mrz_reader.pure_tesseract.tesseract_predict"
+        )
+
     def get_mrz_text(
         self, original_image, preprocessed_image, verbose=False
     ) -> Optional[tuple[str, PostProcessorMetadata]]:
         """Get the raw MRZ text using Tesseract"""
+        from passport_mrz_reader.pure_tesseract import tesseract_predict
+
         return tesseract_predict.get_raw_mrz_text(
             original_image, preprocessed_image, verbose=verbose
         )
@@ -38,18 +50,33 @@ class EasyOcr(Engine):
     def __init__(self, options: EasyOcrOptions):
         self.options = options
 
+    def load(self, threads: Optional[int] = None):
+        """Load the EasyOCR reader"""
+        importlib.import_module(
+            "passport_mrz_reader.easy_ocr.easy_ocr_predict"
+        )
+
     def get_mrz_text(
         self, original_image, preprocessed_image, verbose=False
     ) -> Optional[tuple[str, PostProcessorMetadata]]:
         """Get the raw MRZ text using EasyOcr"""
+        from passport_mrz_reader.easy_ocr import easy_ocr_predict
+
         return easy_ocr_predict.get_raw_mrz_text(
             original_image, preprocessed_image, verbose=verbose
         )
 
 
-class DeepLearningOptions(TypedDict):
+class DeepLearningOptions(TypedDict, total=False):
     """Options for DeepLearning engine"""
 
+    backend: str
+    """Either "keras" (default) for the Keras model, or "tflite" for the
+    TensorFlow Lite export of it, which does not need full TensorFlow"""
+    model_path: str
+    """Path of the model for the backend, if not the default model. Any model
+    trained by deep_learning/training.py can be used"""
+
 
 class DeepLearning(Engine):
     """OCR engine using custom deeplearning model with TensorFlow"""
@@ -57,10 +84,84 @@ class DeepLearning(Engine):
     def __init__(self, options: DeepLearningOptions):
         self.options = options
 
+    def load(self, threads: Optional[int] = None):
+        """Load the model of the backend"""
+        if self.options.get("backend", "keras") == "tflite":
+            from passport_mrz_reader.deep_learning import tflite_predictor
+
+            tflite_predictor.load_classifier(
+                self.options.get(
+                    "model_path", tflite_predictor.TFLITE_MODEL_PATH
+                )
+            )
+            return
+        from passport_mrz_reader.deep_learning import tensor_flow_predictor
+
+        tensor_flow_predictor.load_model(
+            self.options.get("model_path", tensor_flow_predictor.MODEL_PATH),
+            threads,
+        )
+
     def get_mrz_text(
         self, original_image, preprocessed_image, verbose=False
     ) -> Optional[tuple[str, PostProcessorMetadata]]:
         """Get the raw MRZ using TensorFlow deeplearning"""
+        if self.options.get("backend", "keras") == "tflite":
+            from passport_mrz_reader.deep_learning import tflite_predictor
+
+            return tflite_predictor.make_prediction(
+                original_image,
+                preprocessed_image,
+                verbose,
+                self.options.get(
+                    "model_path", tflite_predictor.TFLITE_MODEL_PATH
+                ),
+            )
+        from passport_mrz_reader.deep_learning import tensor_flow_predictor
+
         return tensor_flow_predictor.make_prediction(
-            original_image, preprocessed_image, verbose
+            original_image,
+            preprocessed_image,
+            verbose,
+            self.options.get("model_path", tensor_flow_predictor.MODEL_PATH),
+        )
+
+
+class TemplateOptions(TypedDict, total=False):
+    """Options for the Template engine"""
+
+    templates_path: str
+    """Path of the templates, if not the default templates. Any templates
+    built by template_matching/build_templates.py can be used"""
+
+
+class Template(Engine):
+    """OCR engine matching the characters found by the character separator
+    against a template of every MRZ character, needing only NumPy and
+    OpenCV"""
+
+    def __init__(self, options: TemplateOptions):
+        self.options = options
+
+    def load(self, threads: Optional[int] = None):
+        """Load the templates"""
+        from passport_mrz_reader.template_matching import template_predict
+
+        template_predict.load_templates(
+            self.options.get("templates_path", template_predict.TEMPLATES_PATH)
+        )
+
+    def get_mrz_text(
+        self, original_image, preprocessed_image, verbose=False
+    ) -> Optional[tuple[str, PostProcessorMetadata]]:
+        """Get the raw MRZ text by matching templates"""
+        from passport_mrz_reader.template_matching import template_predict
+
+        return template_predict.get_raw_mrz_text(
+            original_image,
+            preprocessed_image,
+            verbose,
+            self.options.get(
+                "templates_path", template_predict.TEMPLATES_PATH
+            ),
         )
@@ -1,57 +1,89 @@
 """This module is used to find the MRZ region in a passport image."""
 
+from typing import Optional
+
 import numpy as np
 import cv2
-from PIL import Image
 import imutils
+from imutils.contours import sort_contours
 
-from mrz_common import display_if_verbose, print_if_verbose
+from passport_mrz_reader.common.interfaces import RegionOfInterest
+from passport_mrz_reader.common.mrz_common import (
+    display_if_verbose,
+    print_if_verbose,
+)
+from passport_mrz_reader.utils.image_loading import TARGET_WIDTH, load_image
 
+# A page is searched for MRZ blocks at this width
+PAGE_WIDTH = TARGET_WIDTH
+# A line of an MRZ is at least this many times wider than high, and at least
+# this share of the page width
+MIN_LINE_ASPECT = 10
+MIN_LINE_WIDTH = 0.1
+# The lines of a block start at most this share of their width apart
+# horizontally, their widths differ at most by this share, and they are at
+# most this many line heights apart vertically
+LINE_ALIGNMENT = 0.1
+LINE_GAP = 2.0
+# The number of lines of an MRZ, TD2 and TD3 have two and TD1 three
+MRZ_LINE_COUNTS = (2, 3)
+# The margin around a block, in line heights
+BLOCK_MARGIN = 1.0
 
-def find_mrz_region(image_url, verbose=False):
-    """Find the region of the image that contains the MRZ.
-    Assumes that the image is a passport with two MRZ lines with
-    44 characters each.
-    Arg:
-        image_url: URL of the image
-        verbose: Whether to print debug information and display images
-    """
-    image = np.asarray(Image.open(image_url))
-    display_if_verbose("Original image", Image.fromarray(image), verbose)
-    image = imutils.resize(image, width=1200)
-    display_if_verbose("Resized image", Image.fromarray(image), verbose)
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-    # change to binary image, set threshold according to the darkest
-    # area of the image
-    threshold = np.percentile(gray, 1.5)
-    gray = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)[1]
-    display_if_verbose("Binary image", Image.fromarray(gray), verbose)
-    (H, W) = gray.shape
 
+def _text_line_mask(gray, verbose=False):
+    """A binary image where every line of text is a white blob"""
     rect_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 7))
     # Smooth the image using a 3x3 Gaussian blur and then apply a
     # blackhat morpholigical operator to find dark regions on a light
     # background
     gray = cv2.GaussianBlur(gray, (3, 3), 0)
     blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, rect_kernel)
-    display_if_verbose("Blackhat image", Image.fromarray(blackhat), verbose)
-
-    image = cv2.GaussianBlur(image, (3, 3), 0)
+    display_if_verbose("Blackhat image", blackhat, verbose)
 
     # Compute the Scharr gradient of the blackhat image and scale the
     # result into the range [0, 255]
     grad = cv2.Sobel(blackhat, ddepth=cv2.CV_32F, dx=1, dy=0, ksize=-1)
     grad = np.absolute(grad)
     (min_val, max_val) = (np.min(grad), np.max(grad))
-    grad = (grad - min_val) / (max_val - min_val)
+    grad = (grad - min_val) / max(max_val - min_val, 1e-6)
     grad = (grad * 255).astype("uint8")
-    display_if_verbose("After min max scaling", Image.fromarray(grad), verbose)
+    display_if_verbose("After min max scaling", grad, verbose)
 
     # Apply a closing operation using the rectangular kernel to close
     # gaps in between letters -- then apply Otsu's thresholding method
     grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, rect_kernel)
-    thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-    display_if_verbose("Rect close", Image.fromarray(thresh), verbose)
+    thresh = cv2.threshold(
+        grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU
+    )[1]
+    display_if_verbose("Rect close", thresh, verbose)
+    return thresh
+
+
+def locate_mrz(image, verbose=False) -> Optional[RegionOfInterest]:
+    """Find the region of the image that contains the MRZ.
+    Assumes that the image is a passport with two MRZ lines with
+    44 characters each.
+    Arg:
+        image: The passport image
+        verbose: Whether to print debug information and display images
+    Returns: The region in pixels of the image, or None if the MRZ could
+        not be found
+    """
+    display_if_verbose("Original image", image, verbose)
+    # The size of the region in the resized image, relative to the image
+    scale = image.shape[1] / TARGET_WIDTH
+    original_shape = image.shape
+    image = imutils.resize(image, width=TARGET_WIDTH)
+    display_if_verbose("Resized image", image, verbose)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # change to binary image, set threshold according to the darkest
+    # area of the image
+    threshold = np.percentile(gray, 1.5)
+    gray = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)[1]
+    display_if_verbose("Binary image", gray, verbose)
+    (H, W) = gray.shape
+    thresh = _text_line_mask(gray, verbose)
 
     # find contours in the thresholded image and sort them from bottom
     # to top (since the MRZ will always be at the bottom of the passport)
@@ -60,7 +92,10 @@ def find_mrz_region(image_url, verbose=False):
         thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
     )
     contours = imutils.grab_contours(contours)
-    contours = cv2.sort_contours(contours, method="bottom-to-top")[0]
+    if not contours:
+        print_if_verbose("MRZ could not be found", verbose)
+        return None
+    contours = sort_contours(contours, method="bottom-to-top")[0]
     mrz_boxes = []
     for contour in contours:
         # compute the bounding box of the contour and then derive the
@@ -80,28 +115,114 @@ def find_mrz_region(image_url, verbose=False):
         print_if_verbose("MRZ could not be found", verbose)
         return None
     # pad the bounding box since we applied erosions and now need to
-    # re-grow it
-    mrz_lines = []
+    # re-grow it, and take the box around both lines
+    padded = []
     for (x, y, w, h) in mrz_boxes:
         pX = int((x + w) * 0.03)
         pY = int((y + h) * 0.03)
-        (x, y) = (x - pX, y - pY)
-        (w, h) = (w + (pX * 2), h + (pY * 2))
-        # extract the padded MRZ from the image
-        mrz_line = image[y : y + h, x : x + w]
-        mrz_lines.append(mrz_line)
-    # fit to common witdh
-    max_width = max(mrz_line.shape[1] for mrz_line in mrz_lines)
-    try:
-        mrz_lines = [
-            imutils.resize(mrz_line, width=max_width) for mrz_line in mrz_lines
-        ][::-1]
-    except (ZeroDivisionError, cv2.error):
-        # One of the witdhs is 0 or max_width is None
+        padded.append((x - pX, y - pY, x + w + pX, y + h + pY))
+    left, top = np.min(padded, axis=0)[:2]
+    right, bottom = np.max(padded, axis=0)[2:]
+    roi = RegionOfInterest(
+        int(left * scale),
+        int(top * scale),
+        int(np.ceil((right - left) * scale)),
+        int(np.ceil((bottom - top) * scale)),
+    ).clamp(original_shape)
+    if roi.width == 0 or roi.height == 0:
         print_if_verbose("MRZ could not be found", verbose)
         return None
-    # stack images
-    mrz_region = np.vstack(mrz_lines)
-    display_if_verbose("Whole MRZ region", Image.fromarray(mrz_region))
-    Image.fromarray(mrz_region).save(f"MRZPART/{image_url.split('/')[-1]}")
+    return roi
+
+
+def _continues(line, previous) -> bool:
+    """Whether the (x, y, w, h) line is the line after the previous line of
+    the same MRZ"""
+    x, y, w, h = line
+    prev_x, prev_y, prev_w, prev_h = previous
+    return (
+        abs(x - prev_x) <= LINE_ALIGNMENT * max(w, prev_w)
+        and abs(w - prev_w) <= LINE_ALIGNMENT * max(w, prev_w)
+        and 0 <= y - (prev_y + prev_h) <= LINE_GAP * max(h, prev_h)
+    )
+
+
+def find_mrz_blocks(
+    image, width: int = PAGE_WIDTH, verbose=False
+) -> list[RegionOfInterest]:
+    """Find every MRZ in an image of a page with any number of documents,
+    in a single pass over the page resized to the width.
+
+    Every long, thin line of text is chained to the line right below it if
+    both are aligned and of the same width. A chain of two or three lines is
+    an MRZ, longer chains are paragraphs of other text.
+
+    Args:
+        image: The page image
+        width: The width the page is searched at
+        verbose: Whether to print debug information and display images
+    Returns: The region in pixels of the image of every MRZ, from the top
+        left of the page
+    """
+    scale = image.shape[1] / width
+    small = imutils.resize(image, width=width)
+    gray = (
+        cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    )
+    thresh = _text_line_mask(gray, verbose)
+    contours = imutils.grab_contours(
+        cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    )
+    lines = sorted(
+        (
+            box
+            for box in map(cv2.boundingRect, contours)
+            if box[2] >= MIN_LINE_ASPECT * box[3]
+            and box[2] >= MIN_LINE_WIDTH * width
+        ),
+        key=lambda box: box[1],
+    )
+    chains: list[list[tuple]] = []
+    for line in lines:
+        for chain in chains:
+            if _continues(line, chain[-1]):
+                chain.append(line)
+                break
+        else:
+            chains.append([line])
+
+    blocks = []
+    for chain in chains:
+        if len(chain) not in MRZ_LINE_COUNTS:
+            continue
+        boxes = np.array(chain)
+        margin = BLOCK_MARGIN * boxes[:, 3].mean()
+        left, top = boxes[:, :2].min(axis=0) - margin
+        right, bottom = (boxes[:, :2] + boxes[:, 2:]).max(axis=0) + margin
+        roi = RegionOfInterest(
+            int(left * scale),
+            int(top * scale),
+            int(np.ceil((right - left) * scale)),
+            int(np.ceil((bottom - top) * scale)),
+        ).clamp(image.shape)
+        if roi.width > 0 and roi.height > 0:
+            blocks.append(roi)
+    blocks.sort(key=lambda roi: (roi.y, roi.x))
+    print_if_verbose(f"Found {len(blocks)} MRZ blocks: {blocks}", verbose)
+    return blocks
+
+
+def find_mrz_region(image_url, verbose=False):
+    """Find the region of the image that contains the MRZ, see locate_mrz.
+    Arg:
+        image_url: Path of the image
+        verbose: Whether to print debug information and display images
+    Returns: The MRZ region of the image, or None if it could not be found
+    """
+    image = load_image(image_url)
+    roi = locate_mrz(image, verbose)
+    if roi is None:
+        return None
+    mrz_region = roi.crop(image)
+    display_if_verbose("Whole MRZ region", mrz_region, verbose)
     return mrz_region
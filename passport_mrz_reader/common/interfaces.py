@@ -3,6 +3,8 @@ import abc
 from dataclasses import dataclass
 from typing import Optional
 
+import numpy as np
+
 
 @dataclass
 class PreProcessors:
@@ -11,6 +13,53 @@ class PreProcessors:
     grayscale: Optional[bool] = None
     threshold: Optional[int] = None
     variable_threshold: Optional[bool] = None
+    deskew: Optional[bool] = None
+    adaptive_threshold: Optional[str] = None
+    """Binarise with a local threshold instead of a percentile of the whole
+    image, either "sauvola" or "gaussian". Overrides threshold."""
+    locate_mrz: Optional[bool] = None
+    """Find the MRZ in the image, and only process that region, unless a
+    region of interest is given to process"""
+    quality_gate: Optional[bool] = None
+    """Reject images that are too blurry, covered in glare or without a line
+    of text before reading them, see quality_gate.check_quality. The
+    reason code is the failure of the result."""
+
+
+@dataclass(frozen=True)
+class RegionOfInterest:
+    """A rectangle of an image in pixels, like the MRZ found by
+    find_mrz_region.locate_mrz or in a previous frame"""
+
+    x: int
+    y: int
+    width: int
+    height: int
+
+    def clamp(self, image_shape) -> "RegionOfInterest":
+        """The part of the region that is inside an image of the shape"""
+        x, y = max(self.x, 0), max(self.y, 0)
+        right = min(self.x + self.width, image_shape[1])
+        bottom = min(self.y + self.height, image_shape[0])
+        return RegionOfInterest(x, y, max(right - x, 0), max(bottom - y, 0))
+
+    def crop(self, image):
+        """The region of the image, as a view without copying"""
+        return image[
+            self.y : self.y + self.height, self.x : self.x + self.width
+        ]
+
+    def to_image(self, boxes, scale: float) -> np.ndarray:
+        """Map (x, y, width, height) boxes from the resized region the
+        engines work on back to pixels of the whole image
+
+        Args:
+            boxes: The boxes in the resized region
+            scale: Width of the region divided by the width it was resized to
+        """
+        boxes = np.asarray(boxes, dtype=float) * scale
+        boxes[..., :2] += (self.x, self.y)
+        return boxes
 
 
 @dataclass
@@ -27,6 +76,33 @@ class PostProcessorMetadata:
     """Metadata generated by the engine for the postprocessors"""
 
     box_heights: Optional[list[float]] = None
+    """The height of the box of every character, not counting line breaks.
+    process_result scales them to pixels of the original image."""
+    boxes: Optional[np.ndarray] = None
+    """The (x, y, width, height) box of every character, one per row, if the
+    engine gives any. The engines give them in the image they read, resized
+    to the width they work at, and process_result maps them to pixels of the
+    original image."""
+    skew_angle: Optional[float] = None
+    roi: Optional[RegionOfInterest] = None
+    """The region of the original image that was processed"""
+    scale: Optional[float] = None
+    """Width of the processed image divided by the width the engines resize
+    it to, which the boxes and box heights were multiplied by"""
+    threshold: Optional[int] = None
+    """The percentile threshold the text was read at, when the engine tried
+    a variable threshold"""
+    attempts: Optional[int] = None
+    """The number of times the engine tried to read the text"""
+    confidences: Optional[list[float]] = None
+    """The confidence of every character of the text, not counting line
+    breaks, if the engine gives any"""
+    line_confidences: Optional[list[float]] = None
+    """The confidence of every line of the text, if the engine reads whole
+    lines"""
+    line_ids: Optional[list[int]] = None
+    """The line of every character of the text, not counting line breaks,
+    counting from 0 at the top, if the engine finds the lines itself"""
 
 
 class Engine(abc.ABC):
@@ -37,3 +113,13 @@ class Engine(abc.ABC):
         self, image, verbose=False
     ) -> Optional[tuple[str, PostProcessorMetadata]]:
         """Read the MRZ text from an image, and generate metadata for postprocessing"""
+
+    def load(self, threads: Optional[int] = None):
+        """Load the models of the engine, which otherwise happens on the
+        first call. Loading before forking worker processes lets the workers
+        share the models.
+
+        Args:
+            threads: The threads the libraries of the engine may use, set
+                when they are initialised, unlimited if None
+        """
@@ -1,7 +1,9 @@
 """Contains common constants and helper functions to be used
 by the other scripts in this directory.
 """
+import numpy as np
 from IPython.display import display
+from PIL import Image
 
 # Constants
 
@@ -47,6 +49,10 @@ def print_if_verbose(text: str, verbose: bool):
 
 
 def display_if_verbose(image_title: str, image, verbose: bool):
-    """Displays the image if verbose is True."""
+    """Displays the image if verbose is True. An array is only turned into
+    a PIL image when it is displayed, which copies color images, so pass
+    arrays rather than PIL images made from them."""
     if verbose:
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
         display(image_title, image)
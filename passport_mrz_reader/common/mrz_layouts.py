@@ -0,0 +1,310 @@
+"""The layouts of machine readable zones: TD1 (ID cards, three lines of 30
+characters), TD2 (two lines of 36) and TD3 (passports, two lines of 44).
+
+Every layout is compiled once into translation tables for the fields that
+only hold letters or only digits, a pattern per line, and the positions of
+the check digits. Postprocessing and validation of a text is then a single
+pass over every line, and the layout is detected from the number of lines and
+their length.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+from passport_mrz_reader.common.mrz_common import (
+    MRZ_CHARACTERS,
+    MRZ_LETTERS,
+    MRZ_NUMBERS,
+    MRZ_REPLACEMENTS,
+)
+
+ALPHA = "alpha"
+NUMERIC = "numeric"
+MIXED = "mixed"
+
+# Digits replaced by the letters they are mistaken for, and the other way
+_TO_LETTERS = str.maketrans(
+    {
+        number: letter
+        for number, letter in MRZ_REPLACEMENTS.items()
+        if number in MRZ_NUMBERS
+    }
+)
+_TO_NUMBERS = str.maketrans(
+    {
+        letter: number
+        for letter, number in MRZ_REPLACEMENTS.items()
+        if letter in MRZ_LETTERS
+    }
+)
+_PATTERNS = {ALPHA: "[A-Z<]", NUMERIC: "[0-9]", MIXED: "[A-Z0-9<]"}
+_CHECK_WEIGHTS = (7, 3, 1)
+_CHARACTER_VALUES = {
+    character: (0 if character == "<" else MRZ_CHARACTERS.index(character))
+    for character in MRZ_CHARACTERS
+}
+
+# Lines this short are noise, not a line of the MRZ
+MIN_LINE_LENGTH = 10
+
+
+@dataclass(frozen=True)
+class Field:
+    """A field of a line, from start up to end, holding only letters, only
+    digits or both"""
+
+    name: str
+    row: int
+    start: int
+    end: int
+    kind: str
+    may_be_filler: bool = False
+    """Whether a numeric field may be < instead, for an empty optional
+    field"""
+
+
+@dataclass(frozen=True)
+class CheckDigit:
+    """A check digit and the (row, start, end) ranges it is computed over"""
+
+    name: str
+    row: int
+    index: int
+    ranges: tuple[tuple[int, int, int], ...]
+    may_be_filler: bool = False
+    """Whether the digit and its data may all be <, for an empty optional
+    field"""
+
+
+def _field_pattern(mrz_field: Field) -> str:
+    """The regular expression matching the field"""
+    characters = (
+        "[0-9<]" if mrz_field.may_be_filler else _PATTERNS[mrz_field.kind]
+    )
+    return f"{characters}{{{mrz_field.end - mrz_field.start}}}"
+
+
+def check_digit(data: str) -> int:
+    """The check digit of the data, as defined by ICAO 9303"""
+    return (
+        sum(
+            _CHARACTER_VALUES[character] * _CHECK_WEIGHTS[index % 3]
+            for index, character in enumerate(data)
+        )
+        % 10
+    )
+
+
+@dataclass(frozen=True)
+class MrzLayout:
+    """A layout of a machine readable zone, compiled when created"""
+
+    name: str
+    line_count: int
+    line_length: int
+    fields: tuple[Field, ...]
+    check_digits: tuple[CheckDigit, ...]
+    name_row: int
+    """The line with the name, which is padded with < to the line length"""
+    _translations: tuple = field(init=False, repr=False, compare=False)
+    _patterns: tuple = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # (start, end, table) of every field that is translated, per line
+        translations = tuple(
+            tuple(
+                (
+                    mrz_field.start,
+                    mrz_field.end,
+                    _TO_LETTERS if mrz_field.kind == ALPHA else _TO_NUMBERS,
+                )
+                for mrz_field in self.fields
+                if mrz_field.row == row and mrz_field.kind != MIXED
+            )
+            for row in range(self.line_count)
+        )
+        patterns = tuple(
+            re.compile(
+                "".join(
+                    _field_pattern(mrz_field)
+                    for mrz_field in sorted(
+                        (
+                            mrz_field
+                            for mrz_field in self.fields
+                            if mrz_field.row == row
+                        ),
+                        key=lambda mrz_field: mrz_field.start,
+                    )
+                )
+            )
+            for row in range(self.line_count)
+        )
+        # The dataclass is frozen, so the compiled state is set directly
+        object.__setattr__(self, "_translations", translations)
+        object.__setattr__(self, "_patterns", patterns)
+
+    def translate(self, lines: list[str]) -> list[str]:
+        """Replace digits by letters in the fields that only hold letters,
+        and letters by digits in the fields that only hold digits"""
+        translated = []
+        for line, segments in zip(lines, self._translations):
+            parts, position = [], 0
+            for start, end, table in segments:
+                parts.append(line[position:start])
+                parts.append(line[start:end].translate(table))
+                position = end
+            parts.append(line[position:])
+            translated.append("".join(parts))
+        return translated + lines[self.line_count :]
+
+    def validate(self, lines: list[str]) -> list[str]:
+        """The reasons the lines are not a valid MRZ of this layout, empty if
+        they are valid"""
+        if len(lines) != self.line_count:
+            return [f"{self.name} has {self.line_count} lines"]
+        reasons = [
+            f"Line {row + 1} is not {self.line_length} characters"
+            for row, line in enumerate(lines)
+            if len(line) != self.line_length
+        ]
+        if reasons:
+            return reasons
+        reasons = [
+            f"Wrong format for line {row + 1}"
+            for row, (line, pattern) in enumerate(zip(lines, self._patterns))
+            if not pattern.fullmatch(line)
+        ]
+        for digit in self.check_digits:
+            data = "".join(
+                lines[row][start:end] for row, start, end in digit.ranges
+            )
+            expected = lines[digit.row][digit.index]
+            if digit.may_be_filler and set(data + expected) == {"<"}:
+                continue
+            if not expected.isdigit() or int(expected) != check_digit(data):
+                reasons.append(f"Check digit of {digit.name} failed")
+        return reasons
+
+
+TD1 = MrzLayout(
+    name="TD1",
+    line_count=3,
+    line_length=30,
+    fields=(
+        Field("document_type", 0, 0, 2, ALPHA),
+        Field("issuing_state", 0, 2, 5, ALPHA),
+        Field("document_number", 0, 5, 14, MIXED),
+        Field("document_number_hash", 0, 14, 15, NUMERIC),
+        Field("optional_data_1", 0, 15, 30, MIXED),
+        Field("birth_date", 1, 0, 6, NUMERIC),
+        Field("birth_date_hash", 1, 6, 7, NUMERIC),
+        Field("sex", 1, 7, 8, MIXED),
+        Field("expiry_date", 1, 8, 14, NUMERIC),
+        Field("expiry_date_hash", 1, 14, 15, NUMERIC),
+        Field("nationality", 1, 15, 18, ALPHA),
+        Field("optional_data_2", 1, 18, 29, MIXED),
+        Field("final_hash", 1, 29, 30, NUMERIC),
+        Field("full_name", 2, 0, 30, ALPHA),
+    ),
+    check_digits=(
+        CheckDigit("document number", 0, 14, ((0, 5, 14),)),
+        CheckDigit("birth date", 1, 6, ((1, 0, 6),)),
+        CheckDigit("expiry date", 1, 14, ((1, 8, 14),)),
+        CheckDigit(
+            "composite",
+            1,
+            29,
+            ((0, 5, 30), (1, 0, 7), (1, 8, 15), (1, 18, 29)),
+        ),
+    ),
+    name_row=2,
+)
+
+TD2 = MrzLayout(
+    name="TD2",
+    line_count=2,
+    line_length=36,
+    fields=(
+        Field("document_type", 0, 0, 2, ALPHA),
+        Field("issuing_state", 0, 2, 5, ALPHA),
+        Field("full_name", 0, 5, 36, ALPHA),
+        Field("document_number", 1, 0, 9, MIXED),
+        Field("document_number_hash", 1, 9, 10, NUMERIC),
+        Field("nationality", 1, 10, 13, ALPHA),
+        Field("birth_date", 1, 13, 19, NUMERIC),
+        Field("birth_date_hash", 1, 19, 20, NUMERIC),
+        Field("sex", 1, 20, 21, MIXED),
+        Field("expiry_date", 1, 21, 27, NUMERIC),
+        Field("expiry_date_hash", 1, 27, 28, NUMERIC),
+        Field("optional_data", 1, 28, 35, MIXED),
+        Field("final_hash", 1, 35, 36, NUMERIC),
+    ),
+    check_digits=(
+        CheckDigit("document number", 1, 9, ((1, 0, 9),)),
+        CheckDigit("birth date", 1, 19, ((1, 13, 19),)),
+        CheckDigit("expiry date", 1, 27, ((1, 21, 27),)),
+        CheckDigit("composite", 1, 35, ((1, 0, 10), (1, 13, 20), (1, 21, 35))),
+    ),
+    name_row=0,
+)
+
+TD3 = MrzLayout(
+    name="TD3",
+    line_count=2,
+    line_length=44,
+    fields=(
+        Field("document_type", 0, 0, 2, ALPHA),
+        Field("issuing_state", 0, 2, 5, ALPHA),
+        Field("full_name", 0, 5, 44, ALPHA),
+        Field("document_number", 1, 0, 9, MIXED),
+        Field("document_number_hash", 1, 9, 10, NUMERIC),
+        Field("nationality", 1, 10, 13, ALPHA),
+        Field("birth_date", 1, 13, 19, NUMERIC),
+        Field("birth_date_hash", 1, 19, 20, NUMERIC),
+        Field("sex", 1, 20, 21, MIXED),
+        Field("expiry_date", 1, 21, 27, NUMERIC),
+        Field("expiry_date_hash", 1, 27, 28, NUMERIC),
+        Field("optional_data", 1, 28, 42, MIXED),
+        Field("optional_data_hash", 1, 42, 43, NUMERIC, may_be_filler=True),
+        Field("final_hash", 1, 43, 44, NUMERIC),
+    ),
+    check_digits=(
+        CheckDigit("document number", 1, 9, ((1, 0, 9),)),
+        CheckDigit("birth date", 1, 19, ((1, 13, 19),)),
+        CheckDigit("expiry date", 1, 27, ((1, 21, 27),)),
+        CheckDigit("optional data", 1, 42, ((1, 28, 42),), may_be_filler=True),
+        CheckDigit("composite", 1, 43, ((1, 0, 10), (1, 13, 20), (1, 21, 43))),
+    ),
+    name_row=0,
+)
+
+LAYOUTS = (TD1, TD2, TD3)
+
+
+def mrz_lines(mrz_text: str) -> list[str]:
+    """The lines of an MRZ text, without lines too short to be MRZ lines"""
+    return [
+        line for line in mrz_text.splitlines() if len(line) > MIN_LINE_LENGTH
+    ]
+
+
+def detect_layout(lines: list[str]) -> Optional[MrzLayout]:
+    """Detect the layout from the number of lines first, and only then from
+    the length of the longest line, when several layouts have that many
+    lines. A line length halfway between two layouts is taken as the longer
+    one, as OCR drops characters more often than it adds them. None if no
+    layout has that many lines."""
+    candidates = [
+        layout for layout in LAYOUTS if layout.line_count == len(lines)
+    ]
+    if not candidates:
+        return None
+    longest = max(len(line) for line in lines)
+    return min(
+        candidates,
+        key=lambda layout: (
+            abs(layout.line_length - longest),
+            -layout.line_length,
+        ),
+    )
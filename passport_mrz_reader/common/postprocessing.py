@@ -2,138 +2,135 @@
 MRZ fields and line lengths"""
 from typing import Optional
 
+import numpy as np
+
 from passport_mrz_reader.common.mrz_common import (
     MRZ_LETTERS,
     MRZ_NUMBERS,
     MRZ_REPLACEMENTS,
-    PASSPORT_FIELDS,
     print_if_verbose,
 )
+from passport_mrz_reader.common.mrz_layouts import detect_layout, mrz_lines
 from passport_mrz_reader.common.interfaces import (
     PostProcessors,
     PostProcessorMetadata,
 )
 
+# Letters taller than this share of the mean letter height of their line, and
+# digits lower than this share of the mean digit height, are likely mistaken
+HIGH_LETTER_RATIO = 1.15
+LOW_NUMBER_RATIO = 0.85
+
+# Lookup arrays indexed by character code, covering the ASCII characters.
+# Every character is of a kind, other, letter or digit, and the kind selects
+# the ratio to the mean height of its kind and the direction of the outlier.
+_CODES = 128
+_OTHER, _LETTER, _NUMBER = 0, 1, 2
+_KINDS = np.zeros(_CODES, dtype=np.intp)
+_KINDS[[ord(letter) for letter in MRZ_LETTERS]] = _LETTER
+_KINDS[[ord(number) for number in MRZ_NUMBERS]] = _NUMBER
+_RATIOS = np.array([0.0, HIGH_LETTER_RATIO, LOW_NUMBER_RATIO])
+_DIRECTIONS = np.array([0.0, 1.0, -1.0])
+_REPLACEMENT = np.arange(_CODES, dtype=np.uint32)
+for _character, _replacement in MRZ_REPLACEMENTS.items():
+    _REPLACEMENT[ord(_character)] = ord(_replacement)
+_REPLACEABLE = _REPLACEMENT != np.arange(_CODES)
+
 
 def replace_based_on_box_heights(
-    mrz_text: str, box_heights: list[float]
+    mrz_text: str,
+    box_heights: list[float],
+    line_ids: Optional[list[int]] = None,
 ) -> Optional[str]:
     """Replace characters in the MRZ text based on the heights of the boxes
-    that were used to get the raw MRZ text. Looks at the two MRZ lines seperately.
+    that were used to get the raw MRZ text. A letter much taller than the
+    other letters of its line is replaced by the digit it is mistaken for,
+    and a digit much lower than the other digits by the letter. Looks at
+    every MRZ line separately.
 
     Args:
         mrz_text(str): The raw MRZ text
         box_heights(list): The heights of the boxes that were used to get the
-            raw MRZ text
+            raw MRZ text, one for every character not counting line breaks.
+            Characters without a box height are left as they are.
+        line_ids(list): The line of every character, if the engine found the
+            lines, otherwise the lines of the text are used
     """
-    line1, line2 = mrz_text.splitlines()[:2]
-    box_heights1, box_heights2 = box_heights[:44], box_heights[44:]
-    for line, box_heights in zip([line1, line2], [box_heights1, box_heights2]):
-        number_heights = [
-            height
-            for height, letter in zip(box_heights, line)
-            if letter in MRZ_NUMBERS
-        ]
-        letter_heights = [
-            height
-            for height, letter in zip(box_heights, mrz_text)
-            if letter in MRZ_LETTERS
-        ]
-        average_number_height = (
-            (sum(number_heights) / len(number_heights))
-            if number_heights
-            else 0
-        )
-        average_letter_height = (
-            (sum(letter_heights) / len(letter_heights))
-            if letter_heights
-            else 0
-        )
-
-        if average_number_height > 0 and average_letter_height > 0:
-            for index, (character, height) in enumerate(
-                zip(mrz_text, box_heights), start=0 if line == 0 else 44
-            ):
-                if character == "\n":
-                    continue
-                high_letter = (
-                    height > average_letter_height * 1.15
-                    and character in MRZ_LETTERS
-                    and character in MRZ_REPLACEMENTS
-                )
-                low_number = (
-                    height < average_number_height * 0.85
-                    and character in MRZ_NUMBERS
-                    and character in MRZ_REPLACEMENTS
-                )
-                if high_letter or low_number:
-                    mrz_text = f"{mrz_text[:index]}{MRZ_REPLACEMENTS[character]}{mrz_text[index + 1:]}"
-    return mrz_text
-
-
-def _replace_characters(row, start, end, mrz_lines, characters):
-    """Replace characters in the MRZ text based on the different MRZ fields.
-    For example, the first line should only contain letters"""
-    replacements = {
-        letter: number
-        for letter, number in MRZ_REPLACEMENTS.items()
-        if letter in characters
-    }
-    replaced_text = mrz_lines[row][start:end].translate(
-        str.maketrans(replacements)
+    lines = mrz_text.splitlines()
+    lengths = [len(line) for line in lines]
+    codes = np.frombuffer("".join(lines).encode("utf-32-le"), dtype=np.uint32)
+    count = min(len(codes), len(box_heights))
+    if count == 0:
+        return "\n".join(lines)
+    heights = np.asarray(box_heights[:count], dtype=float)
+    # Characters outside ASCII are looked up as DEL, which is of no kind
+    table_codes = np.minimum(codes[:count], _CODES - 1)
+    kinds = _KINDS[table_codes]
+    if line_ids is not None and len(line_ids) >= count:
+        rows = np.asarray(line_ids[:count], dtype=np.intp)
+    else:
+        rows = np.repeat(np.arange(len(lines)), lengths)[:count]
+    row_count = max(len(lines), int(rows.max()) + 1)
+
+    # The sum and number of heights of every kind on every line
+    groups = rows * 3 + kinds
+    sums = np.bincount(groups, heights, minlength=row_count * 3)
+    counts = np.bincount(groups, minlength=row_count * 3)
+    means = (sums / np.maximum(counts, 1)).reshape(-1, 3)
+    # Only lines with both letters and digits have heights to compare with
+    usable = (means[:, _LETTER] > 0) & (means[:, _NUMBER] > 0)
+
+    limits = means.ravel()[groups] * _RATIOS[kinds]
+    replace = (
+        _REPLACEABLE[table_codes]
+        & usable[rows]
+        & ((heights - limits) * _DIRECTIONS[kinds] > 0)
+    )
+    replaced = codes.copy()
+    replaced[:count] = np.where(
+        replace, _REPLACEMENT[table_codes], codes[:count]
+    )
+    text = replaced.tobytes().decode("utf-32-le")
+    ends = np.cumsum(lengths).tolist()
+    return "\n".join(
+        text[end - length : end] for end, length in zip(ends, lengths)
     )
-    mrz_lines[
-        row
-    ] = f"{mrz_lines[row][:start]}{replaced_text}{mrz_lines[row][end:]}"
-    return mrz_lines
 
 
 def replace_based_on_mrz_fields(mrz_text: str) -> Optional[str]:
-    """Replace characters in the MRZ text based on the different MRZ fields.
-    For example, the first line should only contain letters"""
-    mrz_lines = mrz_text.splitlines()
-    for key, (row, start, end) in PASSPORT_FIELDS.items():
-        if key in (
-            "document_type",
-            "country_code",
-            "full name",
-            "nationality",
-        ):
-            # replace numbers by letters
-            mrz_lines = _replace_characters(
-                row, start, end, mrz_lines, MRZ_NUMBERS
-            )
-        else:
-            # Replace letters by number
-            mrz_lines = _replace_characters(
-                row, start, end, mrz_lines, MRZ_LETTERS
-            )
-    mrz_text = "\n".join(mrz_lines)
-    return mrz_text
+    """Replace characters in the MRZ text based on the different MRZ fields
+    of its layout. For example, the name should only contain letters"""
+    lines = mrz_text.splitlines()
+    layout = detect_layout(mrz_lines(mrz_text))
+    if layout is None:
+        return mrz_text
+    return "\n".join(layout.translate(lines))
 
 
 def fix_line_lengths(mrz_text: str, verbose=False) -> Optional[str]:
-    """Fix the line lengths of the MRZ text ensuring it has two lines of 44
-    characters."""
-    # Fix line lengths
-    mrz_lines = mrz_text.splitlines()
+    """Fix the line lengths of the MRZ text ensuring it has the number and
+    length of lines of its layout (TD1, TD2 or TD3)."""
     # Remove any "ghost" lines
-    mrz_lines = [line for line in mrz_lines if len(line) > 10]
-    if len(mrz_lines) != 2:
+    lines = mrz_lines(mrz_text)
+    layout = detect_layout(lines)
+    if layout is None:
         print_if_verbose("Invalid number of MRZ lines", verbose)
         return None
-    # Fix first line by adding < characters at the end
-    index = mrz_lines[0].find("<<<")
+    # Fix the name line by adding < characters at the end
+    name_line = lines[layout.name_row]
+    index = name_line.find("<<<")
     if index != -1:
-        trailing_characters = "".join("<" for _ in range(44 - index))
-        mrz_lines[0] = f"{mrz_lines[0][:index]}{trailing_characters}"
-    if len(mrz_lines[0]) != 44 or len(mrz_lines[1]) != 44:
+        lines[layout.name_row] = name_line[:index].ljust(
+            layout.line_length, "<"
+        )
+    if any(len(line) != layout.line_length for line in lines):
         print_if_verbose(
-            f"Incorrect number of characters ({len(mrz_lines[0])}, {len(mrz_lines[1])})",
+            f"Incorrect number of characters for {layout.name} "
+            f"{tuple(len(line) for line in lines)}",
             verbose,
         )
         return None
-    return "\n".join(mrz_lines)
+    return "\n".join(lines)
 
 
 def postprocess(
@@ -161,7 +158,7 @@ def postprocess(
             print_if_verbose("No box heights available", verbose)
         else:
             mrz_text = replace_based_on_box_heights(
-                mrz_text, metadata.box_heights
+                mrz_text, metadata.box_heights, metadata.line_ids
             )
             print_if_verbose(
                 f"MRZ text after looking at box heights:\n{mrz_text}", verbose
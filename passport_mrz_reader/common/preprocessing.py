@@ -1,12 +1,34 @@
 """This module is used to preprocess the image before OCR"""
+
+from typing import Optional
+
 import cv2
 import imutils
 import numpy as np
-from PIL import Image
 
-from passport_mrz_reader.common.mrz_common import display_if_verbose
+from passport_mrz_reader.common.mrz_common import (
+    display_if_verbose,
+    print_if_verbose,
+)
 from passport_mrz_reader.common.interfaces import PreProcessors
 
+# Side of the window for local thresholds, a bit more than the height of a
+# character in an image resized to a width of 1200
+ADAPTIVE_WINDOW_SIZE = 31
+# Sensitivity of Sauvola thresholding and the dynamic range of the standard
+# deviation, the values recommended by Sauvola and Pietikäinen
+SAUVOLA_K = 0.2
+SAUVOLA_R = 128
+# Constant subtracted from the gaussian weighted mean
+GAUSSIAN_C = 15
+
+# Width of the downscaled image used to estimate the skew
+SKEW_ESTIMATION_WIDTH = 400
+# Skew angles (in degrees) smaller than this are not worth a warp
+MIN_SKEW_ANGLE = 0.3
+# Larger angles are more likely a failed estimate than a tilted capture
+MAX_SKEW_ANGLE = 20
+
 
 def preprocess(image, preprocessors: PreProcessors, verbose=False):
     """Preprocesses the image to make it easier to read.
@@ -18,26 +40,215 @@ def preprocess(image, preprocessors: PreProcessors, verbose=False):
     """
     # resize image
     image = imutils.resize(image, width=1200)
-    display_if_verbose("After resizing", Image.fromarray(image), verbose)
+    display_if_verbose("After resizing", image, verbose)
     if preprocessors.grayscale is not None:
         image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        display_if_verbose(
-            "After grayscaling", Image.fromarray(image), verbose
+        display_if_verbose("After grayscaling", image, verbose)
+    if preprocessors.adaptive_threshold is not None:
+        image = adaptive_threshold(
+            image, preprocessors.adaptive_threshold, verbose
         )
-    if preprocessors.threshold is not None:
-        # change to binary image, set threshold according to the darkest
-        # area of the image
-        threshold = np.percentile(image, preprocessors.threshold)
-        image = cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)[1]
+    elif preprocessors.threshold is not None:
+        image = percentile_threshold(image, preprocessors.threshold)
         display_if_verbose(
             f"After thresholding with threshold {preprocessors.threshold}",
-            Image.fromarray(image),
+            image,
             verbose,
         )
     if preprocessors.grayscale is not None:
         # change to color image
         image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
-        display_if_verbose(
-            "After un-grayscaling", Image.fromarray(image), verbose
-        )
+        display_if_verbose("After un-grayscaling", image, verbose)
     return image
+
+
+def percentile_threshold(image, percentile: int):
+    """Change to a binary image, with the threshold set according to the
+    darkest area of the image, the given percentile of its intensities"""
+    threshold = np.percentile(image, percentile)
+    return cv2.threshold(image, threshold, 255, cv2.THRESH_BINARY)[1]
+
+
+def _window_sums(integral, window_size: int):
+    """The sum over a window around every pixel, from an integral image. The
+    windows are cut off at the edges of the image.
+
+    Returns: tuple of (sums, number of pixels in every window)
+    """
+    height, width = integral.shape[0] - 1, integral.shape[1] - 1
+    radius = window_size // 2
+    top = np.clip(np.arange(height) - radius, 0, height)
+    bottom = np.clip(np.arange(height) + radius + 1, 0, height)
+    left = np.clip(np.arange(width) - radius, 0, width)
+    right = np.clip(np.arange(width) + radius + 1, 0, width)
+    # Sum over the rows of the windows first, then over the columns
+    rows = integral[bottom] - integral[top]
+    sums = rows[:, right] - rows[:, left]
+    return sums, np.outer(bottom - top, right - left)
+
+
+def sauvola_threshold(
+    gray, window_size=ADAPTIVE_WINDOW_SIZE, k=SAUVOLA_K, r=SAUVOLA_R
+):
+    """Binarise a grayscale image with Sauvola's method, where every pixel is
+    compared with a threshold from the mean and standard deviation of the
+    window around it. The local sums are computed in constant time per pixel
+    using integral images."""
+    integral, squared_integral = cv2.integral2(gray, sdepth=cv2.CV_64F)
+    sums, counts = _window_sums(integral, window_size)
+    squared_sums, _ = _window_sums(squared_integral, window_size)
+    mean = sums / counts
+    std = np.sqrt(np.maximum(squared_sums / counts - mean**2, 0))
+    threshold = mean * (1 + k * (std / r - 1))
+    return np.where(gray > threshold, 255, 0).astype(np.uint8)
+
+
+def adaptive_threshold(image, method: str, verbose=False):
+    """Binarise the image with a threshold computed for every pixel from the
+    window around it, so uneven lighting does not need several attempts with
+    different global thresholds.
+
+    Args:
+        image: Grayscale or color image to binarise
+        method: "sauvola", or "gaussian" for OpenCV's gaussian weighted
+            adaptive threshold
+        verbose: Whether to print debug information and display images
+    Returns: the binary image, with as many channels as the input
+    """
+    gray = (
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    )
+    if method == "sauvola":
+        binary = sauvola_threshold(gray)
+    elif method == "gaussian":
+        binary = cv2.adaptiveThreshold(
+            gray,
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY,
+            ADAPTIVE_WINDOW_SIZE,
+            GAUSSIAN_C,
+        )
+    else:
+        raise ValueError(f"Unknown adaptive threshold method {method}")
+    display_if_verbose(
+        f"After {method} adaptive thresholding",
+        binary,
+        verbose,
+    )
+    return (
+        cv2.cvtColor(binary, cv2.COLOR_GRAY2RGB) if image.ndim == 3 else binary
+    )
+
+
+def _line_angle(contour) -> float:
+    """The angle in degrees of the long side of the minimum area rectangle
+    around the contour, in the range [-90, 90)"""
+    corners = cv2.boxPoints(cv2.minAreaRect(contour))
+    edges = [corners[1] - corners[0], corners[2] - corners[1]]
+    d_x, d_y = max(edges, key=np.linalg.norm)
+    angle = np.degrees(np.arctan2(d_y, d_x))
+    # The direction of the edge is arbitrary, fold it into [-90, 90)
+    return float((angle + 90) % 180 - 90)
+
+
+def estimate_skew_angle(image, verbose=False) -> Optional[float]:
+    """Estimate the skew of the MRZ text lines in degrees, positive meaning
+    the lines are rotated clockwise in the image.
+
+    The characters of a downscaled image are smeared into one blob per text
+    line, and the skew is the length weighted median of the angles of the
+    minimum area rectangles around the lines.
+
+    Args:
+        image: The image to estimate the skew of
+        verbose: Whether to print debug information and display images
+    Returns: the angle, or None if no text lines were found
+    """
+    small = imutils.resize(image, width=SKEW_ESTIMATION_WIDTH)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    # Dark text on a light background becomes white on black
+    binary = cv2.threshold(
+        small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU
+    )[1]
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 3))
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    display_if_verbose("Smeared text lines", lines, verbose)
+    contours = cv2.findContours(
+        lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE
+    )
+    contours = imutils.grab_contours(contours)
+    angles, lengths = [], []
+    for contour in contours:
+        (_, _), (width, height), _ = cv2.minAreaRect(contour)
+        length, thickness = max(width, height), min(width, height)
+        # Text lines are long and thin, like the MRZ lines
+        if length > SKEW_ESTIMATION_WIDTH * 0.3 and length > 5 * thickness:
+            angles.append(_line_angle(contour))
+            lengths.append(length)
+    if not angles:
+        print_if_verbose("No text lines found to estimate skew", verbose)
+        return None
+    order = np.argsort(angles)
+    cumulative = np.cumsum(np.array(lengths)[order])
+    median = np.searchsorted(cumulative, cumulative[-1] / 2)
+    return float(np.array(angles)[order][median])
+
+
+def deskew_matrix(shape, angle: Optional[float]) -> Optional[np.ndarray]:
+    """The affine matrix deskew rotates an image of the shape with, by the
+    estimated angle about its centre, or None if the angle is too small or
+    unknown and the image is not rotated"""
+    if angle is None or not MIN_SKEW_ANGLE <= abs(angle) <= MAX_SKEW_ANGLE:
+        return None
+    height, width = shape[:2]
+    return cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+
+
+def unrotate_boxes(boxes, matrix) -> np.ndarray:
+    """Map (x, y, width, height) boxes in pixels of the deskewed image back
+    to the image before it was rotated by the matrix, see deskew_matrix. A
+    box is no longer upright there, so it becomes the upright rectangle
+    around it."""
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+    x, y, width, height = boxes.T
+    # The four corners of every box, one row per box
+    xs = np.column_stack((x, x + width, x, x + width))
+    ys = np.column_stack((y, y, y + height, y + height))
+    inverse = cv2.invertAffineTransform(matrix)
+    xs, ys = (
+        inverse[0, 0] * xs + inverse[0, 1] * ys + inverse[0, 2],
+        inverse[1, 0] * xs + inverse[1, 1] * ys + inverse[1, 2],
+    )
+    left, top = xs.min(axis=1), ys.min(axis=1)
+    return np.column_stack(
+        (left, top, xs.max(axis=1) - left, ys.max(axis=1) - top)
+    )
+
+
+def deskew(image, verbose=False) -> tuple[np.ndarray, Optional[float]]:
+    """Rotate the image so the MRZ text lines are horizontal, using a single
+    affine warp of the full resolution image.
+
+    Args:
+        image: The image to deskew
+        verbose: Whether to print debug information and display images
+    Returns: tuple of (deskewed image, estimated angle in degrees), where the
+        image is returned unchanged if the angle is too small or unknown
+    """
+    angle = estimate_skew_angle(image, verbose)
+    print_if_verbose(f"Estimated skew angle: {angle}", verbose)
+    matrix = deskew_matrix(image.shape, angle)
+    if matrix is None:
+        return image, angle
+    height, width = image.shape[:2]
+    image = cv2.warpAffine(
+        image,
+        matrix,
+        (width, height),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_REPLICATE,
+    )
+    display_if_verbose("After deskewing", image, verbose)
+    return image, angle
@@ -1,31 +1,97 @@
 """Process an image into text from start to finish"""
-from typing import Optional
+import time
+from typing import Callable, Optional
 
-from PIL import Image
+import numpy as np
 
+from passport_mrz_reader.common.find_mrz_region import (
+    find_mrz_blocks,
+    locate_mrz,
+)
 from passport_mrz_reader.common.interfaces import (
     PreProcessors,
     PostProcessors,
     Engine,
+    RegionOfInterest,
 )
 from passport_mrz_reader.common.mrz_common import (
     display_if_verbose,
     print_if_verbose,
 )
 from passport_mrz_reader.common.postprocessing import postprocess
-from passport_mrz_reader.common.preprocessing import preprocess
+from passport_mrz_reader.common.preprocessing import (
+    deskew,
+    deskew_matrix,
+    preprocess,
+    unrotate_boxes,
+)
+from passport_mrz_reader.common.quality_gate import check_quality
+from passport_mrz_reader.common.result import (
+    EMPTY_REGION,
+    NO_TEXT,
+    REJECTED,
+    MrzResult,
+)
+from passport_mrz_reader.utils.image_loading import TARGET_WIDTH
 
 
-def process(
+def process_result(
     image,
     preprocessors: PreProcessors,
     engine: Engine,
     postprocessors: PostProcessors,
     verbose=False,
-) -> Optional[str]:
-    display_if_verbose(
-        "Original image", Image.fromarray(image), verbose=verbose
-    )
+    roi: Optional[RegionOfInterest] = None,
+    stage_hook: Optional[Callable[[str], None]] = None,
+) -> MrzResult:
+    """Read the MRZ of an image, and keep how it was read.
+
+    Args:
+        image: The image, either of the MRZ or of a page containing it
+        preprocessors: The configured pre-processors to use
+        engine: The engine reading the text
+        postprocessors: The configured post-processors to use
+        verbose: Whether to print debug information and display images
+        roi: The region of the image with the MRZ, like from an earlier
+            detection or a previous frame. Only this region is processed.
+        stage_hook: Called with the name of every stage as it ends, like to
+            measure the memory of the stages
+    Returns: the result, with the seconds spent in the stages "locate",
+        "quality_gate", "deskew", "preprocess", "engine" and "postprocess"
+        that ran, and in total
+    """
+    durations = {}
+    started = stage_started = time.perf_counter()
+
+    def end_stage(name: str):
+        nonlocal stage_started
+        now = time.perf_counter()
+        durations[name] = now - stage_started
+        stage_started = now
+        if stage_hook is not None:
+            stage_hook(name)
+
+    display_if_verbose("Original image", image, verbose=verbose)
+    # Crop before anything else, so resizing, thresholding and the OCR
+    # only work on the MRZ
+    if roi is None and preprocessors is not None and preprocessors.locate_mrz:
+        roi = locate_mrz(image, verbose=verbose)
+        end_stage("locate")
+    if roi is not None:
+        roi = roi.clamp(image.shape)
+        if roi.width == 0 or roi.height == 0:
+            durations["total"] = time.perf_counter() - started
+            return MrzResult(None, EMPTY_REGION, durations=durations, roi=roi)
+        image = roi.crop(image)
+        print_if_verbose(f"Processing region {roi}", verbose=verbose)
+        display_if_verbose("Region of interest", image, verbose=verbose)
+    # Give up on unreadable images before any threshold is tried
+    if preprocessors is not None and preprocessors.quality_gate:
+        rejection = check_quality(image, verbose=verbose)
+        end_stage("quality_gate")
+        if rejection is not None:
+            durations["total"] = time.perf_counter() - started
+            return MrzResult(None, rejection, durations=durations, roi=roi)
     if (
         preprocessors is not None
         and preprocessors.variable_threshold
@@ -35,6 +101,11 @@ def process(
             "Only using variable threshold, disregarding threshold and grayscale",
             verbose=verbose,
         )
+    # Deskew once, so every threshold attempt of the engine reuses it
+    skew_angle = None
+    if preprocessors is not None and preprocessors.deskew is not None:
+        image, skew_angle = deskew(image, verbose=verbose)
+        end_stage("deskew")
     # Pre-process
     if (
         preprocessors is not None
@@ -43,16 +114,108 @@ def process(
         pre_processed = None
     else:
         pre_processed = preprocess(image, preprocessors, verbose=verbose)
+        end_stage("preprocess")
     original_image = image
     # Engine
     initial_result = engine.get_mrz_text(
         original_image, pre_processed, verbose=verbose
     )
+    end_stage("engine")
     if initial_result is None:
-        return None
+        durations["total"] = time.perf_counter() - started
+        return MrzResult(None, NO_TEXT, durations=durations, roi=roi)
     mrz_text, metadata = initial_result
+    metadata.skew_angle = skew_angle
+    metadata.roi = roi
+    metadata.scale = image.shape[1] / TARGET_WIDTH
+    # The engines read the region resized to their width, map their boxes
+    # back to pixels of the whole image
+    if metadata.boxes is not None:
+        region = roi or RegionOfInterest(0, 0, image.shape[1], image.shape[0])
+        boxes = np.asarray(metadata.boxes, dtype=float) * metadata.scale
+        matrix = deskew_matrix(image.shape, skew_angle)
+        if matrix is not None:
+            # The engines read the deskewed region, rotate the boxes back
+            boxes = unrotate_boxes(boxes, matrix)
+        metadata.boxes = region.to_image(boxes, 1)
+    if metadata.box_heights is not None:
+        metadata.box_heights = (
+            np.asarray(metadata.box_heights, dtype=float) * metadata.scale
+        ).tolist()
     # Post-process
     post_processed = postprocess(
         mrz_text, metadata, postprocessors, verbose=verbose
     )
-    return post_processed
+    end_stage("postprocess")
+    durations["total"] = time.perf_counter() - started
+    if post_processed is None:
+        failure = NO_TEXT if mrz_text is None else REJECTED
+    else:
+        failure = None
+    return MrzResult(
+        post_processed,
+        failure,
+        confidences=metadata.confidences,
+        threshold=(
+            metadata.threshold
+            if metadata.threshold is not None or preprocessors is None
+            else preprocessors.threshold
+        ),
+        attempts=metadata.attempts,
+        durations=durations,
+        roi=roi,
+        boxes=metadata.boxes,
+    )
+
+
+def process(
+    image,
+    preprocessors: PreProcessors,
+    engine: Engine,
+    postprocessors: PostProcessors,
+    verbose=False,
+    roi: Optional[RegionOfInterest] = None,
+) -> Optional[str]:
+    """Read the MRZ text of an image, see process_result for how it was read.
+
+    Args:
+        image: The image, either of the MRZ or of a page containing it
+        preprocessors: The configured pre-processors to use
+        engine: The engine reading the text
+        postprocessors: The configured post-processors to use
+        verbose: Whether to print debug information and display images
+        roi: The region of the image with the MRZ, like from an earlier
+            detection or a previous frame. Only this region is processed.
+    """
+    return process_result(
+        image, preprocessors, engine, postprocessors, verbose, roi
+    ).text
+
+
+def process_page(
+    image,
+    preprocessors: PreProcessors,
+    engine: Engine,
+    postprocessors: PostProcessors,
+    verbose=False,
+) -> list[MrzResult]:
+    """Read every MRZ of an image of a page with any number of documents,
+    like a flatbed scan of several passports. The MRZ blocks are found in a
+    single pass over the page, see find_mrz_region.find_mrz_blocks, and read
+    one after the other. WorkerPool.process_page reads them in parallel.
+
+    Args:
+        image: The image of the page
+        preprocessors: The configured pre-processors to use for every block
+        engine: The engine reading the text
+        postprocessors: The configured post-processors to use
+        verbose: Whether to print debug information and display images
+    Returns: the result of every MRZ block, from the top left of the page,
+        with the region of the block in the page as its roi
+    """
+    return [
+        process_result(
+            image, preprocessors, engine, postprocessors, verbose, roi=block
+        )
+        for block in find_mrz_blocks(image, verbose=verbose)
+    ]
@@ -0,0 +1,141 @@
+"""A quick check of whether an image can be read at all, before it is
+preprocessed and read by an engine.
+
+A blurry, glare-covered or MRZ-less image goes through every threshold of the
+ladder and fails in every one, which is the most expensive outcome of the
+pipeline. The gate measures a small thumbnail of the image in about a
+millisecond and rejects such images with a reason code:
+    sharpness: variance of the Laplacian relative to the variance of the
+        image, low when the image is out of focus or moving
+    saturated: fraction of blown out pixels, high under glare
+    text_band: the largest fraction of a row covered by dark strokes on a
+        light background, low when there is no line of text
+
+The limits are calibrated on a labelled dataset by
+test_suite/calibrate_quality_gate.py. No calibration is committed, as the
+labelled images in the repository are too few to calibrate on, so the
+uncalibrated defaults of QualityLimits are used until one is saved.
+"""
+
+import json
+import os
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Optional
+
+import cv2
+import imutils
+import numpy as np
+
+from passport_mrz_reader.common.mrz_common import print_if_verbose
+
+CALIBRATION_PATH = f"{os.path.dirname(__file__)}/quality_calibration.json"
+# The measures are computed on a grayscale image of this width
+THUMBNAIL_WIDTH = 240
+# Pixels at least this bright are saturated
+SATURATION_LEVEL = 250
+# Strokes are darker than their surroundings by at least this much, and by
+# this share of the strongest strokes of the image, so dim images pass but
+# flat noise does not
+MIN_STROKE_CONTRAST = 12
+STROKE_CONTRAST_RATIO = 0.4
+# Kernels finding strokes about the size of a character in the thumbnail,
+# and joining the characters of a line
+STROKE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 5))
+LINE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1))
+
+# Reason codes of rejected images
+BLURRY = "blurry"
+GLARE = "glare"
+NO_TEXT_BAND = "no_text_band"
+
+
+@dataclass(frozen=True)
+class QualityMeasures:
+    """The measures of an image the gate decides on, see the module"""
+
+    sharpness: float
+    saturated: float
+    text_band: float
+
+
+@dataclass(frozen=True)
+class QualityLimits:
+    """The limits of the measures an image must be within to be read. The
+    defaults are uncalibrated placeholders, chosen by hand to be lenient so
+    only plainly unreadable images are rejected. Calibrate the limits on a
+    corpus of real captures before relying on the gate."""
+
+    min_sharpness: float = 0.5
+    max_saturated: float = 0.3
+    min_text_band: float = 0.5
+
+    def rejection(self, measures: QualityMeasures) -> Optional[str]:
+        """The reason code the measures are rejected for, None if they
+        pass"""
+        # Glare and blur also wash out the text band, so they are the more
+        # specific reasons
+        if measures.saturated > self.max_saturated:
+            return GLARE
+        if measures.sharpness < self.min_sharpness:
+            return BLURRY
+        if measures.text_band < self.min_text_band:
+            return NO_TEXT_BAND
+        return None
+
+
+def measure_quality(image) -> QualityMeasures:
+    """Measure a thumbnail of the image, see the module"""
+    thumbnail = imutils.resize(
+        image, width=THUMBNAIL_WIDTH, inter=cv2.INTER_AREA
+    )
+    if thumbnail.ndim == 3:
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_BGR2GRAY)
+    variance = max(float(thumbnail.var()), 1.0)
+    sharpness = float(cv2.Laplacian(thumbnail, cv2.CV_32F).var()) / variance
+    saturated = float(np.mean(thumbnail >= SATURATION_LEVEL))
+    blackhat = cv2.morphologyEx(thumbnail, cv2.MORPH_BLACKHAT, STROKE_KERNEL)
+    stroke_contrast = max(
+        MIN_STROKE_CONTRAST,
+        STROKE_CONTRAST_RATIO * np.percentile(blackhat, 99.5),
+    )
+    strokes = (blackhat > stroke_contrast).astype(np.uint8)
+    lines = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, LINE_KERNEL)
+    text_band = float(np.max(np.mean(lines, axis=1)))
+    return QualityMeasures(sharpness, saturated, text_band)
+
+
+@lru_cache(maxsize=None)
+def load_limits(path: str = CALIBRATION_PATH) -> QualityLimits:
+    """Load the calibrated limits, or the default limits if the gate has
+    not been calibrated"""
+    if not os.path.exists(path):
+        return QualityLimits()
+    with open(path, encoding="utf-8") as file:
+        return QualityLimits(**json.load(file)["limits"])
+
+
+def save_limits(limits: QualityLimits, path: str = CALIBRATION_PATH):
+    """Save calibrated limits"""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({"limits": asdict(limits)}, file, indent=2)
+    load_limits.cache_clear()
+
+
+def check_quality(
+    image, limits: Optional[QualityLimits] = None, verbose=False
+) -> Optional[str]:
+    """Check whether the image is worth reading.
+
+    Args:
+        image: The image of the MRZ
+        limits: The limits to check against, the calibrated limits if None
+        verbose: Whether to print debug information
+    Returns: the reason code the image is rejected for, None if it passes
+    """
+    measures = measure_quality(image)
+    rejection = (limits or load_limits()).rejection(measures)
+    print_if_verbose(
+        f"Quality {measures}: {rejection or 'passed'}", verbose=verbose
+    )
+    return rejection
@@ -0,0 +1,196 @@
+"""The result of reading the MRZ of an image, together with how it was read:
+the threshold and the number of attempts of the engine, the confidence of
+every character and the time spent in every stage.
+
+process.process_result returns it. The layout, validity and fields are only
+worked out from the text when they are first used, so callers that only want
+the text or the timings do not pay for them.
+"""
+
+import datetime
+from typing import Optional
+
+import numpy as np
+
+from passport_mrz_reader.common.interfaces import RegionOfInterest
+from passport_mrz_reader.common.mrz_layouts import (
+    MrzLayout,
+    detect_layout,
+    mrz_lines,
+)
+
+# Reasons a read failed before there was a text to validate
+NO_TEXT = "No text found by the engine"
+REJECTED = "Text rejected by the postprocessing"
+UNKNOWN_LAYOUT = "Unknown layout"
+EMPTY_REGION = "Region of interest outside the image"
+
+
+def _parse_date(value: str, future: bool) -> Optional[datetime.date]:
+    """A YYMMDD date of the MRZ, in the hundred years up to today for birth
+    dates, or up to 50 years from today for expiry dates"""
+    if len(value) != 6 or not value.isdigit():
+        return None
+    today = datetime.date.today()
+    latest = today.year + (50 if future else 0)
+    year = latest // 100 * 100 + int(value[:2])
+    if year > latest:
+        year -= 100
+    try:
+        return datetime.date(year, int(value[2:4]), int(value[4:6]))
+    except ValueError:
+        return None
+
+
+class MrzResult:
+    """The MRZ read from an image, and how it was read"""
+
+    __slots__ = (
+        "text",
+        "failure",
+        "confidences",
+        "threshold",
+        "attempts",
+        "durations",
+        "roi",
+        "boxes",
+        "_layout",
+        "_fields",
+    )
+
+    def __init__(
+        self,
+        text: Optional[str],
+        failure: Optional[str] = None,
+        confidences: Optional[list[float]] = None,
+        threshold: Optional[int] = None,
+        attempts: Optional[int] = None,
+        durations: Optional[dict[str, float]] = None,
+        roi: Optional[RegionOfInterest] = None,
+        boxes: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            text: The postprocessed MRZ text, None if nothing was read
+            failure: Why nothing was read, if so
+            confidences: The confidence of every character of the raw text,
+                if the engine gives any
+            threshold: The percentile threshold the text was read at
+            attempts: The number of times the engine tried to read the text
+            durations: Seconds spent in every stage, by name of the stage
+            roi: The region of the image that was processed
+            boxes: The (x, y, width, height) box of every character of the
+                raw text in pixels of the image, if the engine gives any.
+                If the image was deskewed, the upright rectangle around the
+                box rotated back.
+        """
+        self.text = text
+        self.failure = failure
+        self.confidences = confidences
+        self.threshold = threshold
+        self.attempts = attempts
+        self.durations = durations if durations is not None else {}
+        self.roi = roi
+        self.boxes = boxes
+        # False until the layout is detected, which may find no layout
+        self._layout = False
+        self._fields = None
+
+    def __repr__(self) -> str:
+        return (
+            f"MrzResult(text={self.text!r}, valid={self.valid}, "
+            f"threshold={self.threshold}, attempts={self.attempts})"
+        )
+
+    @property
+    def lines(self) -> list[str]:
+        """The lines of the MRZ"""
+        return [] if self.text is None else mrz_lines(self.text)
+
+    @property
+    def layout(self) -> Optional[MrzLayout]:
+        """The layout of the MRZ, None if it has no known layout"""
+        if self._layout is False:
+            self._layout = detect_layout(self.lines) if self.text else None
+        return self._layout
+
+    @property
+    def reasons(self) -> list[str]:
+        """The reasons the MRZ is not valid, empty if it is valid"""
+        if self.text is None:
+            return [self.failure or NO_TEXT]
+        if self.layout is None:
+            return [UNKNOWN_LAYOUT]
+        return self.layout.validate(self.lines)
+
+    @property
+    def valid(self) -> bool:
+        """Whether the MRZ has a known layout and all its check digits
+        match"""
+        return not self.reasons
+
+    @property
+    def min_confidence(self) -> Optional[float]:
+        """The confidence of the least certain character, if known"""
+        return min(self.confidences) if self.confidences else None
+
+    @property
+    def fields(self) -> dict[str, str]:
+        """The raw value of every field of the layout, by name of the
+        field. Empty if the layout is unknown."""
+        if self._fields is None:
+            lines = self.lines
+            self._fields = (
+                {
+                    field.name: lines[field.row][field.start : field.end]
+                    for field in self.layout.fields
+                    if field.row < len(lines)
+                }
+                if self.layout is not None
+                else {}
+            )
+        return self._fields
+
+    def _field(self, name: str) -> Optional[str]:
+        """A field without its filler characters, None if missing"""
+        value = self.fields.get(name)
+        return None if value is None else value.rstrip("<")
+
+    @property
+    def document_number(self) -> Optional[str]:
+        """The document number"""
+        return self._field("document_number")
+
+    @property
+    def nationality(self) -> Optional[str]:
+        """The nationality, as a three letter code"""
+        return self._field("nationality")
+
+    @property
+    def surname(self) -> Optional[str]:
+        """The primary identifier, with spaces between the names"""
+        name = self._field("full_name")
+        if name is None:
+            return None
+        return name.split("<<")[0].replace("<", " ")
+
+    @property
+    def given_names(self) -> Optional[str]:
+        """The secondary identifier, with spaces between the names"""
+        name = self._field("full_name")
+        if name is None:
+            return None
+        _, _, given_names = name.partition("<<")
+        return given_names.replace("<", " ").strip()
+
+    @property
+    def birth_date(self) -> Optional[datetime.date]:
+        """The date of birth, None if it is missing or not a date"""
+        value = self._field("birth_date")
+        return None if value is None else _parse_date(value, future=False)
+
+    @property
+    def expiry_date(self) -> Optional[datetime.date]:
+        """The date of expiry, None if it is missing or not a date"""
+        value = self._field("expiry_date")
+        return None if value is None else _parse_date(value, future=True)
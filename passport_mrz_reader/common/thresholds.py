@@ -0,0 +1,100 @@
+"""The percentile thresholds the engines try when using a variable threshold,
+and the ordering of them per image.
+
+The fixed ladder tries the same thresholds in the same order for every image,
+so dark or washed-out scans pay for several failed OCR passes. With a
+calibration file, made by test_suite/calibrate_thresholds.py, the threshold
+most likely to succeed is predicted from cheap image statistics, and the
+ladder is tried starting from the thresholds closest to the prediction.
+
+No calibration is committed, so the fixed ladder is used: the labelled images
+in the repository are too few to fit the predictor to. Calibrate on a corpus
+of real captures to turn the predicted ordering on.
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Optional
+
+import cv2
+import imutils
+import numpy as np
+
+THRESHOLD_LADDER = [10, 8, 12, 6, 14]
+CALIBRATION_PATH = f"{os.path.dirname(__file__)}/threshold_calibration.json"
+# The statistics are computed on an image of this width
+STATISTICS_WIDTH = 300
+FEATURES = ["bias", "dark_percentage", "contrast", "mean"]
+
+
+def image_statistics(image) -> np.ndarray:
+    """Cheap statistics of the histogram of the MRZ image, in the order of
+    FEATURES:
+        bias: always 1
+        dark_percentage: percentage of pixels darker than the Otsu threshold,
+            roughly the amount of ink
+        contrast: difference between the 95th and 5th percentile, scaled to
+            the range [0, 1]
+        mean: mean intensity, scaled to the range [0, 1]
+    """
+    small = imutils.resize(image, width=STATISTICS_WIDTH)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    otsu, _ = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    low, high = np.percentile(small, (5, 95))
+    return np.array(
+        [
+            1.0,
+            np.mean(small < otsu) * 100,
+            (high - low) / 255,
+            np.mean(small) / 255,
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def load_calibration(path: str = CALIBRATION_PATH) -> Optional[np.ndarray]:
+    """Load the weights of the linear threshold predictor, or None if the
+    thresholds have not been calibrated"""
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as file:
+        calibration = json.load(file)
+    if calibration["features"] != FEATURES:
+        raise ValueError(f"Calibration {path} uses other features")
+    return np.array(calibration["weights"])
+
+
+def save_calibration(weights: np.ndarray, path: str = CALIBRATION_PATH):
+    """Save the weights of the linear threshold predictor"""
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(
+            {"features": FEATURES, "weights": list(weights)}, file, indent=2
+        )
+    load_calibration.cache_clear()
+
+
+def order_ladder(predicted_threshold: Optional[float]) -> list[int]:
+    """Order the ladder by the distance to the predicted threshold, keeping
+    the fixed order between equally close thresholds"""
+    if predicted_threshold is None:
+        return list(THRESHOLD_LADDER)
+    return sorted(
+        THRESHOLD_LADDER,
+        key=lambda threshold: abs(threshold - predicted_threshold),
+    )
+
+
+def predict_threshold(image) -> Optional[float]:
+    """Predict the percentile threshold most likely to succeed for the image,
+    or None if the thresholds have not been calibrated"""
+    weights = load_calibration()
+    if weights is None:
+        return None
+    return float(image_statistics(image) @ weights)
+
+
+def threshold_ladder(image) -> list[int]:
+    """The thresholds to try for the image, in the order to try them"""
+    return order_ladder(predict_threshold(image))
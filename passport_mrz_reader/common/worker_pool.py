@@ -0,0 +1,239 @@
+"""A pool of worker processes sharing the models of the engines.
+
+Starting one process per core, and letting every process load the Keras model
+or the EasyOCR reader itself, multiplies the memory use by the number of
+processes. With the "fork" start method, the pool instead loads the engines
+once in the parent process and forks the workers from it, so the model
+weights are shared copy-on-write. Workers are replaced after a number of
+tasks to contain leaks, and the replacements are forked from the same parent,
+so they share the models too.
+
+Forking a process whose TensorFlow or PyTorch has started its thread pools
+can deadlock the workers, and macOS and Windows cannot fork at all. With the
+"spawn" or "forkserver" start method every worker loads the engines itself
+when it starts, before it takes any task. The start method is the default of
+the platform unless one is given.
+
+Every worker is limited to a few threads for TensorFlow, OpenCV, PyTorch and
+the OpenMP and BLAS libraries, so the workers together do not oversubscribe
+the cores. The thread count is also passed to Engine.load, as TensorFlow only
+takes its limits before it is initialised: with "fork" the engines are loaded
+in the parent with the limits of the workers, so the TensorFlow the workers
+inherit is configured, and the TensorFlow of the parent is limited too. The
+other settings of the process creating the pool are kept.
+
+    with WorkerPool([Tesseract({})]) as pool:
+        text = pool.process(image, preprocessors, engine, postprocessors)
+"""
+
+import multiprocessing
+import os
+import sys
+from dataclasses import replace
+from multiprocessing.pool import AsyncResult
+from typing import Callable, Iterable, Iterator, Optional
+
+import cv2
+
+from passport_mrz_reader.common.find_mrz_region import find_mrz_blocks
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+    RegionOfInterest,
+)
+from passport_mrz_reader.common.process import process, process_result
+from passport_mrz_reader.common.result import MrzResult
+
+# Replace a worker after this many tasks
+MAX_TASKS_PER_CHILD = 200
+THREAD_ENVIRONMENT_VARIABLES = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+]
+
+
+def pin_threads(threads: int):
+    """Limit the threads of the numerical libraries in this process. The
+    environment variables only affect libraries that are not initialised
+    yet, so call this before loading any models."""
+    for variable in THREAD_ENVIRONMENT_VARIABLES:
+        os.environ[variable] = str(threads)
+    cv2.setNumThreads(threads)
+    # Only configure the libraries the engines have imported
+    if "tensorflow" in sys.modules:
+        threading = sys.modules["tensorflow"].config.threading
+        try:
+            threading.set_intra_op_parallelism_threads(threads)
+            threading.set_inter_op_parallelism_threads(threads)
+        except RuntimeError:
+            # TensorFlow is already initialised, like in a worker forked
+            # from a parent that loaded the engines with the limits
+            pass
+    if "torch" in sys.modules:
+        sys.modules["torch"].set_num_threads(threads)
+
+
+def _initialize_worker(threads: int, engines: list[Engine]):
+    """Limit the threads of a new worker and load the engines in it, which
+    is a no-op for engines loaded in the parent before forking"""
+    pin_threads(threads)
+    for engine in engines:
+        engine.load(threads)
+
+
+def _process(arguments: tuple) -> Optional[str]:
+    """Run process in a worker"""
+    return process(*arguments)
+
+
+def _process_result(arguments: tuple) -> MrzResult:
+    """Run process_result in a worker"""
+    return process_result(*arguments)
+
+
+class WorkerPool:
+    """A pool of worker processes with preloaded engines"""
+
+    def __init__(
+        self,
+        engines: Iterable[Engine],
+        processes: Optional[int] = None,
+        threads_per_worker: int = 1,
+        max_tasks_per_child: Optional[int] = MAX_TASKS_PER_CHILD,
+        start_method: Optional[str] = None,
+    ):
+        """Load the engines and start the workers.
+
+        Args:
+            engines: The engines the workers will use, loaded in every
+                worker as it starts, and before forking with "fork", with
+                the thread limit of the workers
+            processes: The number of workers, the number of cores if None
+            threads_per_worker: The threads each library may use per worker
+            max_tasks_per_child: Replace a worker after this many tasks,
+                never if None
+            start_method: "fork", "spawn" or "forkserver", the default of
+                the platform if None
+        """
+        engines = list(engines)
+        context = multiprocessing.get_context(start_method)
+        if context.get_start_method() == "fork":
+            for engine in engines:
+                engine.load(threads_per_worker)
+        self._pool = context.Pool(
+            processes,
+            initializer=_initialize_worker,
+            initargs=(threads_per_worker, engines),
+            maxtasksperchild=max_tasks_per_child,
+        )
+
+    def process_async(
+        self,
+        image,
+        preprocessors: PreProcessors,
+        engine: Engine,
+        postprocessors: PostProcessors,
+        verbose=False,
+        roi: Optional[RegionOfInterest] = None,
+    ) -> AsyncResult:
+        """Start processing an image in a worker, see process.process"""
+        return self._pool.apply_async(
+            _process,
+            ((image, preprocessors, engine, postprocessors, verbose, roi),),
+        )
+
+    def process(
+        self,
+        image,
+        preprocessors: PreProcessors,
+        engine: Engine,
+        postprocessors: PostProcessors,
+        verbose=False,
+        roi: Optional[RegionOfInterest] = None,
+    ) -> Optional[str]:
+        """Process an image in a worker and wait for the result, see
+        process.process"""
+        return self.process_async(
+            image, preprocessors, engine, postprocessors, verbose, roi
+        ).get()
+
+    def process_result(
+        self,
+        image,
+        preprocessors: PreProcessors,
+        engine: Engine,
+        postprocessors: PostProcessors,
+        verbose=False,
+        roi: Optional[RegionOfInterest] = None,
+    ) -> MrzResult:
+        """Process an image in a worker and wait for the result with how it
+        was read, see process.process_result"""
+        return self._pool.apply(
+            _process_result,
+            ((image, preprocessors, engine, postprocessors, verbose, roi),),
+        )
+
+    def process_page(
+        self,
+        image,
+        preprocessors: PreProcessors,
+        engine: Engine,
+        postprocessors: PostProcessors,
+    ) -> list[MrzResult]:
+        """Read every MRZ of a page, one block in every worker, see
+        process.process_page. The blocks are found in this process, and only
+        the crop of a block is sent to its worker."""
+        blocks = find_mrz_blocks(image)
+        if preprocessors is not None:
+            preprocessors = replace(preprocessors, locate_mrz=None)
+        results = self._pool.map(
+            _process_result,
+            [
+                (block.crop(image), preprocessors, engine, postprocessors)
+                for block in blocks
+            ],
+        )
+        for block, result in zip(blocks, results):
+            # The workers read the crop, move the boxes into the page
+            result.roi = block
+            if result.boxes is not None:
+                result.boxes[:, :2] += (block.x, block.y)
+        return results
+
+    def map(
+        self,
+        images: Iterable,
+        preprocessors: PreProcessors,
+        engine: Engine,
+        postprocessors: PostProcessors,
+    ) -> list[Optional[str]]:
+        """Process images in the workers, returning the results in order"""
+        return self._pool.map(
+            _process,
+            [
+                (image, preprocessors, engine, postprocessors)
+                for image in images
+            ],
+        )
+
+    def imap_unordered(
+        self, function: Callable, iterable: Iterable, chunksize: int = 1
+    ) -> Iterator:
+        """Run any function in the workers, yielding results as they finish.
+        The function must be defined at the top level of a module."""
+        return self._pool.imap_unordered(function, iterable, chunksize)
+
+    def close(self):
+        """Wait for the tasks to finish and stop the workers"""
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self) -> "WorkerPool":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
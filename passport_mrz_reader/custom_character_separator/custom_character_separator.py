@@ -3,9 +3,16 @@ It creates bounding boxes for every character in the MRZ region which in turn ca
 passed to another model for character recognition.
 """
 
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from functools import cmp_to_key
+from typing import Optional
+
 import cv2
-from PIL import Image
+import imutils
+import numpy as np
 from IPython.display import display
 from passport_mrz_reader.common.interfaces import PreProcessors
 
@@ -14,9 +21,119 @@ from passport_mrz_reader.common.mrz_common import (
     print_if_verbose,
 )
 
-from passport_mrz_reader.common.preprocessing import preprocess
+from passport_mrz_reader.common.preprocessing import (
+    percentile_threshold,
+    preprocess,
+)
+from passport_mrz_reader.common.thresholds import threshold_ladder
 from passport_mrz_reader.common.interfaces import PreProcessors
 
+# The size filter was originally tuned by hand on 1200 pixel wide MRZ crops,
+# where a character is roughly 25 pixels high. The limits below are those
+# hand-tuned values expressed relative to the character height, so they can be
+# scaled to the character height estimated from the image itself.
+REFERENCE_CHARACTER_HEIGHT = 25
+MIN_HEIGHT_RATIO = 15 / REFERENCE_CHARACTER_HEIGHT
+MIN_WIDTH_RATIO = 5 / REFERENCE_CHARACTER_HEIGHT
+MIN_AREA_RATIO = 75 / REFERENCE_CHARACTER_HEIGHT**2
+MAX_AREA_RATIO = 1000 / REFERENCE_CHARACTER_HEIGHT**2
+LINE_THRESHOLD_RATIO = 30 / REFERENCE_CHARACTER_HEIGHT
+# Minimum number of character-like components needed to trust the estimate
+MIN_COMPONENTS_FOR_ESTIMATE = 10
+# The percentile threshold used when the preprocessed image the engine is
+# given is not binary
+FALLBACK_THRESHOLD = 10
+# Number of segmentations to keep, a few thresholds of a few images
+SEGMENTATION_CACHE_SIZE = 16
+# The width the MRZ region is resized to before finding the characters
+SEGMENTATION_WIDTH = 1200
+
+
+@dataclass(frozen=True)
+class Segmentation:
+    """The characters found in an image at one threshold. The arrays are
+    shared by everyone using the cache, so they are read-only."""
+
+    boxes: np.ndarray
+    """The bounding boxes (x, y, w, h) of the characters, one per row"""
+    character_images: list[np.ndarray]
+    """Every character, cropped out of the binary image the characters were
+    found in"""
+    threshold: Optional[int] = None
+    """The percentile threshold, None if the image was already binary"""
+
+
+def segmentation_image(image):
+    """The 1200 pixels wide grayscale image the characters are found in when
+    thresholding. An image that already is one is returned as it is."""
+    if image.shape[1] != SEGMENTATION_WIDTH:
+        image = imutils.resize(image, width=SEGMENTATION_WIDTH)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def image_key(image) -> tuple:
+    """A key for the content of an image, a hash of its pixels with its shape
+    and type. A buffer that is reused or changed in place gets a new key, so
+    it is never mistaken for the image it held before."""
+    digest = hashlib.blake2b(digest_size=16)
+    if image.flags.c_contiguous:
+        digest.update(image)
+    else:
+        # Hash a view, like a region of interest, one row at a time instead
+        # of copying all of it
+        for row in image:
+            digest.update(np.ascontiguousarray(row))
+    return digest.digest(), image.shape, image.dtype.str
+
+
+class SegmentationCache:
+    """Least recently used cache of segmentations, keyed by the content of
+    the segmentation image and the threshold, see image_key. Only the boxes and the
+    character crops are kept, not the images."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, threshold) -> Optional[Segmentation]:
+        """The cached segmentation of the image with the key at the
+        threshold, if any"""
+        with self._lock:
+            segmentation = self._entries.get((key, threshold))
+            if segmentation is not None:
+                self._entries.move_to_end((key, threshold))
+            return segmentation
+
+    def put(self, key: tuple, threshold, segmentation: Segmentation):
+        """Cache a segmentation, evicting the least recently used one if the
+        cache is full"""
+        with self._lock:
+            self._entries[(key, threshold)] = segmentation
+            self._entries.move_to_end((key, threshold))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self):
+        """Remove all segmentations"""
+        with self._lock:
+            self._entries.clear()
+
+
+SEGMENTATION_CACHE = SegmentationCache(SEGMENTATION_CACHE_SIZE)
+
+
+def _color_copy(image):
+    """A color copy of the image to draw on"""
+    if image.ndim == 2:
+        return cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+    return image.copy()
+
 
 def draw_numerated_boxes(image, boxes):
     """Draws numerated boxes on the image.
@@ -39,11 +156,10 @@ def draw_numerated_boxes(image, boxes):
     return image
 
 
-def _sort_bounding_boxes(bounding_boxes):
+def _sort_bounding_boxes(bounding_boxes, vertical_threshold=30):
     """Sort bounding boxes from left to right and top to bottom"""
 
     def compare_bounding_boxes(box1, box2):
-        vertical_threshold = 30
         if box1[0] == box2[0] and box1[1] == box2[1]:
             return 0
         vertical_distance = box1[1] - box2[1]
@@ -86,6 +202,86 @@ def _merge_bounding_boxes(bounding_boxes):
     return bounding_boxes
 
 
+def _weighted_median(values, weights) -> float:
+    """The median of the values, where every value counts by its weight"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return float(
+        values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+    )
+
+
+def _group_into_lines(boxes, character_height):
+    """Group boxes into text lines by their vertical centers.
+
+    Returns the vertical center of every line with at least five boxes,
+    from top to bottom.
+    """
+    centers = np.sort(boxes[:, 1] + boxes[:, 3] / 2)
+    # A new line starts wherever the gap between two consecutive centers
+    # is larger than half a character
+    breaks = np.flatnonzero(np.diff(centers) > character_height / 2) + 1
+    return [
+        float(np.median(line))
+        for line in np.split(centers, breaks)
+        if len(line) >= 5
+    ]
+
+
+def estimate_character_size(
+    bounding_boxes,
+) -> tuple[Optional[float], Optional[float]]:
+    """Estimate the character height and the line spacing of the MRZ from the
+    bounding boxes of all connected components in the image.
+
+    The heights are weighted by the area of the boxes, so that the many small
+    specks of noise in a thresholded image do not outweigh the characters.
+    A first estimate is refined using only the components of a similar
+    height. The line spacing is the median distance between the text lines.
+
+    Args:
+        bounding_boxes: The bounding boxes (x, y, w, h) of all components
+    Returns: tuple of (character height, line spacing), where either can be
+        None if it could not be estimated
+    """
+    boxes = np.array(bounding_boxes, dtype=np.float32).reshape(-1, 4)
+    widths, heights = boxes[:, 2], boxes[:, 3]
+    # Discard specks and components with proportions no character has
+    boxes = boxes[
+        (heights >= 3) & (heights <= 8 * widths) & (widths <= 2 * heights)
+    ]
+    if len(boxes) < MIN_COMPONENTS_FOR_ESTIMATE:
+        return None, None
+    first_estimate = _weighted_median(boxes[:, 3], boxes[:, 2] * boxes[:, 3])
+    boxes = boxes[
+        (boxes[:, 3] >= first_estimate / 2)
+        & (boxes[:, 3] <= first_estimate * 2)
+    ]
+    if len(boxes) < MIN_COMPONENTS_FOR_ESTIMATE:
+        return None, None
+    character_height = _weighted_median(boxes[:, 3], boxes[:, 2] * boxes[:, 3])
+    lines = _group_into_lines(boxes, character_height)
+    line_spacing = (
+        float(np.median(np.diff(lines))) if len(lines) >= 2 else None
+    )
+    return character_height, line_spacing
+
+
+def _is_character_box(bounding_box, character_height, line_spacing) -> bool:
+    """Whether the bounding box has the size of a character, given the
+    estimated character height and line spacing"""
+    _, _, width, height = bounding_box
+    return (
+        MIN_AREA_RATIO * character_height**2
+        < width * height
+        < MAX_AREA_RATIO * character_height**2
+        and height > MIN_HEIGHT_RATIO * character_height
+        and width > MIN_WIDTH_RATIO * character_height
+        # A box higher than the line spacing covers several lines
+        and (line_spacing is None or height < line_spacing)
+    )
+
+
 def get_bounding_boxes(
     mrz_region, preprocessors: PreProcessors, verbose=False
 ):
@@ -93,17 +289,30 @@ def get_bounding_boxes(
 
     Args:
         mrz_region: The MRZ region image
+        preprocessors: The pre-processors turning the image into a binary image
+        verbose: Whether to print debug information and display images
+    Returns: tuple of (bounding boxes, preprocessed image)
+    """
+    # Change to binary image
+    preprocessed = preprocess(mrz_region, preprocessors, verbose)
+    return find_bounding_boxes(preprocessed, verbose), preprocessed
+
+
+def find_bounding_boxes(preprocessed, verbose=False):
+    """Gets the bounding boxes for every character in an already preprocessed,
+    binary image of the MRZ region.
+
+    Args:
+        preprocessed: The binary MRZ region image, with dark text
         verbose: Whether to print debug information and display images
     """
-    # Change to binary image and invert colors
-    mrz_region = preprocess(mrz_region, preprocessors, verbose)
-    preprocessed = mrz_region.copy()
-    original_image = mrz_region.copy()
-    mrz_region = cv2.cvtColor(mrz_region, cv2.COLOR_BGR2GRAY)
+    # Invert colors
+    if preprocessed.ndim == 3:
+        mrz_region = cv2.cvtColor(preprocessed, cv2.COLOR_BGR2GRAY)
+    else:
+        mrz_region = preprocessed
     mrz_region = cv2.bitwise_not(mrz_region)
-    display_if_verbose(
-        "Inverted MRZ region", Image.fromarray(mrz_region), verbose
-    )
+    display_if_verbose("Inverted MRZ region", mrz_region, verbose)
     # Connect characters that are split
     # kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
     # mrz_region = cv2.dilate(mrz_region, kernel, iterations=1)
@@ -119,32 +328,47 @@ def get_bounding_boxes(
     )
     bounding_boxes = [cv2.boundingRect(contour) for contour in contours]
 
-    # Sort bounding boxes from left to right and top to bottom
-    bounding_boxes = _sort_bounding_boxes(bounding_boxes)
-    display_if_verbose(
-        "Original bounding boxes",
-        Image.fromarray(
-            draw_numerated_boxes(original_image.copy(), bounding_boxes)
-        ),
+    # Estimate the size of the characters, so the separator works regardless
+    # of the resolution of the image
+    character_height, line_spacing = estimate_character_size(bounding_boxes)
+    if character_height is None:
+        print_if_verbose(
+            "Could not estimate character size, using reference size", verbose
+        )
+        character_height = REFERENCE_CHARACTER_HEIGHT
+    print_if_verbose(
+        f"Estimated character height {character_height}, "
+        f"line spacing {line_spacing}",
         verbose,
     )
-    bounding_boxes_dropped = bounding_boxes.copy()
+
+    # Sort bounding boxes from left to right and top to bottom
+    bounding_boxes = _sort_bounding_boxes(
+        bounding_boxes, LINE_THRESHOLD_RATIO * character_height
+    )
+    # Only draw the boxes when displaying them, drawing needs a color copy
+    # of the whole image
+    if verbose:
+        display_if_verbose(
+            "Original bounding boxes",
+            draw_numerated_boxes(_color_copy(preprocessed), bounding_boxes),
+            verbose,
+        )
 
     # Drop bounding boxes that are too small or too large
     bounding_boxes_dropped = [
         bounding_box
         for bounding_box in bounding_boxes
-        if 75 < bounding_box[2] * bounding_box[3] < 1000
-        and bounding_box[3] > 15
-        and bounding_box[2] > 5
+        if _is_character_box(bounding_box, character_height, line_spacing)
     ]
-    display_if_verbose(
-        "After dropping small and large boxes",
-        Image.fromarray(
-            draw_numerated_boxes(original_image.copy(), bounding_boxes_dropped)
-        ),
-        verbose,
-    )
+    if verbose:
+        display_if_verbose(
+            "After dropping small and large boxes",
+            draw_numerated_boxes(
+                _color_copy(preprocessed), bounding_boxes_dropped
+            ),
+            verbose,
+        )
 
     # # Merge bounding boxes where a character is split
     # bounding_boxes_dropped = _merge_bounding_boxes(bounding_boxes_dropped)
@@ -162,4 +386,134 @@ def get_bounding_boxes(
     print_if_verbose(
         f"Found {len(bounding_boxes_dropped)} bounding boxes", verbose
     )
-    return bounding_boxes_dropped, preprocessed
+    return bounding_boxes_dropped
+
+
+def segment(
+    image, threshold: Optional[int], verbose=False, key: Optional[tuple] = None
+) -> Segmentation:
+    """Finds the characters in the image at a percentile threshold, reusing
+    the result if an image with the same pixels has been segmented at the
+    same threshold. The key is the hash of the small grayscale
+    segmentation_image, not of the image given, which may be much larger. An
+    image that is already binary is not cached, it is new for every call.
+
+    Args:
+        image: The MRZ region image, or its segmentation_image
+        threshold: The percentile threshold, or None if the image is already
+            preprocessed to a binary image
+        verbose: Whether to print debug information and display images
+        key: The image_key of the segmentation_image, to hash it once for
+            several thresholds
+    """
+    if threshold is None:
+        preprocessed = imutils.resize(image, width=SEGMENTATION_WIDTH)
+        boxes = find_bounding_boxes(preprocessed, verbose)
+        return _segmentation(preprocessed, boxes, threshold)
+    gray = segmentation_image(image)
+    if key is None:
+        key = image_key(gray)
+    cached = SEGMENTATION_CACHE.get(key, threshold)
+    if cached is not None:
+        print_if_verbose(f"Reusing segmentation at {threshold}", verbose)
+        return cached
+    binary = percentile_threshold(gray, threshold)
+    display_if_verbose(
+        f"After thresholding with threshold {threshold}", binary, verbose
+    )
+    boxes = find_bounding_boxes(binary, verbose)
+    # The characters are cropped in color, like the preprocessing does
+    preprocessed = cv2.cvtColor(binary, cv2.COLOR_GRAY2RGB)
+    segmentation = _segmentation(preprocessed, boxes, threshold)
+    SEGMENTATION_CACHE.put(key, threshold, segmentation)
+    return segmentation
+
+
+def _segmentation(preprocessed, boxes, threshold) -> Segmentation:
+    """The segmentation with read-only copies of the character crops, so it
+    does not keep the whole binary image in memory"""
+    character_images = []
+    for character_image in get_character_images(preprocessed, boxes):
+        character_image = character_image.copy()
+        character_image.flags.writeable = False
+        character_images.append(character_image)
+    boxes = np.array(boxes, dtype=int).reshape(-1, 4)
+    boxes.flags.writeable = False
+    return Segmentation(boxes, character_images, threshold)
+
+
+def is_binary(image) -> bool:
+    """Whether the image has at most two distinct values"""
+    low, high = image.min(), image.max()
+    return not np.any((image != low) & (image != high))
+
+
+def search_character_boxes(
+    image, preprocessed_image, verbose=False
+) -> tuple[Optional[Segmentation], int]:
+    """Finds the bounding boxes of the 88 MRZ characters. If no preprocessed
+    image is given, several thresholds are tried until 88 characters are
+    found. A preprocessed image that is not binary, like one that was only
+    resized or grayscaled, is not segmented, the image is thresholded at
+    FALLBACK_THRESHOLD instead.
+
+    Args:
+        image: The MRZ region image
+        preprocessed_image: The binary MRZ region image to use, or None to
+            use a variable threshold
+        verbose: Whether to print debug information and display images
+    Returns: the segmentation, or None if 88 characters could not be found,
+        and the number of segmentations tried
+    """
+    if preprocessed_image is not None and is_binary(preprocessed_image):
+        segmentations = (segment(preprocessed_image, None, verbose),)
+    elif preprocessed_image is not None:
+        print_if_verbose(
+            "The preprocessed image is not binary, thresholding at "
+            f"{FALLBACK_THRESHOLD}",
+            verbose,
+        )
+        segmentations = (segment(image, FALLBACK_THRESHOLD, verbose),)
+    else:
+        gray = segmentation_image(image)
+        key = image_key(gray)
+        segmentations = (
+            segment(gray, threshold, verbose, key)
+            for threshold in threshold_ladder(image)
+        )
+    attempts = 0
+    for segmentation in segmentations:
+        attempts += 1
+        if len(segmentation.boxes) == 88:
+            return segmentation, attempts
+    print_if_verbose("Could not find 88 characters", verbose)
+    return None, attempts
+
+
+def find_character_boxes(
+    image, preprocessed_image, verbose=False
+) -> Optional[Segmentation]:
+    """Finds the bounding boxes of the 88 MRZ characters, see
+    search_character_boxes
+
+    Returns: the segmentation, or None if 88 characters could not be found
+    """
+    return search_character_boxes(image, preprocessed_image, verbose)[0]
+
+
+def get_character_images(preprocessed_image, boxes):
+    """Crops every character out of the preprocessed image, with a margin of
+    one pixel around its bounding box.
+
+    Args:
+        preprocessed_image: The image the bounding boxes were found in
+        boxes: The bounding boxes of the characters
+    """
+    height, width = preprocessed_image.shape[:2]
+    return [
+        preprocessed_image[
+            max(y - 1, 0) : min(y + h + 1, height),
+            max(x - 1, 0) : min(x + w + 1, width),
+        ]
+        for x, y, w, h in boxes
+    ]
@@ -0,0 +1,189 @@
+"""Export the Keras character classifier to a quantised TensorFlow Lite model,
+and compare the accuracy and latency of the two on the labelled characters.
+
+Both are calibrated and compared on the characters the pipeline gives them:
+the crops the character separator finds in the labelled passport images, put
+through the input function of each backend.
+
+Export (int8 weights and activations, calibrated on the labelled passports):
+    python -m passport_mrz_reader.deep_learning.export_model export
+
+Compare the Keras model with the exported model:
+    python -m passport_mrz_reader.deep_learning.export_model compare
+
+Several models can be compared, for example a model trained on the native
+character size against the original model, relative to the first one:
+    python -m passport_mrz_reader.deep_learning.export_model compare
+        --keras-model <original model> <native size model> --tflite-model
+"""
+
+import argparse
+import os
+import pathlib
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from passport_mrz_reader.common.mrz_common import MRZ_CHARACTERS
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    find_character_boxes,
+)
+from passport_mrz_reader.deep_learning.model_input import to_model_input
+from passport_mrz_reader.deep_learning.tensor_flow_predictor import (
+    to_keras_input,
+)
+from passport_mrz_reader.deep_learning.tflite_predictor import (
+    TFLITE_MODEL_PATH,
+    TFLiteClassifier,
+)
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+PROJECT_ROOT = f"{os.path.dirname(__file__)}/.."
+KERAS_MODEL_PATH = f"{PROJECT_ROOT}/deep_learning/final_model/3"
+DATA_ROOT = f"{PROJECT_ROOT}/../data"
+LABELS_PATH = f"{DATA_ROOT}/labeled passport data.csv"
+IMAGES_PATH = f"{DATA_ROOT}/images/PRADO MRZ"
+# One passport is 88 characters, which are classified in one batch
+PASSPORT_CHARACTERS = 88
+
+
+def passport_characters(
+    labels_path: str, images_path: str
+) -> tuple[list[np.ndarray], np.ndarray]:
+    """The character crops the character separator finds in the labelled
+    passport images, at the variable threshold like the deep learning engine,
+    labelled with their characters in the order of MRZ_CHARACTERS, which is
+    the alphanumerical order of the training folders. Images in which 88
+    characters are not found are skipped.
+
+    Returns: tuple of (character crops, labels)
+    """
+    images, labels = [], []
+    for file_name, text in label_pairs(load_labels(labels_path)):
+        segmentation = find_character_boxes(
+            load_image(f"{images_path}/{file_name}"), None
+        )
+        if segmentation is None:
+            continue
+        images += segmentation.character_images
+        labels += [
+            MRZ_CHARACTERS.index(character)
+            for character in text.replace("\n", "")
+        ]
+    return images, np.array(labels)
+
+
+def export(
+    keras_model_path: str, output_path: str, labels_path: str, images_path: str
+):
+    """Convert the Keras model to a TensorFlow Lite model with int8 weights
+    and activations, calibrated on the characters of the labelled passports
+    as the TensorFlow Lite backend gives them to the model. The input stays
+    uint8 pixel values, which the rescaling layer of the model maps exactly
+    to its quantised range."""
+    model = tf.keras.models.load_model(keras_model_path)
+    _, height, width, channels = model.input_shape
+    calibration_images, _ = passport_characters(labels_path, images_path)
+
+    def representative_dataset():
+        for image in calibration_images:
+            yield [to_model_input([image], height, width, channels)]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    tflite_model = converter.convert()
+    pathlib.Path(output_path).write_bytes(tflite_model)
+    print(
+        f"Wrote {output_path} ({len(tflite_model) / 1024:.0f} KiB), "
+        f"calibrated on {len(calibration_images)} characters"
+    )
+
+
+def _evaluate(predict, images, labels) -> tuple[float, float]:
+    """Measure the accuracy and the median latency per passport in seconds of
+    a predict function, which takes a list of images and returns the scores of
+    every class"""
+    predict(images[:PASSPORT_CHARACTERS])  # Warm up
+    predictions, durations = [], []
+    for start in range(0, len(images), PASSPORT_CHARACTERS):
+        batch = images[start : start + PASSPORT_CHARACTERS]
+        started = time.perf_counter()
+        predictions.append(np.argmax(predict(batch), axis=1))
+        durations.append(
+            (time.perf_counter() - started) * PASSPORT_CHARACTERS / len(batch)
+        )
+    accuracy = float(np.mean(np.concatenate(predictions) == labels))
+    return accuracy, float(np.median(durations))
+
+
+def _keras_predict(model_path: str):
+    """Predict function for a Keras model, with the input the Keras backend
+    gives it"""
+    model = tf.keras.models.load_model(model_path)
+    _, height, width, channels = model.input_shape
+    return lambda batch: model(
+        to_keras_input(batch, height, width, channels), training=False
+    ).numpy()
+
+
+def compare(
+    keras_model_paths: list[str],
+    tflite_model_paths: list[str],
+    labels_path: str,
+    images_path: str,
+):
+    """Compare the accuracy and latency of Keras models and TensorFlow Lite
+    models on the characters of the labelled passports, relative to the first
+    model"""
+    images, labels = passport_characters(labels_path, images_path)
+    print(f"Evaluating on {len(images)} characters from {images_path}")
+
+    models = [(path, _keras_predict(path)) for path in keras_model_paths]
+    models += [
+        (path, TFLiteClassifier(path).predict) for path in tflite_model_paths
+    ]
+    baseline_latency = None
+    for path, predict in models:
+        accuracy, latency = _evaluate(predict, images, labels)
+        baseline_latency = baseline_latency or latency
+        print(
+            f"{path}\n"
+            f"    accuracy: {accuracy:.2%}    "
+            f"latency per passport: {latency * 1000:.1f} ms    "
+            f"speedup: {baseline_latency / latency:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["export", "compare"])
+    parser.add_argument("--keras-model", nargs="+", default=[KERAS_MODEL_PATH])
+    parser.add_argument(
+        "--tflite-model", nargs="*", default=[TFLITE_MODEL_PATH]
+    )
+    parser.add_argument(
+        "--labels",
+        default=LABELS_PATH,
+        help="CSV file with the labelled MRZ of the passport images",
+    )
+    parser.add_argument(
+        "--images",
+        default=IMAGES_PATH,
+        help="Folder with the passport images",
+    )
+    args = parser.parse_args()
+    if args.command == "export":
+        export(
+            args.keras_model[0],
+            args.tflite_model[0],
+            args.labels,
+            args.images,
+        )
+    else:
+        compare(args.keras_model, args.tflite_model, args.labels, args.images)
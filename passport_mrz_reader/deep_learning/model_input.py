@@ -0,0 +1,51 @@
+"""The input of the TensorFlow Lite export of the character classifier, the
+same input the Keras model is given by tensor_flow_predictor.to_keras_input.
+
+The model was trained on character crops that were saved as JPEG files and
+read back by image_dataset_from_directory: JPEG encoded, decoded and resized
+bilinearly to floats. This module reproduces that with OpenCV, so the
+TensorFlow Lite backend does not import TensorFlow and works with only
+tflite_runtime installed. The resizing matches tf.image.resize to float
+precision, but TensorFlow decodes JPEG with the fast integer inverse DCT,
+which OpenCV does not offer, so the edges of a character can differ by a few
+gray levels. The exported model is calibrated and compared on these inputs,
+see export_model.py.
+"""
+
+import cv2
+import numpy as np
+
+
+def decode_character(data, channels: int) -> np.ndarray:
+    """Decode an encoded character image to the number of channels, in RGB
+    order like tf.io.decode_image"""
+    data = np.frombuffer(data, dtype=np.uint8)
+    if channels == 1:
+        image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+        return image[..., np.newaxis]
+    return cv2.cvtColor(
+        cv2.imdecode(data, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB
+    )
+
+
+def to_model_input(character_images, height: int, width: int, channels: int):
+    """Resize character images to the input size of the model, the way
+    image_dataset_from_directory did when the crops were saved as JPEG files
+    and read back: encoded as JPEG, decoded and resized bilinearly without
+    rounding, like tf.image.resize. Done in memory, so concurrent calls do
+    not share any files.
+
+    Returns: a float32 batch of shape (images, height, width, channels) with
+        pixel values between 0 and 255
+    """
+    batch = np.empty(
+        (len(character_images), height, width, channels), dtype=np.float32
+    )
+    for index, character_image in enumerate(character_images):
+        _, jpeg = cv2.imencode(".jpeg", np.ascontiguousarray(character_image))
+        decoded = decode_character(jpeg, channels).astype(np.float32)
+        resized = cv2.resize(
+            decoded, (width, height), interpolation=cv2.INTER_LINEAR
+        )
+        batch[index] = resized.reshape(height, width, channels)
+    return batch
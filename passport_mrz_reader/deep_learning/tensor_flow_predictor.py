@@ -1,25 +1,21 @@
 """Module of helper functions used to predict mrz field with TensorFlow deep learning model"""
 
 import os
-import sys
-import pathlib
+import threading
+from functools import lru_cache
 from typing import Optional
 
 import cv2
-import imutils
 import numpy as np
 from PIL import Image
 
 
 import tensorflow as tf
-from passport_mrz_reader.common.interfaces import (
-    PostProcessorMetadata,
-    PreProcessors,
-)
+from passport_mrz_reader.common.interfaces import PostProcessorMetadata
 from passport_mrz_reader.common.mrz_common import print_if_verbose
 
 from passport_mrz_reader.custom_character_separator.custom_character_separator import (
-    get_bounding_boxes,
+    search_character_boxes,
 )
 
 VALUE_TO_LETTER = {
@@ -62,107 +58,111 @@ VALUE_TO_LETTER = {
     36: "<",
 }
 
-# Load model
 PROJECT_ROOT = f"{os.path.dirname(__file__)}/.."
 MODEL_PATH = f"{PROJECT_ROOT}/deep_learning/final_model/3"
-MODEL = tf.keras.models.load_model(MODEL_PATH)
-
-
-def create_image_folder(original_image: Image, preprocessed_image, verbose=False):
-    """Create folder for each character in an image"""
-
-    # Create folder
-    base_folder = f"{PROJECT_ROOT}/deep_learning/empty_temp"
-    folder = os.path.join(base_folder, "temp_folder")
-    if not os.path.exists(folder):
-        os.makedirs(folder)
-
-    # Add each character to folder as standalone image
-    variable_threshold = preprocessed_image is None
-    original_image = imutils.resize(original_image, width=1200)
-    threshold_values = [10, 8, 12, 6, 14] if variable_threshold else [10]
-    boxes = []
-    index = 0
-    while len(boxes) != 88:
-        if index == len(threshold_values):
-            print_if_verbose("Could not find 88 characters", verbose)
-            return -1, None
-        boxes, preprocessed_image = get_bounding_boxes(
-            original_image,
-            PreProcessors(grayscale=True, threshold=threshold_values[index]),
-            verbose,
+
+# Keras does not promise that a model can be called from several threads at
+# once, so calls to the models are serialised. Loading is locked separately,
+# so two threads do not load the same model twice.
+MODEL_LOCK = threading.Lock()
+_LOAD_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_model(model_path: str):
+    return tf.keras.models.load_model(model_path)
+
+
+def limit_threads(threads: int):
+    """Limit the intra- and inter-op threads of TensorFlow, which only takes
+    effect before TensorFlow is initialised"""
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(threads)
+    except RuntimeError:
+        # Already initialised, like in a worker forked from a parent that
+        # loaded the model with the limits
+        pass
+
+
+def load_model(model_path: str = MODEL_PATH, threads: Optional[int] = None):
+    """Load the model once per path, on the first call rather than when
+    this module is imported
+
+    Args:
+        model_path: The path of the Keras model
+        threads: The threads TensorFlow may use, unlimited if None
+    """
+    with _LOAD_LOCK:
+        if threads is not None:
+            limit_threads(threads)
+        return _load_model(model_path)
+
+
+def to_keras_input(character_images, height: int, width: int, channels: int):
+    """Resize character images to the input size of the Keras model, the way
+    image_dataset_from_directory did when the crops were saved as JPEG files
+    and read back: encoded as JPEG, decoded by TensorFlow and resized
+    bilinearly. The model was trained and evaluated on such inputs. Done in
+    memory, so concurrent calls do not share any files. The TensorFlow Lite
+    model is given the same input by model_input.to_model_input.
+
+    Returns: a float32 batch of shape (images, height, width, channels) with
+        pixel values between 0 and 255
+    """
+    batch = []
+    for character_image in character_images:
+        _, jpeg = cv2.imencode(".jpeg", np.ascontiguousarray(character_image))
+        decoded = tf.io.decode_image(
+            jpeg.tobytes(), channels=channels, expand_animations=False
         )
-        index += 1
-    box_heights = []
-    for i, box in enumerate(boxes):
-        x, y, w, h = box
-        box_heights.append(h)
-        character_image = preprocessed_image[y - 1 : y + h + 1, x - 1 : x + w + 1]
-        folder = f"{folder}"
-        if i < 10:
-            temp = f"0{i}"
-        else:
-            temp = i
-        try:
-            cv2.imwrite(f"{folder}/box_{temp}.jpeg", character_image)
-        except cv2.error:
-            continue
-    return folder, box_heights
-
-
-def format_dataset(path: pathlib.Path):
-    """Format image to fit model input"""
-    # Redirect stdout to avoid printing
-    stdout = sys.stdout
-    sys.stdout = open(os.devnull, "w")
-    dataset = tf.keras.utils.image_dataset_from_directory(
-        path,
-        labels=None,
-        image_size=(180, 180),
-        batch_size=32,
-        shuffle=False,
+        batch.append(tf.image.resize(decoded, (height, width)))
+    return tf.stack(batch)
+
+
+def predict_characters(
+    character_images, verbose=False, model_path: str = MODEL_PATH
+) -> tuple[str, list[float]]:
+    """Predict the MRZ text from the images of its 88 characters. The images
+    are classified in memory, so concurrent calls do not share any files.
+
+    Returns: the MRZ text and the probability of every predicted character
+    """
+    model = load_model(model_path)
+    _, height, width, channels = model.input_shape
+    batch = to_keras_input(character_images, height, width, channels)
+    with MODEL_LOCK:
+        predictions = model(batch, training=False).numpy()
+
+    mrz_text = "".join(
+        VALUE_TO_LETTER[index] for index in np.argmax(predictions, axis=1)
     )
-    sys.stdout = stdout
-    return dataset
-
-
-def predict_letter(path: pathlib.Path, verbose=False):
-    """Load model and predict letter in image from path"""
-
-    tensor = format_dataset(path)
-    predictions = MODEL.predict(tensor, verbose=verbose)
-
-    # Remove temp files
-    for file in os.listdir(path):
-        os.remove(os.path.join(path, file))
-    os.rmdir(path)
-
-    mrz = []
-    # For debugging, possibly future preprocessing
-    # index = 0
-    for prediction in predictions:
-        # For debugging, possibly future postprocessing
-        # print(prediction)
-        # print(np.argmax(prediction), tensor.file_paths[index])
-        # index +=1
-        mrz.append(VALUE_TO_LETTER[np.argmax(prediction)])
-    mrz_text = "".join(mrz)
     mrz_text = f"{mrz_text[0:44]}\n{mrz_text[44:]}"
     print_if_verbose(f"MRZ text before postprocessing:\n{mrz_text}", verbose)
-    return mrz_text
+    return mrz_text, np.max(predictions, axis=1).tolist()
 
 
 def make_prediction(
-    original_image: Image, preprocessed_image: Image, verbose=False
+    original_image: Image,
+    preprocessed_image: Image,
+    verbose=False,
+    model_path: str = MODEL_PATH,
 ) -> Optional[tuple[str, PostProcessorMetadata]]:
     """Make prediction for mrz, return mrz value"""
-    folder, box_heights = create_image_folder(
+    segmentation, attempts = search_character_boxes(
         original_image, preprocessed_image, verbose
     )
-    if folder == -1:
+    if segmentation is None:
         print_if_verbose("An error ocurred", verbose)
-        return None, PostProcessorMetadata()
+        return None, PostProcessorMetadata(attempts=attempts)
 
-    return predict_letter(folder, verbose), PostProcessorMetadata(
-        box_heights=box_heights
+    mrz_text, confidences = predict_characters(
+        segmentation.character_images, verbose, model_path
+    )
+    return mrz_text, PostProcessorMetadata(
+        box_heights=segmentation.boxes[:, 3].tolist(),
+        boxes=segmentation.boxes,
+        threshold=segmentation.threshold,
+        attempts=attempts,
+        confidences=confidences,
     )
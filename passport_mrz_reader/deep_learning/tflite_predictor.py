@@ -0,0 +1,135 @@
+"""Module of helper functions used to predict the MRZ with a TensorFlow Lite
+export of the deep learning model. Only the TensorFlow Lite interpreter is
+needed, so the full TensorFlow package does not have to be imported when
+tflite_runtime is installed.
+
+The model is created from the Keras model with export_model.py.
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    # Fall back to the interpreter bundled with the full TensorFlow package
+    import tensorflow as tf
+
+    Interpreter = tf.lite.Interpreter
+
+from passport_mrz_reader.common.interfaces import PostProcessorMetadata
+from passport_mrz_reader.common.mrz_common import (
+    MRZ_CHARACTERS,
+    print_if_verbose,
+)
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    search_character_boxes,
+)
+from passport_mrz_reader.deep_learning.model_input import to_model_input
+
+PROJECT_ROOT = f"{os.path.dirname(__file__)}/.."
+TFLITE_MODEL_PATH = (
+    f"{PROJECT_ROOT}/deep_learning/final_model/model_int8.tflite"
+)
+
+
+class TFLiteClassifier:
+    """Classifies character images with a TensorFlow Lite model, which may be
+    quantised. An interpreter can only run one inference at a time, so
+    concurrent predictions wait for each other."""
+
+    def __init__(self, model_path: str):
+        self._interpreter = Interpreter(model_path=model_path)
+        self._input = self._interpreter.get_input_details()[0]
+        self._output = self._interpreter.get_output_details()[0]
+        _, self.height, self.width, self.channels = self._input["shape"]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _resize_batch(self, batch_size: int):
+        """Resize the input tensor, which is only done when the number of
+        characters changes"""
+        if batch_size == self._batch_size:
+            return
+        self._interpreter.resize_tensor_input(
+            self._input["index"],
+            [batch_size, self.height, self.width, self.channels],
+        )
+        self._interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def predict(self, character_images) -> np.ndarray:
+        """Predict the class of every character image
+
+        Returns: the probability of every class for every image
+        """
+        batch = to_model_input(
+            character_images, self.height, self.width, self.channels
+        )
+        if np.issubdtype(self._input["dtype"], np.integer):
+            # Quantise the input the same way the model was calibrated
+            scale, zero_point = self._input["quantization"]
+            info = np.iinfo(self._input["dtype"])
+            batch = np.clip(
+                np.round(batch / scale + zero_point), info.min, info.max
+            )
+        with self._lock:
+            self._resize_batch(len(batch))
+            self._interpreter.set_tensor(
+                self._input["index"], batch.astype(self._input["dtype"])
+            )
+            self._interpreter.invoke()
+            output = self._interpreter.get_tensor(self._output["index"])
+        if np.issubdtype(self._output["dtype"], np.integer):
+            scale, zero_point = self._output["quantization"]
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+_LOAD_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def _load_classifier(model_path: str) -> TFLiteClassifier:
+    return TFLiteClassifier(model_path)
+
+
+def load_classifier(model_path: str = TFLITE_MODEL_PATH) -> TFLiteClassifier:
+    """Load the model once per path, also when called from several threads"""
+    with _LOAD_LOCK:
+        return _load_classifier(model_path)
+
+
+def make_prediction(
+    original_image,
+    preprocessed_image,
+    verbose=False,
+    model_path: str = TFLITE_MODEL_PATH,
+) -> Optional[tuple[str, PostProcessorMetadata]]:
+    """Make prediction for mrz, return mrz value"""
+    segmentation, attempts = search_character_boxes(
+        original_image, preprocessed_image, verbose
+    )
+    if segmentation is None:
+        print_if_verbose("An error ocurred", verbose)
+        return None, PostProcessorMetadata(attempts=attempts)
+
+    predictions = load_classifier(model_path).predict(
+        segmentation.character_images
+    )
+    mrz_text = "".join(
+        MRZ_CHARACTERS[index] for index in np.argmax(predictions, axis=1)
+    )
+    mrz_text = f"{mrz_text[0:44]}\n{mrz_text[44:]}"
+    print_if_verbose(f"MRZ text before postprocessing:\n{mrz_text}", verbose)
+    return mrz_text, PostProcessorMetadata(
+        box_heights=segmentation.boxes[:, 3].tolist(),
+        boxes=segmentation.boxes,
+        threshold=segmentation.threshold,
+        attempts=attempts,
+        confidences=np.max(predictions, axis=1).tolist(),
+    )
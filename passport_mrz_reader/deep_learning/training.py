@@ -1,79 +1,164 @@
-"""Module for creating a deep learning model, that can be trained"""
+"""Module for creating a deep learning model, that can be trained.
 
-import pathlib
-
-import tensorflow as tf
+The defaults reproduce the original model, which upscales every character to
+180x180 RGB. Characters are only around 20x30 pixels, so a model trained on
+the native size is much cheaper to run, for example:
+    python -m passport_mrz_reader.deep_learning.training --image-size 32
+        --grayscale --output passport_mrz_reader/deep_learning/final_model/32
 
+Instead of storing noisy copies of the characters on disk, the training images
+are augmented on the fly by new_training_data/augmentation.py. The decoded
+images are kept in memory, so the augmentation is the only work repeated every
+epoch, and every class is drawn equally often.
 
-data_dir = pathlib.Path("data/images/train/final_trainingset/")
-checkpoint_path = pathlib.Path(
-    "passport_mrz_reader/deep_learning/final_model/{epoch}/"
-)
-
+Any model trained by this script can be used by the DeepLearning engine, which
+reads the input size from the model.
+"""
 
-train_dataset = tf.keras.utils.image_dataset_from_directory(
-    data_dir,
-    validation_split=0.2,
-    subset="training",
-    seed=123,
-    image_size=(180, 180),
-    batch_size=32,
-    shuffle=True,
-)
-
-validation_dataset = tf.keras.utils.image_dataset_from_directory(
-    data_dir,
-    validation_split=0.2,
-    subset="validation",
-    seed=123,
-    image_size=(180, 180),
-    batch_size=32,
-    shuffle=True,
-)
+import argparse
+import pathlib
 
-normalization_layer = tf.keras.layers.Rescaling(1.0 / 255)
+import numpy as np
+import tensorflow as tf
 
-normalized_dataset = train_dataset.map(
-    lambda x, y: (normalization_layer(x), y)
+from passport_mrz_reader.new_training_data.augmentation import (
+    augmented_batches,
+    load_character_images,
 )
-image_batch, labels_batch = next(iter(normalized_dataset))
-
-AUTOTUNE = tf.data.AUTOTUNE
-
-train_dataset = train_dataset.cache().prefetch(buffer_size=AUTOTUNE)
-validation_dataset = validation_dataset.cache().prefetch(buffer_size=AUTOTUNE)
 
 NUM_CLASSES = 37
-
-model = tf.keras.Sequential(
-    [
-        tf.keras.layers.Rescaling(1.0 / 255),
-        tf.keras.layers.Conv2D(32, 3, activation="relu"),
-        tf.keras.layers.MaxPooling2D(),
-        tf.keras.layers.Conv2D(32, 3, activation="relu"),
-        tf.keras.layers.MaxPooling2D(),
-        tf.keras.layers.Conv2D(32, 3, activation="relu"),
-        tf.keras.layers.MaxPooling2D(),
-        tf.keras.layers.Flatten(),
-        tf.keras.layers.Dense(128, activation="relu"),
-        tf.keras.layers.Dense(NUM_CLASSES),
-    ]
-)
-
-checkpoint_callback = tf.keras.callbacks.ModelCheckpoint(
-    filepath=checkpoint_path, save_weights_only=False, verbose=1
-)
-
-model.compile(
-    optimizer="adam",
-    loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
-    metrics=["accuracy"],
-)
+VALIDATION_SPLIT = 0.2
+AUTOTUNE = tf.data.AUTOTUNE
 
 
-model.fit(
-    train_dataset,
-    validation_data=validation_dataset,
-    epochs=5,
-    callbacks=checkpoint_callback,
-)
+def load_datasets(
+    data_dir: str,
+    image_size: int,
+    grayscale: bool,
+    batch_size: int,
+    augment: bool,
+    seed: int,
+) -> tuple[tf.data.Dataset, tf.data.Dataset]:
+    """Load the training and validation datasets from a directory with one
+    folder of character images per class. The training images are augmented
+    on the fly if augment is set. The datasets that are the same every epoch
+    are cached as tensors, and every dataset is prefetched, so the next
+    batch, like the augmentation of it, is made while the model trains."""
+    images, labels = load_character_images(data_dir, image_size, grayscale)
+    rng = np.random.default_rng(seed)
+    validation = rng.random(len(images)) < VALIDATION_SPLIT
+    print(
+        f"Found {len(images)} images, using {np.sum(~validation)} for "
+        f"training and {np.sum(validation)} for validation"
+    )
+    train_images, train_labels = images[~validation], labels[~validation]
+
+    validation_dataset = (
+        tf.data.Dataset.from_tensor_slices(
+            (images[validation], labels[validation])
+        )
+        .batch(batch_size)
+        .cache()
+        .prefetch(buffer_size=AUTOTUNE)
+    )
+    if not augment:
+        train_dataset = (
+            tf.data.Dataset.from_tensor_slices((train_images, train_labels))
+            .cache()
+            .shuffle(len(train_images), seed=seed)
+            .batch(batch_size)
+            .prefetch(buffer_size=AUTOTUNE)
+        )
+        return train_dataset, validation_dataset
+
+    channels = images.shape[-1]
+    train_dataset = tf.data.Dataset.from_generator(
+        # The generator is restarted every epoch, but the random generator
+        # continues, so every epoch gets new variations
+        lambda: augmented_batches(train_images, train_labels, batch_size, rng),
+        output_signature=(
+            tf.TensorSpec(
+                (None, image_size, image_size, channels), dtype=tf.uint8
+            ),
+            tf.TensorSpec((None,), dtype=tf.int32),
+        ),
+    )
+    return train_dataset.prefetch(buffer_size=AUTOTUNE), validation_dataset
+
+
+def build_model(image_size: int, channels: int) -> tf.keras.Sequential:
+    """The character classifier, taking images with pixel values between 0
+    and 255"""
+    return tf.keras.Sequential(
+        [
+            tf.keras.Input(shape=(image_size, image_size, channels)),
+            tf.keras.layers.Rescaling(1.0 / 255),
+            tf.keras.layers.Conv2D(32, 3, activation="relu"),
+            tf.keras.layers.MaxPooling2D(),
+            tf.keras.layers.Conv2D(32, 3, activation="relu"),
+            tf.keras.layers.MaxPooling2D(),
+            tf.keras.layers.Conv2D(32, 3, activation="relu"),
+            tf.keras.layers.MaxPooling2D(),
+            tf.keras.layers.Flatten(),
+            tf.keras.layers.Dense(128, activation="relu"),
+            tf.keras.layers.Dense(NUM_CLASSES),
+        ]
+    )
+
+
+def train(args: argparse.Namespace):
+    """Train a model with the given configuration, saving a checkpoint of
+    the full model after every epoch"""
+    train_dataset, validation_dataset = load_datasets(
+        args.data_dir,
+        args.image_size,
+        args.grayscale,
+        args.batch_size,
+        args.augment,
+        args.seed,
+    )
+
+    model = build_model(args.image_size, 1 if args.grayscale else 3)
+    model.compile(
+        optimizer="adam",
+        loss=tf.keras.losses.SparseCategoricalCrossentropy(from_logits=True),
+        metrics=["accuracy"],
+    )
+    checkpoint_callback = tf.keras.callbacks.ModelCheckpoint(
+        filepath=pathlib.Path(args.output, "{epoch}"),
+        save_weights_only=False,
+        verbose=1,
+    )
+    model.fit(
+        train_dataset,
+        validation_data=validation_dataset,
+        epochs=args.epochs,
+        callbacks=checkpoint_callback,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--data-dir",
+        default="data/images/train/final_trainingset/",
+        help="Folder with one folder of character images per class, or a "
+        "folder of shards made by utils/shards.py",
+    )
+    parser.add_argument(
+        "--output",
+        default="passport_mrz_reader/deep_learning/final_model",
+        help="Folder to save a model to after every epoch",
+    )
+    parser.add_argument("--image-size", type=int, default=180)
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=123)
+    parser.add_argument(
+        "--no-augment",
+        dest="augment",
+        action="store_false",
+        help="Train on the characters as they are",
+    )
+    train(parser.parse_args())
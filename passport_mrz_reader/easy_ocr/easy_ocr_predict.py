@@ -1,12 +1,28 @@
-"""In this module EasyOCR is used to predict the MRZ of passports"""
+"""In this module EasyOCR is used to predict the MRZ of passports.
 
+The text detector of EasyOCR is much slower than its recognizer, and the
+thresholds only change the pixels, not where the MRZ lines are. The lines are
+therefore detected once per image, and every threshold attempt only runs the
+recognizer on the two line crops.
+"""
+
+import threading
 from typing import Optional
+
 import easyocr
+import imutils
+import numpy as np
+
 from passport_mrz_reader.common.interfaces import (
     PostProcessorMetadata,
     PreProcessors,
 )
 from passport_mrz_reader.common.preprocessing import preprocess
+from passport_mrz_reader.common.thresholds import threshold_ladder
+from passport_mrz_reader.easy_ocr.line_boxes import (
+    free_box_rectangles,
+    mrz_line_boxes,
+)
 
 from passport_mrz_reader.common.mrz_common import (
     MRZ_CHARACTERS,
@@ -15,42 +31,92 @@ from passport_mrz_reader.common.mrz_common import (
 
 # Load model
 READER = easyocr.Reader(["en"], gpu=False, verbose=False)
+# The reader keeps state between the detection and recognition steps, so
+# only one thread may use it at a time
+READER_LOCK = threading.Lock()
+# The width preprocess resizes to, the lines are detected at the same width
+# so the boxes fit every thresholded image
+WIDTH = 1200
+
+
+def detect_lines(image, verbose=False) -> list[list[int]]:
+    """Find the MRZ lines of an image resized to WIDTH, with a single pass
+    of the text detector. The rotated boxes the detector finds in a skewed
+    image are merged into the lines by their bounding rectangles."""
+    with READER_LOCK:
+        horizontal_list, free_list = READER.detect(image)
+    lines = mrz_line_boxes(
+        list(horizontal_list[0]) + free_box_rectangles(free_list[0])
+    )
+    print_if_verbose(f"Detected MRZ lines {lines}", verbose)
+    return lines
+
+
+def recognize_lines(image, lines: list[list[int]]) -> list[tuple[str, float]]:
+    """Read the text and the confidence of every line of the image, with only
+    the recognizer"""
+    with READER_LOCK:
+        result = READER.recognize(
+            image,
+            horizontal_list=lines,
+            free_list=[],
+            allowlist=MRZ_CHARACTERS,
+        )
+    return [(text, float(confidence)) for _, text, confidence in result]
 
 
 def get_raw_mrz_text(
     original_image, preprocessed_image, verbose=False
-) -> Optional[tuple[str, PostProcessorMetadata]]:
+) -> tuple[Optional[str], PostProcessorMetadata]:
     """Get the raw MRZ text using EasyOCR
 
     Args:
-        mrz_region(numpy.ndarray): The MRZ region of the passport
-        verbose(bool): Whether to print verbose information
+        original_image: The MRZ region of the passport
+        preprocessed_image: The preprocessed MRZ region to use, or None to
+            try several thresholds
+        verbose: Whether to print verbose information
     """
     variable_threshold = preprocessed_image is None
-    threshold_values = [10, 8, 12, 6, 14] if variable_threshold else [-1]
-    i = 0
-    result = None
-    while result is None:
-        if i == len(threshold_values):
-            print_if_verbose(
-                f"No result found",
-                verbose,
-            )
-            return None
+    threshold_values = (
+        threshold_ladder(original_image) if variable_threshold else [-1]
+    )
+    lines = detect_lines(
+        (
+            imutils.resize(original_image, width=WIDTH)
+            if variable_threshold
+            else preprocessed_image
+        ),
+        verbose,
+    )
+    if not lines:
+        print_if_verbose("No text found", verbose)
+        return None, PostProcessorMetadata(attempts=0)
+    for attempt, threshold in enumerate(threshold_values, start=1):
         preprocessed_image = (
             preprocess(
                 original_image,
-                PreProcessors(grayscale=True, threshold=threshold_values[i]),
+                PreProcessors(grayscale=True, threshold=threshold),
                 verbose=verbose,
             )
             if variable_threshold
             else preprocessed_image
         )
-        result = READER.readtext(
-            preprocessed_image, detail=0, allowlist=MRZ_CHARACTERS
-        )
-        if result:
-            raw_mrz_text = "\n".join(result)
-            print_if_verbose(f"Raw MRZ text:\n{raw_mrz_text}", verbose)
-            return raw_mrz_text, PostProcessorMetadata()
-    return None
+        result = recognize_lines(preprocessed_image, lines)
+        if any(text for text, _ in result):
+            raw_mrz_text = "\n".join(text for text, _ in result)
+            line_confidences = [confidence for _, confidence in result]
+            print_if_verbose(
+                f"Raw MRZ text:\n{raw_mrz_text}\n"
+                f"Line confidences: {line_confidences}",
+                verbose,
+            )
+            return raw_mrz_text, PostProcessorMetadata(
+                threshold=threshold if variable_threshold else None,
+                attempts=attempt,
+                confidences=np.repeat(
+                    line_confidences, [len(text) for text, _ in result]
+                ).tolist(),
+                line_confidences=line_confidences,
+            )
+    print_if_verbose("No result found", verbose)
+    return None, PostProcessorMetadata(attempts=len(threshold_values))
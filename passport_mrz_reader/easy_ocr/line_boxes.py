@@ -0,0 +1,58 @@
+"""Merging the text boxes of EasyOCR's detector into the MRZ lines.
+
+This module does not import EasyOCR, so the boxes can be worked on and tested
+without loading its models.
+"""
+
+# Margin around a line, as a share of its height
+LINE_MARGIN = 0.2
+
+
+def free_box_rectangles(free_boxes) -> list[list[int]]:
+    """The [x_min, x_max, y_min, y_max] bounding rectangle of every rotated
+    or tilted box of the detector, which it gives as four [x, y] corners"""
+    rectangles = []
+    for corners in free_boxes:
+        xs = [x for x, _ in corners]
+        ys = [y for _, y in corners]
+        rectangles.append(
+            [int(min(xs)), int(max(xs)), int(min(ys)), int(max(ys))]
+        )
+    return rectangles
+
+
+def mrz_line_boxes(boxes, count: int = 2) -> list[list[int]]:
+    """Merge the boxes of the text detector into lines, and keep the bottom
+    lines, where the MRZ is
+
+    Args:
+        boxes: The [x_min, x_max, y_min, y_max] box of every piece of text
+        count: The number of lines to keep
+    Returns: the [x_min, x_max, y_min, y_max] box of every line, from the top
+    """
+    lines: list[list[int]] = []
+    for x_min, x_max, y_min, y_max in sorted(
+        boxes, key=lambda box: (box[2] + box[3]) / 2
+    ):
+        centre = (y_min + y_max) / 2
+        # The box continues the last line if its centre is within it
+        if lines and lines[-1][2] <= centre <= lines[-1][3]:
+            line = lines[-1]
+            line[:] = [
+                min(line[0], x_min),
+                max(line[1], x_max),
+                min(line[2], y_min),
+                max(line[3], y_max),
+            ]
+        else:
+            lines.append([x_min, x_max, y_min, y_max])
+    kept = lines[-count:]
+    for line in kept:
+        margin = int((line[3] - line[2]) * LINE_MARGIN)
+        line[:] = [
+            max(line[0] - margin, 0),
+            line[1] + margin,
+            max(line[2] - margin, 0),
+            line[3] + margin,
+        ]
+    return [[int(value) for value in line] for line in kept]
@@ -0,0 +1,194 @@
+"""Augmentation of the character images used for training, generating new
+variations in memory every epoch instead of storing noisy copies on disk.
+
+All images are uint8 and are augmented a batch at a time. Every random choice
+is drawn from a numpy Generator, so seeding it makes training reproducible.
+"""
+
+import pathlib
+from dataclasses import dataclass
+from typing import Iterator
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.utils.shards import (
+    decode_characters,
+    is_shard_directory,
+)
+
+
+@dataclass
+class AugmentationOptions:
+    """How strongly, and how often, each augmentation is applied"""
+
+    noise_probability: float = 0.5
+    noise_sigma: float = 12.0
+    blur_probability: float = 0.3
+    threshold_probability: float = 0.3
+    # Range of the threshold applied to a blurred character, a low threshold
+    # thins the strokes and a high threshold thickens them
+    threshold_range: tuple[int, int] = (96, 176)
+    affine_probability: float = 0.7
+    max_rotation: float = 3.0
+    max_shift: float = 0.06
+    max_scale: float = 0.1
+
+
+def _read_character_files(
+    directory: str, grayscale: bool
+) -> Iterator[tuple[str, np.ndarray]]:
+    """Read the images of a directory with one folder per class, yielding
+    (class name, image)"""
+    for class_dir in sorted(pathlib.Path(directory).iterdir()):
+        if not class_dir.is_dir():
+            continue
+        for file in sorted(class_dir.iterdir()):
+            image = cv2.imread(
+                str(file),
+                cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR,
+            )
+            if image is not None:
+                yield class_dir.name, image
+
+
+def read_character_images(
+    directory: str, grayscale: bool
+) -> Iterator[tuple[str, np.ndarray]]:
+    """Read the character images of a directory with one folder per class,
+    or of a directory of shards made by utils/shards.py, yielding (class
+    name, image) at their original size"""
+    if is_shard_directory(directory):
+        return decode_characters(directory, grayscale)
+    return _read_character_files(directory, grayscale)
+
+
+def load_character_images(
+    directory: str, image_size: int, grayscale: bool
+) -> tuple[np.ndarray, np.ndarray]:
+    """Load character images from a directory with one folder per class, or
+    from a directory of shards made by utils/shards.py, resized to a square
+    of image_size. The classes are labelled in the same alphanumerical order
+    as image_dataset_from_directory uses.
+
+    Returns: tuple of (uint8 images of shape (n, size, size, channels),
+        labels)
+    """
+    images, class_names = [], []
+    for class_name, image in read_character_images(directory, grayscale):
+        image = cv2.resize(
+            image, (image_size, image_size), interpolation=cv2.INTER_LINEAR
+        )
+        if grayscale:
+            image = image[..., np.newaxis]
+        else:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        images.append(image)
+        class_names.append(class_name)
+    classes = sorted(set(class_names))
+    labels = np.searchsorted(classes, class_names).astype(np.int32)
+    return np.stack(images), labels
+
+
+def _choose(rng: np.random.Generator, count: int, probability: float):
+    """Indices of the images to apply an augmentation to"""
+    return np.flatnonzero(rng.random(count) < probability)
+
+
+def add_noise(images: np.ndarray, rng: np.random.Generator, sigma: float):
+    """Add gaussian noise to the images, clipped to the valid pixel range"""
+    noisy = images + rng.normal(0, sigma, images.shape).astype(np.float32)
+    return np.clip(noisy, 0, 255, out=noisy).astype(np.uint8)
+
+
+def blur(image: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """Blur the image with a random kernel size, like an out of focus scan"""
+    size = int(rng.choice([3, 5]))
+    return cv2.GaussianBlur(image, (size, size), 0).reshape(image.shape)
+
+
+def jitter_threshold(
+    image: np.ndarray, rng: np.random.Generator, threshold_range
+) -> np.ndarray:
+    """Re-threshold a slightly blurred image at a random level, imitating the
+    stroke widths different thresholds in preprocessing give"""
+    threshold = int(rng.integers(*threshold_range))
+    blurred = cv2.GaussianBlur(image, (3, 3), 0)
+    _, thresholded = cv2.threshold(blurred, threshold, 255, cv2.THRESH_BINARY)
+    return thresholded.reshape(image.shape)
+
+
+def random_affine(
+    image: np.ndarray, rng: np.random.Generator, options: AugmentationOptions
+) -> np.ndarray:
+    """Rotate, scale and shift the image slightly, like an imperfect
+    character bounding box"""
+    height, width = image.shape[:2]
+    matrix = cv2.getRotationMatrix2D(
+        (width / 2, height / 2),
+        rng.uniform(-options.max_rotation, options.max_rotation),
+        1 + rng.uniform(-options.max_scale, options.max_scale),
+    )
+    shift = rng.uniform(-options.max_shift, options.max_shift, 2)
+    matrix[:, 2] += shift * (width, height)
+    return cv2.warpAffine(
+        image,
+        matrix,
+        (width, height),
+        flags=cv2.INTER_LINEAR,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(255, 255, 255),
+    ).reshape(image.shape)
+
+
+def augment_batch(
+    images: np.ndarray,
+    rng: np.random.Generator,
+    options: AugmentationOptions = AugmentationOptions(),
+) -> np.ndarray:
+    """Augment a batch of uint8 images, returning a new batch"""
+    images = images.copy()
+    for index in _choose(rng, len(images), options.affine_probability):
+        images[index] = random_affine(images[index], rng, options)
+    for index in _choose(rng, len(images), options.threshold_probability):
+        images[index] = jitter_threshold(
+            images[index], rng, options.threshold_range
+        )
+    for index in _choose(rng, len(images), options.blur_probability):
+        images[index] = blur(images[index], rng)
+    noisy = _choose(rng, len(images), options.noise_probability)
+    images[noisy] = add_noise(images[noisy], rng, options.noise_sigma)
+    return images
+
+
+def augmented_batches(
+    images: np.ndarray,
+    labels: np.ndarray,
+    batch_size: int,
+    rng: np.random.Generator,
+    options: AugmentationOptions = AugmentationOptions(),
+    balanced: bool = True,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """Generate one epoch of augmented batches.
+
+    Args:
+        images: The uint8 images to augment
+        labels: The label of every image
+        batch_size: The number of images in every batch
+        rng: The random generator, which continues between epochs so every
+            epoch gets new variations
+        options: How to augment the images
+        balanced: Whether to draw every class equally often, instead of
+            in proportion to the number of images of the class
+    """
+    if balanced:
+        counts = np.bincount(labels)
+        weights = 1 / counts[labels]
+        order = rng.choice(
+            len(images), len(images), replace=True, p=weights / weights.sum()
+        )
+    else:
+        order = rng.permutation(len(images))
+    for start in range(0, len(order), batch_size):
+        batch = order[start : start + batch_size]
+        yield augment_batch(images[batch], rng, options), labels[batch]
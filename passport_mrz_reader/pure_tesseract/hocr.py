@@ -0,0 +1,108 @@
+"""Reading the characters of the hOCR Tesseract writes with
+hocr_char_boxes, and finding the spurious boxes among them.
+
+This module does not import pytesseract, so the hOCR can be parsed and tested
+without Tesseract installed.
+"""
+
+from dataclasses import dataclass
+from html.parser import HTMLParser
+
+import numpy as np
+
+# The hOCR classes of the elements holding one line of text
+LINE_CLASSES = {"ocr_line", "ocr_textfloat", "ocr_header", "ocr_caption"}
+
+
+@dataclass(frozen=True)
+class Symbols:
+    """The characters Tesseract read, in reading order"""
+
+    characters: str
+    boxes: np.ndarray
+    """The (left, top, right, bottom) box of every character, one per row"""
+    confidences: np.ndarray
+    """The confidence of every character, from 0 to 1"""
+    line_ids: np.ndarray
+    """The line of every character, counting from 0 at the top"""
+
+
+class _HocrSymbolParser(HTMLParser):
+    """Collects the characters of hOCR written with hocr_char_boxes"""
+
+    def __init__(self):
+        super().__init__()
+        self.characters = []
+        self.boxes = []
+        self.confidences = []
+        self.line_ids = []
+        self._line = -1
+        # The box and confidence of the character span being read
+        self._symbol = None
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if attributes.get("class") in LINE_CLASSES:
+            self._line += 1
+        elif attributes.get("class") == "ocrx_cinfo":
+            properties = dict(
+                prop.strip().split(" ", 1)
+                for prop in attributes.get("title", "").split(";")
+                if prop.strip()
+            )
+            self._symbol = (
+                [int(value) for value in properties["x_bboxes"].split()],
+                float(properties.get("x_conf", 0)) / 100,
+            )
+
+    def handle_data(self, data):
+        if self._symbol is None:
+            return
+        box, confidence = self._symbol
+        for character in data.strip():
+            self.characters.append(character)
+            self.boxes.append(box)
+            self.confidences.append(confidence)
+            self.line_ids.append(self._line)
+
+    def handle_endtag(self, tag):
+        if tag == "span":
+            self._symbol = None
+
+
+def parse_hocr_symbols(hocr: str) -> Symbols:
+    """The characters of hOCR written with hocr_char_boxes, with their boxes,
+    confidences and lines"""
+    parser = _HocrSymbolParser()
+    parser.feed(hocr)
+    parser.close()
+    # Number the lines with characters from 0, skipping empty lines
+    _, line_ids = np.unique(
+        np.array(parser.line_ids, dtype=int), return_inverse=True
+    )
+    return Symbols(
+        characters="".join(parser.characters),
+        boxes=np.array(parser.boxes, dtype=int).reshape(-1, 4),
+        confidences=np.array(parser.confidences, dtype=float),
+        line_ids=line_ids.astype(int),
+    )
+
+
+def misplaced_boxes(symbols: Symbols) -> np.ndarray:
+    """Whether every box is a spurious box, which is when it is between two
+    boxes of its line and either is high and overlaps one of them, or
+    overlaps both of them"""
+    left, top, right, bottom = symbols.boxes.T
+    line_ids = symbols.line_ids
+    inner = np.zeros(len(line_ids), dtype=bool)
+    inner[1:-1] = (line_ids[1:-1] == line_ids[:-2]) & (
+        line_ids[1:-1] == line_ids[2:]
+    )
+    previous_right = np.roll(right, 1)
+    next_left = np.roll(left, -1)
+    high = (bottom - top) / np.maximum(right - left, 1) > 1.5
+    overlaps_previous = left <= previous_right
+    return inner & (
+        (high & (overlaps_previous | (left >= next_left)))
+        | (overlaps_previous & (right >= next_left))
+    )
@@ -1,25 +1,46 @@
-"""In this module Tesseract is used to predict the MRZ"""
+"""In this module Tesseract is used to predict the MRZ.
+
+Tesseract is asked for hOCR with a box for every character, which gives the
+box, the confidence and the line of every character in a single call, so the
+lines do not have to be guessed from the box coordinates.
+"""
 from typing import Optional
 
 import cv2
+import numpy as np
 import pytesseract
-from PIL import Image
 
 from passport_mrz_reader.common.interfaces import (
     PostProcessorMetadata,
     PreProcessors,
 )
 from passport_mrz_reader.common.preprocessing import preprocess
+from passport_mrz_reader.common.thresholds import threshold_ladder
 from passport_mrz_reader.common.mrz_common import (
     MRZ_CHARACTERS,
     print_if_verbose,
     display_if_verbose,
 )
+from passport_mrz_reader.pure_tesseract.hocr import (
+    Symbols,
+    misplaced_boxes,
+    parse_hocr_symbols,
+)
 
 # Config Tesseract to use MRZ characters only and to use the mrz language.
 # To use the mrz language, the mrz.traineddata file must be in the tessdata
 # folder where Tesseract is installed. Tesseract should be added to the PATH.
 TESSERACT_CONFIG = f"-l mrz --psm 6 -c tessedit_char_whitelist={MRZ_CHARACTERS}"
+# Also write a span with the box and confidence of every character to hOCR
+HOCR_CONFIG = f"{TESSERACT_CONFIG} -c hocr_char_boxes=1"
+
+
+def read_symbols(image) -> Symbols:
+    """Read the characters of the image with Tesseract"""
+    hocr = pytesseract.image_to_pdf_or_hocr(
+        image, extension="hocr", config=HOCR_CONFIG
+    )
+    return parse_hocr_symbols(hocr.decode("utf-8"))
 
 
 def get_raw_mrz_text(
@@ -31,75 +52,72 @@ def get_raw_mrz_text(
     with 44 characters each.
 
     Args:
-        mrz_region: The region of the image that contains the MRZ
+        original_image: The region of the image that contains the MRZ
+        preprocessed_image: The binary MRZ region to use, or None to try
+            several thresholds
         verbose: Whether to print debug information and display images
     """
     if original_image is None and preprocessed_image is None:
         return None
-    box_heights = []
     variable_threshold = preprocessed_image is None
-    threshold_values = [10, 8, 12, 6, 14] if variable_threshold else [10]
+    threshold_values = (
+        threshold_ladder(original_image) if variable_threshold else [10]
+    )
     # OCR the MRZ region using Tesseract, only looking for valid MRZ characters
-    i = 0
-    while len(box_heights) != 88:
-        if i == len(threshold_values):
-            print_if_verbose(
-                f"Wrong amount of boxes found, found {len(box_heights)} boxes",
-                verbose,
-            )
-            return None
+    for attempt, threshold in enumerate(threshold_values, start=1):
         if variable_threshold:
             mrz_region = preprocess(
                 original_image,
-                PreProcessors(grayscale=True, threshold=threshold_values[i]),
+                PreProcessors(grayscale=True, threshold=threshold),
                 verbose=verbose,
             )
         else:
             mrz_region = preprocessed_image
         try:
-            boxes = pytesseract.image_to_boxes(mrz_region, config=TESSERACT_CONFIG)
+            symbols = read_symbols(mrz_region)
         except ValueError:
             # mrz region is outside image
             return None
-        mrz_letters = []
-        all_boxes = mrz_region.copy()
-        reduced_boxes = mrz_region.copy()
-        box_heights = []
-        for index, box in enumerate(boxes.splitlines()):
-            box = box.split(" ")
-            # draw the bounding box on the image
-            H = all_boxes.shape[0]
-            (x, y, w, h) = (
-                int(box[1]),
-                H - int(box[2]),
-                int(box[3]),
-                H - int(box[4]),
-            )
-            height, width = y - h, w - x
-            cv2.rectangle(all_boxes, (x, y), (w, h), (0, 255, 0), 2)
-            if 0 < index < len(boxes.splitlines()) - 1:
-                previous = boxes.splitlines()[index - 1].split(" ")
-                next_box = boxes.splitlines()[index + 1].split(" ")
-                # Add newline if the box is on a new line
-                if h > H - int(previous[2]):
-                    mrz_letters.append("\n")
-                # Discard if box is high and overlaps with one of the other boxes
-                if (
-                    height / width > 1.5
-                    and not h > H - int(previous[2])
-                    and not y < H - int(next_box[4])
-                    and (x <= int(previous[3]) or x >= int(next_box[1]))
-                ):
-                    continue
-                # Discard box if it overlaps with the previous and next box
-                if x <= int(previous[3]) and w >= int(next_box[1]):
-                    continue
-            cv2.rectangle(reduced_boxes, (x, y), (w, h), (0, 255, 0), 2)
-            mrz_letters.append(box[0])
-            box_heights.append(height)
-        i += 1
-        display_if_verbose("All boxes", Image.fromarray(all_boxes), verbose)
-        display_if_verbose("Reduced boxes", Image.fromarray(reduced_boxes), verbose)
-    mrz_text = "".join(mrz_letters)
+        kept = ~misplaced_boxes(symbols)
+        if verbose:
+            all_boxes = mrz_region.copy()
+            reduced_boxes = mrz_region.copy()
+            for box, keep in zip(symbols.boxes.tolist(), kept):
+                left, top, right, bottom = box
+                cv2.rectangle(
+                    all_boxes, (left, top), (right, bottom), (0, 255, 0), 2
+                )
+                if keep:
+                    cv2.rectangle(
+                        reduced_boxes,
+                        (left, top),
+                        (right, bottom),
+                        (0, 255, 0),
+                        2,
+                    )
+            display_if_verbose("All boxes", all_boxes, verbose)
+            display_if_verbose("Reduced boxes", reduced_boxes, verbose)
+        if np.count_nonzero(kept) == 88:
+            break
+        print_if_verbose(
+            f"Wrong amount of boxes found, found {np.count_nonzero(kept)} "
+            "boxes",
+            verbose,
+        )
+    else:
+        return None, PostProcessorMetadata(attempts=len(threshold_values))
+    characters = np.array(list(symbols.characters))[kept]
+    line_ids = symbols.line_ids[kept]
+    mrz_text = "\n".join(
+        "".join(characters[line_ids == line]) for line in np.unique(line_ids)
+    )
     print_if_verbose(f"MRZ text before postprocessing:\n{mrz_text}", verbose)
-    return mrz_text, PostProcessorMetadata(box_heights=box_heights)
+    boxes = symbols.boxes[kept]
+    return mrz_text, PostProcessorMetadata(
+        box_heights=(boxes[:, 3] - boxes[:, 1]).tolist(),
+        boxes=np.column_stack((boxes[:, :2], boxes[:, 2:] - boxes[:, :2])),
+        threshold=threshold if variable_threshold else None,
+        attempts=attempt,
+        confidences=symbols.confidences[kept].tolist(),
+        line_ids=np.unique(line_ids, return_inverse=True)[1].tolist(),
+    )
@@ -0,0 +1,76 @@
+"""Build the templates of template_predict.py from the character images used
+to train the deep learning model, and report how many characters of a test
+set they classify correctly.
+
+Every template is the average of the normalised images of its class.
+
+    python -m passport_mrz_reader.template_matching.build_templates
+        --test data/images/test/variable_treshold
+"""
+
+import argparse
+import os
+
+import numpy as np
+
+from passport_mrz_reader.common.mrz_common import MRZ_CHARACTERS
+from passport_mrz_reader.new_training_data.augmentation import (
+    read_character_images,
+)
+from passport_mrz_reader.template_matching.template_predict import (
+    TEMPLATES_PATH,
+    TemplateClassifier,
+    normalise_glyphs,
+    save_templates,
+)
+
+DATA_ROOT = f"{os.path.dirname(__file__)}/../../data/images"
+TRAIN_PATH = f"{DATA_ROOT}/train/variable_treshold"
+# The folders of characters that cannot be folder names
+CLASS_CHARACTERS = {"less_than": "<"}
+
+
+def read_characters(directory: str) -> tuple[list[np.ndarray], str]:
+    """Read the character images of a directory with one folder per class,
+    or of shards, and the character of every image"""
+    images, characters = [], []
+    for class_name, image in read_character_images(directory, True):
+        images.append(image)
+        characters.append(CLASS_CHARACTERS.get(class_name, class_name))
+    return images, "".join(characters)
+
+
+def build_templates(images, characters: str) -> np.ndarray:
+    """The normalised average of the images of every MRZ character, in the
+    order of MRZ_CHARACTERS"""
+    missing = set(MRZ_CHARACTERS) - set(characters)
+    if missing:
+        raise ValueError(f"No images of {''.join(sorted(missing))}")
+    glyphs = normalise_glyphs(images)
+    labels = np.array([MRZ_CHARACTERS.index(c) for c in characters])
+    sums = np.zeros((len(MRZ_CHARACTERS), glyphs.shape[1]), np.float32)
+    np.add.at(sums, labels, glyphs)
+    templates = sums - sums.mean(axis=1, keepdims=True)
+    return templates / np.linalg.norm(templates, axis=1, keepdims=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--train", default=TRAIN_PATH)
+    parser.add_argument("--test", help="Characters to report the accuracy on")
+    parser.add_argument("--output", default=TEMPLATES_PATH)
+    args = parser.parse_args()
+
+    train_images, train_characters = read_characters(args.train)
+    built = build_templates(train_images, train_characters)
+    save_templates(built, MRZ_CHARACTERS, args.output)
+    print(
+        f"Saved templates of {len(train_images)} characters to {args.output}"
+    )
+    if args.test:
+        test_images, test_characters = read_characters(args.test)
+        predicted, _ = TemplateClassifier(built, MRZ_CHARACTERS).classify(
+            test_images
+        )
+        correct = np.mean([a == b for a, b in zip(predicted, test_characters)])
+        print(f"Test accuracy: {correct:.1%} of {len(test_images)}")
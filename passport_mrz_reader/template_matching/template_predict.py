@@ -0,0 +1,153 @@
+"""In this module the MRZ is read by matching every character against a
+template of every class.
+
+The MRZ is printed in OCR-B, a fixed font with only 37 characters, so a
+character found by the character separator looks almost exactly like the
+average of the training images of its class. Every character is resized to a
+small fixed size and normalised to zero mean and unit length, which makes it
+independent of the contrast and the stroke width of the threshold. The
+squared distance between two normalised characters is 2 - 2 times their
+correlation, so all 88 characters are compared with all 37 templates in one
+matrix product. Only NumPy and OpenCV are needed.
+
+The templates are built by build_templates.py.
+"""
+
+import os
+import threading
+from functools import lru_cache
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.common.interfaces import PostProcessorMetadata
+from passport_mrz_reader.common.mrz_common import (
+    MRZ_CHARACTERS,
+    print_if_verbose,
+)
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    search_character_boxes,
+)
+
+TEMPLATES_PATH = f"{os.path.dirname(__file__)}/templates.npz"
+# The size every character is resized to, about the proportions of OCR-B
+GLYPH_WIDTH = 16
+GLYPH_HEIGHT = 24
+
+_LOAD_LOCK = threading.Lock()
+
+
+def normalise_glyphs(character_images) -> np.ndarray:
+    """Resize the characters to the glyph size, and normalise every one to
+    zero mean and unit length
+
+    Returns: float32 array of shape (characters, GLYPH_HEIGHT * GLYPH_WIDTH)
+    """
+    glyphs = np.empty(
+        (len(character_images), GLYPH_HEIGHT * GLYPH_WIDTH), dtype=np.float32
+    )
+    for glyph, image in zip(glyphs, character_images):
+        if image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        glyph[:] = cv2.resize(
+            image, (GLYPH_WIDTH, GLYPH_HEIGHT), interpolation=cv2.INTER_AREA
+        ).ravel()
+    glyphs -= glyphs.mean(axis=1, keepdims=True)
+    # An empty crop has no contrast, and is left as zeros
+    glyphs /= np.maximum(np.linalg.norm(glyphs, axis=1, keepdims=True), 1e-6)
+    return glyphs
+
+
+class TemplateClassifier:
+    """Classifies characters by their nearest template"""
+
+    def __init__(self, templates: np.ndarray, classes: str):
+        """
+        Args:
+            templates: The normalised template of every class, one per row
+            classes: The character of every template
+        """
+        self.templates = templates
+        self.classes = classes
+
+    def classify(self, character_images) -> tuple[str, np.ndarray]:
+        """Classify the characters all at once
+
+        Returns: the characters, and the correlation of every character with
+            its template, from -1 to 1
+        """
+        glyphs = normalise_glyphs(character_images)
+        distances = 2 - 2 * (glyphs @ self.templates.T)
+        nearest = np.argmin(distances, axis=1)
+        text = "".join(self.classes[index] for index in nearest)
+        correlations = 1 - distances[np.arange(len(nearest)), nearest] / 2
+        return text, correlations
+
+
+def save_templates(
+    templates: np.ndarray, classes: str, path: str = TEMPLATES_PATH
+):
+    """Save templates made for the glyph size"""
+    np.savez(
+        path,
+        templates=templates.astype(np.float32),
+        classes=np.array(list(classes)),
+        glyph_shape=np.array([GLYPH_HEIGHT, GLYPH_WIDTH]),
+    )
+    _load_templates.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def _load_templates(path: str) -> TemplateClassifier:
+    with np.load(path) as file:
+        if tuple(file["glyph_shape"]) != (GLYPH_HEIGHT, GLYPH_WIDTH):
+            raise ValueError(f"Templates {path} are for another glyph size")
+        templates = file["templates"]
+        classes = "".join(file["classes"])
+    if sorted(classes) != sorted(MRZ_CHARACTERS):
+        raise ValueError(f"Templates {path} are not for the MRZ characters")
+    templates.flags.writeable = False
+    return TemplateClassifier(templates, classes)
+
+
+def load_templates(path: str = TEMPLATES_PATH) -> TemplateClassifier:
+    """Load the templates once per path, also when called from several
+    threads"""
+    with _LOAD_LOCK:
+        return _load_templates(path)
+
+
+def get_raw_mrz_text(
+    original_image,
+    preprocessed_image,
+    verbose=False,
+    templates_path: str = TEMPLATES_PATH,
+) -> tuple[Optional[str], PostProcessorMetadata]:
+    """Get the raw MRZ text by matching the 88 characters found by the
+    character separator against the templates
+
+    Args:
+        original_image: The MRZ region image
+        preprocessed_image: The binary MRZ region image to use, or None to
+            use a variable threshold
+        verbose: Whether to print debug information
+        templates_path: The templates to match against
+    """
+    segmentation, attempts = search_character_boxes(
+        original_image, preprocessed_image, verbose
+    )
+    if segmentation is None:
+        return None, PostProcessorMetadata(attempts=attempts)
+    text, correlations = load_templates(templates_path).classify(
+        segmentation.character_images
+    )
+    mrz_text = f"{text[:44]}\n{text[44:]}"
+    print_if_verbose(f"MRZ text before postprocessing:\n{mrz_text}", verbose)
+    return mrz_text, PostProcessorMetadata(
+        box_heights=segmentation.boxes[:, 3].tolist(),
+        boxes=segmentation.boxes,
+        threshold=segmentation.threshold,
+        attempts=attempts,
+        confidences=np.clip(correlations, 0, 1).tolist(),
+    )
@@ -0,0 +1,368 @@
+"""Search the configurations of the pipeline for the most accurate ones within
+a latency budget on a labelled dataset, print the Pareto front of accuracy
+against p95 latency and save the most accurate configuration within the
+budget with common/config.py.
+
+Every combination of an engine, a binarisation, deskewing, the quality gate
+and the postprocessors is a candidate. Evaluating them all on all images
+would take days, so they are compared by successive halving: all candidates
+read a small random subset of the images, the best third of them read three
+times as many, and so on until the last few read every image. Candidates are
+ranked by their Pareto layer of accuracy and p95 latency, and by accuracy
+within a layer, so fast candidates survive next to accurate ones. A
+candidate whose p95 latency is over the budget is dropped at every step.
+
+The images are read one at a time in this process, so the latencies are not
+disturbed by other workers, and the segmentation cache is cleared before
+every image, so a candidate does not reuse the segmentations of the one
+before it.
+
+    python -m passport_mrz_reader.test_suite.autotune
+        --engines template tesseract --budget-ms 300
+"""
+
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from passport_mrz_reader.common.config import (
+    CONFIG_PATH,
+    ENGINES,
+    config_to_dict,
+    save_config,
+)
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    SEGMENTATION_CACHE,
+)
+from passport_mrz_reader.test_suite.evaluate import (
+    ImageLocation,
+    labelled_images,
+)
+from passport_mrz_reader.test_suite.test import (
+    IMAGES_PATH,
+    LABELS_PATH,
+    check_recognition,
+)
+from passport_mrz_reader.utils.dataset import load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+from passport_mrz_reader.utils.shards import read_image, read_index
+
+# The ways of binarising the image, as PreProcessors options
+BINARISATIONS = [
+    {"variable_threshold": True},
+    {"adaptive_threshold": "sauvola"},
+    {"adaptive_threshold": "gaussian"},
+]
+POSTPROCESSOR_OPTIONS = ["character_height", "mrz_fields", "line_lengths"]
+
+
+@dataclass
+class Candidate:
+    """A configuration and its results on the images it has read so far"""
+
+    config: tuple[PreProcessors, Engine, PostProcessors]
+    correct: list[bool] = field(default_factory=list)
+    seconds: list[float] = field(default_factory=list)
+
+    @property
+    def accuracy(self) -> float:
+        """The share of images read correctly"""
+        return float(np.mean(self.correct)) if self.correct else 0.0
+
+    @property
+    def p95_seconds(self) -> float:
+        """The 95th percentile of the seconds per image"""
+        return float(np.percentile(self.seconds, 95)) if self.seconds else 0.0
+
+    def measured(self) -> dict:
+        """What the candidate was measured to do, for the config file"""
+        return {
+            "images": len(self.correct),
+            "accuracy": self.accuracy,
+            "p95_seconds": self.p95_seconds,
+        }
+
+    def describe(self) -> str:
+        """A one line description of the configuration"""
+        config_dict = config_to_dict(self.config)
+        options = [
+            f"{name}={value}" if value is not True else name
+            for name, value in {
+                **config_dict["preprocessors"],
+                **config_dict["postprocessors"],
+            }.items()
+        ]
+        return f"{config_dict['engine']}: {', '.join(options)}"
+
+
+def candidate_configs(
+    engines: list[Engine], locate_mrz: bool = False
+) -> list[tuple[PreProcessors, Engine, PostProcessors]]:
+    """Every combination of an engine, a binarisation, deskewing or not, the
+    quality gate or not and the postprocessors
+
+    Args:
+        engines: The engines to try, every one is shared by its candidates
+        locate_mrz: Whether to find the MRZ first, for images of whole pages
+    """
+    configs = []
+    for engine, binarisation, deskew, quality_gate in itertools.product(
+        engines, BINARISATIONS, (None, True), (None, True)
+    ):
+        preprocessors = PreProcessors(
+            **binarisation,
+            deskew=deskew,
+            quality_gate=quality_gate,
+            locate_mrz=locate_mrz or None,
+        )
+        for enabled in itertools.product(
+            (None, True), repeat=len(POSTPROCESSOR_OPTIONS)
+        ):
+            configs.append(
+                (
+                    preprocessors,
+                    engine,
+                    PostProcessors(
+                        **dict(zip(POSTPROCESSOR_OPTIONS, enabled))
+                    ),
+                )
+            )
+    return configs
+
+
+def pareto_ranks(accuracies, latencies) -> np.ndarray:
+    """The Pareto layer of every point: 0 for the points no other point is
+    both at least as accurate and at least as fast as, and strictly better
+    in one of them, 1 for the points that are only beaten by layer 0, and so
+    on"""
+    accuracies = np.asarray(accuracies, dtype=float)
+    latencies = np.asarray(latencies, dtype=float)
+    # dominates[i, j] is whether point i beats point j
+    dominates = (
+        (accuracies[:, None] >= accuracies)
+        & (latencies[:, None] <= latencies)
+        & (
+            (accuracies[:, None] > accuracies)
+            | (latencies[:, None] < latencies)
+        )
+    )
+    ranks = np.zeros(len(accuracies), dtype=int)
+    remaining = np.ones(len(accuracies), dtype=bool)
+    rank = 0
+    while remaining.any():
+        layer = remaining & ~dominates[remaining].any(axis=0)
+        ranks[layer] = rank
+        remaining &= ~layer
+        rank += 1
+    return ranks
+
+
+def pareto_front(candidates: list[Candidate]) -> list[Candidate]:
+    """The candidates no other candidate beats in both accuracy and p95
+    latency, from the fastest to the most accurate"""
+    ranks = pareto_ranks(
+        [candidate.accuracy for candidate in candidates],
+        [candidate.p95_seconds for candidate in candidates],
+    )
+    front = [c for c, rank in zip(candidates, ranks) if rank == 0]
+    return sorted(front, key=lambda candidate: candidate.p95_seconds)
+
+
+def select(candidates: list[Candidate], keep: int) -> list[Candidate]:
+    """The best candidates by Pareto layer, then accuracy, then latency"""
+    ranks = pareto_ranks(
+        [candidate.accuracy for candidate in candidates],
+        [candidate.p95_seconds for candidate in candidates],
+    )
+    order = sorted(
+        range(len(candidates)),
+        key=lambda index: (
+            ranks[index],
+            -candidates[index].accuracy,
+            candidates[index].p95_seconds,
+        ),
+    )
+    return [candidates[index] for index in order[:keep]]
+
+
+def run_candidate(candidate: Candidate, images: list[tuple[np.ndarray, str]]):
+    """Read the images with the candidate, adding the results to it"""
+    for image, label in images:
+        SEGMENTATION_CACHE.clear()
+        started = time.perf_counter()
+        _, _, correct, *_ = check_recognition(
+            (image, label, candidate.config, None)
+        )
+        candidate.seconds.append(time.perf_counter() - started)
+        candidate.correct.append(correct)
+
+
+def successive_halving(
+    candidates: list[Candidate],
+    images: list[tuple[np.ndarray, str]],
+    budget_seconds: float,
+    min_images: int = 8,
+    eta: int = 3,
+    min_survivors: int = 5,
+) -> list[Candidate]:
+    """Drop the losing candidates early on growing subsets of the images.
+
+    Args:
+        candidates: The candidates, the results of every one are added to it
+        images: The (image, labelled text) of all images, in random order
+        budget_seconds: The highest p95 latency a candidate may have
+        min_images: The number of images every candidate reads
+        eta: Only 1 / eta of the candidates read eta times as many images
+        min_survivors: The number of candidates that read every image, if
+            that many are within the budget
+    Returns: the candidates within the budget that read every image
+    """
+    survivors = list(candidates)
+    size = min(min_images, len(images))
+    while True:
+        for candidate in survivors:
+            run_candidate(candidate, images[len(candidate.correct) : size])
+        survivors = [c for c in survivors if c.p95_seconds <= budget_seconds]
+        print(
+            f"  {len(survivors)} candidates within the budget on {size} images"
+        )
+        if size == len(images) or not survivors:
+            return survivors
+        survivors = select(
+            survivors, max(math.ceil(len(survivors) / eta), min_survivors)
+        )
+        if len(survivors) <= min_survivors:
+            size = len(images)
+        else:
+            size = min(size * eta, len(images))
+
+
+def load_images(
+    locations: list[tuple[str, str, ImageLocation]],
+) -> list[tuple[np.ndarray, str]]:
+    """Decode the images, so decoding is not part of the latency"""
+    return [
+        (
+            (
+                read_image(location)
+                if isinstance(location, tuple)
+                else load_image(location)
+            ),
+            label,
+        )
+        for _, label, location in locations
+    ]
+
+
+def main(args: argparse.Namespace):
+    """Search the candidates, print the Pareto front and save the best"""
+    locations = (
+        read_index(args.shards)
+        if args.shards
+        else labelled_images(load_labels(args.labels), args.images)
+    )
+    random.Random(args.seed).shuffle(locations)
+    if args.max_images:
+        locations = locations[: args.max_images]
+    images = load_images(locations)
+    engines = []
+    for name in args.engines:
+        engine = ENGINES[name]({})
+        engine.load()
+        engines.append(engine)
+    candidates = [
+        Candidate(config) for config in candidate_configs(engines, args.locate)
+    ]
+    print(f"{len(candidates)} candidates, {len(images)} images")
+
+    survivors = successive_halving(
+        candidates,
+        images,
+        args.budget_ms / 1000,
+        args.min_images,
+        args.eta,
+        args.survivors,
+    )
+    if not survivors:
+        print(f"No candidate is within {args.budget_ms:.0f} ms")
+        return
+    print("Pareto front of accuracy against p95 latency:")
+    for candidate in pareto_front(survivors):
+        print(
+            f"  {candidate.accuracy:6.1%}  "
+            f"{candidate.p95_seconds * 1000:7.1f} ms  "
+            f"{candidate.describe()}"
+        )
+    best = select(survivors, 1)[0]
+    print(f"Best within the budget: {best.describe()}")
+    if args.dry_run:
+        print(json.dumps(config_to_dict(best.config, best.measured())))
+    else:
+        save_config(best.config, args.output, best.measured())
+        print(f"Saved the configuration to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engines",
+        nargs="+",
+        choices=list(ENGINES),
+        default=list(ENGINES),
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=1000,
+        help="Highest p95 latency per image, in milliseconds",
+    )
+    parser.add_argument(
+        "--locate",
+        action="store_true",
+        help="Find the MRZ first, for images of whole passport pages",
+    )
+    parser.add_argument(
+        "--min-images",
+        type=int,
+        default=8,
+        help="Images every candidate reads before the first halving",
+    )
+    parser.add_argument(
+        "--eta",
+        type=int,
+        default=3,
+        help="Keep a 1 / eta share of the candidates at every step",
+    )
+    parser.add_argument(
+        "--survivors",
+        type=int,
+        default=5,
+        help="Candidates that read every image",
+    )
+    parser.add_argument(
+        "--max-images", type=int, help="Only use this many random images"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    parser.add_argument(
+        "--shards",
+        help="Directory of shards made by utils/shards.py, used instead of "
+        "--labels and --images",
+    )
+    parser.add_argument("--output", default=CONFIG_PATH)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report, do not save"
+    )
+    main(parser.parse_args())
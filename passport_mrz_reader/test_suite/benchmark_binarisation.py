@@ -0,0 +1,72 @@
+"""Benchmark whether a single pass with an adaptive threshold can replace the
+ladder of global percentile thresholds, comparing the accuracy and the time
+per passport of each binarisation on the labelled dataset.
+
+    python -m passport_mrz_reader.test_suite.benchmark_binarisation
+        --engine tesseract deeplearning
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from passport_mrz_reader.common.engines import DeepLearning, Tesseract
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.test_suite.test import (
+    IMAGES_PATH,
+    LABELS_PATH,
+    check_recognition,
+)
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+ENGINES = {"tesseract": Tesseract, "deeplearning": DeepLearning}
+BINARISATIONS = {
+    "percentile ladder": PreProcessors(variable_threshold=True),
+    "sauvola": PreProcessors(grayscale=True, adaptive_threshold="sauvola"),
+    "gaussian": PreProcessors(grayscale=True, adaptive_threshold="gaussian"),
+}
+POSTPROCESSORS = PostProcessors(
+    character_height=True, mrz_fields=True, line_lengths=True
+)
+
+
+def benchmark(engine_name: str, images, labels):
+    """Print the accuracy and time per passport of every binarisation"""
+    engine = ENGINES[engine_name]({})
+    print(f"{engine_name}:")
+    for name, preprocessors in BINARISATIONS.items():
+        valid, correct, durations = [], [], []
+        for image, label in zip(images, labels):
+            started = time.perf_counter()
+            _, is_valid, is_correct, _, _, _ = check_recognition(
+                (image, label, (preprocessors, engine, POSTPROCESSORS), None)
+            )
+            durations.append(time.perf_counter() - started)
+            valid.append(is_valid)
+            correct.append(is_correct)
+        print(
+            f"  {name:<18}"
+            f"valid: {np.mean(valid):6.1%}    "
+            f"correct: {np.mean(correct):6.1%}    "
+            f"mean: {np.mean(durations) * 1000:7.1f} ms    "
+            f"p95: {np.percentile(durations, 95) * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engine", nargs="+", choices=list(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    args = parser.parse_args()
+
+    rows = label_pairs(load_labels(args.labels))
+    loaded_images = [
+        load_image(f"{args.images}/{file_name}") for file_name, _ in rows
+    ]
+    for engine_argument in args.engine:
+        benchmark(engine_argument, loaded_images, [label for _, label in rows])
@@ -0,0 +1,327 @@
+"""Benchmark the memory of the pipeline, so memory regressions show up before
+deployment rather than as workers killed for running out of memory.
+
+Two things are measured:
+
+- The resident memory every engine adds when it is loaded, each in a fresh
+  process so the engines do not share imports, and all of them loaded
+  together in one process, like a worker serving every engine.
+- For every passport and engine, the peak of the memory allocated by Python
+  and numpy in every stage of process_result over what was allocated when
+  the stage started, the memory the stage still holds when it ends, the
+  growth of the resident memory in the stage, and the lines of code holding
+  the most new memory at the end of the stages, which is where the images
+  of the stages are.
+
+The peaks are traced with tracemalloc, which only sees memory allocated
+through Python, like numpy arrays and Pillow images, and not the memory of
+TensorFlow, PyTorch or OpenCV internals, which only show in the resident
+memory. The segmentation cache is cleared before every passport, so every
+passport pays for its segmentation.
+
+The measurements can be saved with --output and compared with a saved run
+with --compare, which exits with an error when a peak or a baseline grew by
+more than the tolerance.
+
+    python -m passport_mrz_reader.test_suite.benchmark_memory
+        --engines template tesseract --output memory.json
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+
+from passport_mrz_reader.common.config import ENGINES, load_config
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.common.process import process_result
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    SEGMENTATION_CACHE,
+)
+from passport_mrz_reader.test_suite.autotune import load_images
+from passport_mrz_reader.test_suite.evaluate import labelled_images
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import load_labels
+
+PREPROCESSORS = PreProcessors(variable_threshold=True)
+POSTPROCESSORS = PostProcessors(
+    character_height=True, mrz_fields=True, line_lengths=True
+)
+# Frames kept for every traced allocation, enough to find the line of the
+# package that called numpy or OpenCV
+TRACED_FRAMES = 8
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Allocations of the tracing itself and of imports are not hotspots
+IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>")
+MIB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    """The resident memory of this process, with psutil if it is installed
+    and from /proc otherwise"""
+    try:
+        import psutil  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    return psutil.Process().memory_info().rss
+
+
+def load_engines(names: list[str]) -> dict:
+    """Load the engines and measure the resident memory they add"""
+    gc.collect()
+    before = rss_bytes()
+    for name in names:
+        ENGINES[name]({}).load()
+    gc.collect()
+    return {"rss_before": before, "rss_delta": rss_bytes() - before}
+
+
+def engine_baselines(names: list[str]) -> dict[str, dict]:
+    """The resident memory added by loading every engine on its own, and by
+    loading them all, each in a new process"""
+    groups = [[name] for name in names]
+    if len(names) > 1:
+        groups.append(names)
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1, maxtasksperchild=1) as pool:
+        return {
+            "+".join(group): pool.apply(load_engines, (group,))
+            for group in groups
+        }
+
+
+def _hotspots(snapshot, previous, top: int) -> list[dict]:
+    """The lines of the package holding the most memory allocated between
+    the snapshots. Memory allocated in numpy or OpenCV is counted at the
+    line of the package that called them."""
+    lines = {}
+    for difference in snapshot.compare_to(previous, "traceback"):
+        frames = [
+            frame
+            for frame in difference.traceback
+            if PACKAGE_PATH in frame.filename
+        ]
+        # The traceback goes from the oldest frame to the most recent one
+        frame = frames[-1] if frames else difference.traceback[-1]
+        if frame.filename == __file__:
+            # Measuring the memory is not a hotspot of the pipeline
+            continue
+        line = lines.setdefault(
+            f"{frame.filename}:{frame.lineno}", {"bytes": 0, "blocks": 0}
+        )
+        line["bytes"] += difference.size_diff
+        line["blocks"] += difference.count_diff
+    return [
+        {"line": name, **line}
+        for name, line in sorted(
+            lines.items(), key=lambda item: item[1]["bytes"], reverse=True
+        )[:top]
+        if line["bytes"] > 0
+    ]
+
+
+def measure_passport(
+    image,
+    config: tuple[PreProcessors, Engine, PostProcessors],
+    top: int = 5,
+) -> dict:
+    """Read the MRZ of a passport while tracing the memory of every stage
+
+    Args:
+        image: The image of the passport
+        config: The pre-processors, the loaded engine and the postprocessors
+        top: How many hotspots to keep for every stage
+    Returns: the text read, and for every stage that ran the traced peak
+        and the memory still held at its end, both over the memory at its
+        start, the growth of the resident memory and the hotspots, in bytes
+    """
+    preprocessors, engine, postprocessors = config
+    SEGMENTATION_CACHE.clear()
+    gc.collect()
+    stages = {}
+    tracemalloc.start(TRACED_FRAMES)
+    try:
+        filters = [
+            tracemalloc.Filter(False, file_name) for file_name in IGNORED_FILES
+        ]
+        previous = tracemalloc.take_snapshot().filter_traces(filters)
+        # Every stage is measured over what was allocated when it started,
+        # so memory held by earlier stages is not counted again
+        stage_start, _ = tracemalloc.get_traced_memory()
+        previous_rss = rss_bytes()
+        tracemalloc.reset_peak()
+
+        def end_stage(name: str):
+            nonlocal previous, previous_rss, stage_start
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+            rss = rss_bytes()
+            stages[name] = {
+                "peak": peak - stage_start,
+                "retained": current - stage_start,
+                "rss_delta": rss - previous_rss,
+                "hotspots": _hotspots(snapshot, previous, top),
+            }
+            previous, previous_rss = snapshot, rss
+            # Not counting the snapshot taken for the hotspots
+            stage_start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+
+        result = process_result(
+            image,
+            preprocessors,
+            engine,
+            postprocessors,
+            stage_hook=end_stage,
+        )
+    finally:
+        tracemalloc.stop()
+    return {"text": result.text, "stages": stages}
+
+
+def summarise(passports: list[dict]) -> dict[str, dict]:
+    """The mean and highest traced peak, retained memory and resident memory
+    growth of every stage over the passports"""
+    summary = {}
+    for passport in passports:
+        for name, stage in passport["stages"].items():
+            measures = summary.setdefault(
+                name, {"peak": [], "retained": [], "rss_delta": []}
+            )
+            for measure, values in measures.items():
+                values.append(stage[measure])
+    return {
+        name: {
+            f"{statistic}_{measure}": float(function(values))
+            for measure, values in measures.items()
+            for statistic, function in (("mean", np.mean), ("max", np.max))
+        }
+        for name, measures in summary.items()
+    }
+
+
+def regressions(measured: dict, baseline: dict, tolerance: float) -> list[str]:
+    """The peaks and engine baselines that grew by more than the tolerance,
+    a fraction of the saved value, over a saved run"""
+    found = []
+    for engine, stages in measured["stages"].items():
+        for name, stage in stages.items():
+            saved = baseline["stages"].get(engine, {}).get(name)
+            if saved and stage["max_peak"] > saved["max_peak"] * (
+                1 + tolerance
+            ):
+                found.append(
+                    f"{engine} {name}: peak "
+                    f"{saved['max_peak'] / MIB:.1f} MiB -> "
+                    f"{stage['max_peak'] / MIB:.1f} MiB"
+                )
+    for group, loaded in measured["engines"].items():
+        saved = baseline["engines"].get(group)
+        if saved and loaded["rss_delta"] > saved["rss_delta"] * (
+            1 + tolerance
+        ):
+            found.append(
+                f"loading {group}: "
+                f"{saved['rss_delta'] / MIB:.1f} MiB -> "
+                f"{loaded['rss_delta'] / MIB:.1f} MiB"
+            )
+    return found
+
+
+def main(args: argparse.Namespace) -> int:
+    """Measure the engines and the passports, print them and compare them
+    with a saved run"""
+    measured = {"engines": engine_baselines(args.engines), "stages": {}}
+    print("Resident memory after loading:")
+    for group, loaded in measured["engines"].items():
+        print(f"  {group:<40}{loaded['rss_delta'] / MIB:8.1f} MiB")
+
+    locations = labelled_images(load_labels(args.labels), args.images)
+    if args.max_images:
+        locations = locations[: args.max_images]
+    images = load_images(locations)
+    if args.config:
+        preprocessors, _, postprocessors = load_config(args.config)
+    else:
+        preprocessors, postprocessors = PREPROCESSORS, POSTPROCESSORS
+    for name in args.engines:
+        engine = ENGINES[name]({})
+        engine.load()
+        print(f"{name}:")
+        passports = []
+        for (file_name, _, _), (image, _) in zip(locations, images):
+            passport = measure_passport(
+                image, (preprocessors, engine, postprocessors), args.top
+            )
+            passports.append(passport)
+            stage, highest = max(
+                passport["stages"].items(), key=lambda item: item[1]["peak"]
+            )
+            print(
+                f"  {file_name}: highest peak "
+                f"{highest['peak'] / MIB:.1f} MiB in {stage}"
+            )
+            for hotspot in highest["hotspots"]:
+                print(
+                    f"    {hotspot['bytes'] / MIB:8.2f} MiB in "
+                    f"{hotspot['blocks']:6} blocks  {hotspot['line']}"
+                )
+        measured["stages"][name] = summarise(passports)
+        for stage, summary in measured["stages"][name].items():
+            print(
+                f"  {stage:<14}"
+                f"peak mean: {summary['mean_peak'] / MIB:7.1f} MiB    "
+                f"max: {summary['max_peak'] / MIB:7.1f} MiB    "
+                f"retained mean: {summary['mean_retained'] / MIB:7.1f} MiB    "
+                f"RSS mean: {summary['mean_rss_delta'] / MIB:7.1f} MiB    "
+                f"max: {summary['max_rss_delta'] / MIB:7.1f} MiB"
+            )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(measured, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            found = regressions(measured, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"Regression: {regression}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engines", nargs="+", choices=list(ENGINES), default=["template"]
+    )
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    parser.add_argument(
+        "--config",
+        help="Configuration file of the pre- and postprocessors to measure, "
+        "see common/config.py",
+    )
+    parser.add_argument("--max-images", type=int)
+    parser.add_argument(
+        "--top", type=int, default=5, help="Hotspots to print per passport"
+    )
+    parser.add_argument("--output", help="JSON file to save the run to")
+    parser.add_argument("--compare", help="JSON file of a saved run")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Growth over the saved run that is a regression, as a fraction",
+    )
+    sys.exit(main(parser.parse_args()))
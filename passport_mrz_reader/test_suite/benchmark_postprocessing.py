@@ -0,0 +1,103 @@
+"""Benchmark the postprocessors on a passport MRZ with box heights, comparing
+the box height postprocessor with the loop over the characters it replaced.
+
+    python -m passport_mrz_reader.test_suite.benchmark_postprocessing
+        --copies 4
+"""
+
+import argparse
+import timeit
+
+from passport_mrz_reader.common.mrz_common import (
+    MRZ_LETTERS,
+    MRZ_NUMBERS,
+    MRZ_REPLACEMENTS,
+)
+from passport_mrz_reader.common.postprocessing import (
+    HIGH_LETTER_RATIO,
+    LOW_NUMBER_RATIO,
+    fix_line_lengths,
+    replace_based_on_box_heights,
+    replace_based_on_mrz_fields,
+)
+
+MRZ_TEXT = (
+    "P<UT0ERIKSS0N<<ANNA<MAR1A<<<<<<<<<<<<<<<<<<<\n"
+    "L898902C36UT07408I22F1204159ZE184226B<<<<<1O"
+)
+BOX_HEIGHTS = [
+    24.0 if character in MRZ_NUMBERS else 20.0
+    for character in MRZ_TEXT.replace("\n", "")
+]
+
+
+def loop_box_heights(mrz_text: str, box_heights: list[float]) -> str:
+    """The box height postprocessor as a loop over the characters of every
+    line, for comparison"""
+    lines = mrz_text.splitlines()
+    replaced, offset = [], 0
+    for line in lines:
+        heights = box_heights[offset : offset + len(line)]
+        offset += len(line)
+        letter_heights = [
+            height
+            for height, character in zip(heights, line)
+            if character in MRZ_LETTERS
+        ]
+        number_heights = [
+            height
+            for height, character in zip(heights, line)
+            if character in MRZ_NUMBERS
+        ]
+        if not letter_heights or not number_heights:
+            replaced.append(line)
+            continue
+        letter_height = sum(letter_heights) / len(letter_heights)
+        number_height = sum(number_heights) / len(number_heights)
+        characters = list(line)
+        for index, (character, height) in enumerate(zip(line, heights)):
+            high_letter = (
+                character in MRZ_LETTERS
+                and height > letter_height * HIGH_LETTER_RATIO
+            )
+            low_number = (
+                character in MRZ_NUMBERS
+                and height < number_height * LOW_NUMBER_RATIO
+            )
+            if (high_letter or low_number) and character in MRZ_REPLACEMENTS:
+                characters[index] = MRZ_REPLACEMENTS[character]
+        replaced.append("".join(characters))
+    return "\n".join(replaced)
+
+
+def benchmark(number: int, repeat: int, copies: int):
+    """Print the best time per call of every postprocessor, on a text of
+    copies of the MRZ"""
+    mrz_text = "\n".join([MRZ_TEXT] * copies)
+    box_heights = BOX_HEIGHTS * copies
+    postprocessors = {
+        "box heights (loop)": lambda: loop_box_heights(mrz_text, box_heights),
+        "box heights": lambda: replace_based_on_box_heights(
+            mrz_text, box_heights
+        ),
+        "mrz fields": lambda: replace_based_on_mrz_fields(mrz_text),
+        "line lengths": lambda: fix_line_lengths(mrz_text),
+    }
+    for name, postprocessor in postprocessors.items():
+        best = min(timeit.repeat(postprocessor, number=number, repeat=repeat))
+        print(f"{name:<20}{best / number * 1e6:8.1f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--copies",
+        type=int,
+        default=1,
+        help="Number of copies of the MRZ in the text, as on a page with "
+        "several documents",
+    )
+    args = parser.parse_args()
+    benchmark(args.number, args.repeat, args.copies)
@@ -0,0 +1,187 @@
+"""Calibrate the limits of the quality gate in common/quality_gate.py on the
+labelled dataset, and report the trade-off between the readable images the
+gate loses and the time it saves on unreadable ones.
+
+Every labelled image is measured, together with blurred, glare-covered, dark
+and blank copies of it, unless --no-synthetic is given. An image is readable
+when any threshold of the ladder succeeds, as measured by
+calibrate_thresholds.py with the same --engine. Every limit is placed halfway
+between the readable images it must keep and the closest unreadable image
+beyond them, for every share of readable images to keep.
+
+    python -m passport_mrz_reader.test_suite.calibrate_quality_gate
+        --recall 0.99
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from passport_mrz_reader.common.quality_gate import (
+    CALIBRATION_PATH,
+    QualityLimits,
+    QualityMeasures,
+    measure_quality,
+    save_limits,
+)
+from passport_mrz_reader.test_suite.calibrate_thresholds import (
+    ENGINES,
+    degraded_copies,
+    threshold_successes,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+RECALLS = [1.0, 0.99, 0.95, 0.9]
+
+
+def _lower_limit(readable, unreadable, recall: float, default: float):
+    """The lower limit keeping the recall of the readable values, halfway to
+    the closest unreadable value below them"""
+    bound = np.quantile(readable, 1 - recall, method="lower")
+    below = unreadable[unreadable < bound]
+    if len(below) == 0:
+        return min(default, float(bound))
+    return float((bound + below.max()) / 2)
+
+
+def _upper_limit(readable, unreadable, recall: float, default: float):
+    """The upper limit keeping the recall of the readable values, halfway to
+    the closest unreadable value above them"""
+    bound = np.quantile(readable, recall, method="higher")
+    above = unreadable[unreadable > bound]
+    if len(above) == 0:
+        return max(default, float(bound))
+    return float((bound + above.min()) / 2)
+
+
+def calibrate(measures: np.ndarray, readable: np.ndarray, recall: float):
+    """Limits keeping the recall of the readable images for every measure
+
+    Args:
+        measures: (sharpness, saturated, text_band) of every image
+        readable: Whether every image is readable
+        recall: The share of readable images every limit keeps
+    """
+    default = QualityLimits()
+    good, bad = measures[readable], measures[~readable]
+    return QualityLimits(
+        min_sharpness=_lower_limit(
+            good[:, 0], bad[:, 0], recall, default.min_sharpness
+        ),
+        max_saturated=_upper_limit(
+            good[:, 1], bad[:, 1], recall, default.max_saturated
+        ),
+        min_text_band=_lower_limit(
+            good[:, 2], bad[:, 2], recall, default.min_text_band
+        ),
+    )
+
+
+def report(
+    limits: QualityLimits,
+    measures: np.ndarray,
+    readable: np.ndarray,
+    gate_seconds: np.ndarray,
+    ladder_seconds: np.ndarray,
+):
+    """Print the share of images kept and the time per image with the
+    limits"""
+    passed = np.array(
+        [limits.rejection(QualityMeasures(*row)) is None for row in measures]
+    )
+    kept = np.mean(passed[readable]) if readable.any() else np.nan
+    rejected = np.mean(~passed[~readable]) if (~readable).any() else np.nan
+    gated = np.mean(gate_seconds + np.where(passed, ladder_seconds, 0))
+    print(
+        f"  sharpness >= {limits.min_sharpness:6.3f}    "
+        f"saturated <= {limits.max_saturated:5.3f}    "
+        f"text band >= {limits.min_text_band:5.3f}"
+    )
+    print(
+        f"    readable kept: {kept:6.1%}    "
+        f"unreadable rejected: {rejected:6.1%}    "
+        f"per image: {np.mean(ladder_seconds) * 1000:7.1f} ms without, "
+        f"{gated * 1000:7.1f} ms with the gate"
+    )
+
+
+def main(args: argparse.Namespace):
+    """Calibrate, report and save the limits of the quality gate"""
+    labels = label_pairs(load_labels(args.labels))
+    measures, readable, gate_seconds, ladder_seconds = [], [], [], []
+    for index, (file_name, label) in enumerate(labels, start=1):
+        image = load_image(f"{args.images}/{file_name}")
+        images = {"original": image}
+        if not args.no_synthetic:
+            images.update(degraded_copies(image, seed=index))
+        for copy in images.values():
+            started = time.perf_counter()
+            quality = measure_quality(copy)
+            gate_seconds.append(time.perf_counter() - started)
+            measures.append(
+                (quality.sharpness, quality.saturated, quality.text_band)
+            )
+            started = time.perf_counter()
+            readable.append(any(threshold_successes(copy, label, args.engine)))
+            ladder_seconds.append(time.perf_counter() - started)
+        print(f"  Processed {index}/{len(labels)}", end="\r")
+    print()
+    measures = np.array(measures)
+    readable = np.array(readable)
+    gate_seconds = np.array(gate_seconds)
+    ladder_seconds = np.array(ladder_seconds)
+    if not readable.any():
+        print("No image is readable, the gate cannot be calibrated")
+        return
+
+    print(
+        f"Images: {len(readable)}, readable: {np.mean(readable):.0%}, "
+        f"gate: {np.mean(gate_seconds) * 1000:.2f} ms per image, "
+        f"the ladder: {np.mean(ladder_seconds) * 1000:.1f} ms per image"
+    )
+    print("Default limits:")
+    report(QualityLimits(), measures, readable, gate_seconds, ladder_seconds)
+    for recall in sorted({*RECALLS, args.recall}, reverse=True):
+        print(f"Calibrated to keep {recall:.0%} of readable images:")
+        report(
+            calibrate(measures, readable, recall),
+            measures,
+            readable,
+            gate_seconds,
+            ladder_seconds,
+        )
+    if not args.dry_run:
+        limits = calibrate(measures, readable, args.recall)
+        save_limits(limits, args.output)
+        print(f"Saved limits to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engine",
+        choices=["separator", *ENGINES],
+        default="separator",
+        help="What a readable image is measured by",
+    )
+    parser.add_argument(
+        "--recall",
+        type=float,
+        default=0.99,
+        help="Share of readable images every limit keeps",
+    )
+    parser.add_argument(
+        "--no-synthetic",
+        action="store_true",
+        help="Only use the labelled images, without degraded copies",
+    )
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    parser.add_argument("--output", default=CALIBRATION_PATH)
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report, do not save"
+    )
+    main(parser.parse_args())
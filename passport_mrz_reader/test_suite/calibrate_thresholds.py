@@ -0,0 +1,225 @@
+"""Calibrate the threshold predictor in common/thresholds.py on the labelled
+dataset, and report the average number of OCR attempts per passport with the
+fixed ladder and with the predicted ordering.
+
+For every image, every threshold of the ladder is tried once. The predictor is
+a least squares fit of the image statistics to the first threshold of the
+ladder that succeeded, so an image that only some thresholds read is fitted to
+one that reads it. Every labelled image is measured together with blurred,
+glare-covered, dark, blank and padded copies of it, unless --no-synthetic is
+given, as a few labelled images alone vary too little to fit to. The synthetic
+copies do not make up for a small corpus: saving the calibration turns on the
+predicted ordering for every engine, so only save one fitted on a corpus of
+real captures, and use --dry-run on the labelled images in the repository.
+
+With the "separator" engine, a threshold succeeds when the character
+separator finds 88 characters, which is what the DeepLearning engine retries
+on. With "tesseract" or "easyocr", it succeeds when the engine
+reads the labelled text.
+
+    python -m passport_mrz_reader.test_suite.calibrate_thresholds
+"""
+
+import argparse
+
+import cv2
+import imutils
+import numpy as np
+
+from passport_mrz_reader.common.engines import EasyOcr, Tesseract
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.common.thresholds import (
+    CALIBRATION_PATH,
+    THRESHOLD_LADDER,
+    image_statistics,
+    order_ladder,
+    save_calibration,
+)
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    get_bounding_boxes,
+)
+from passport_mrz_reader.test_suite.test import (
+    IMAGES_PATH,
+    LABELS_PATH,
+    check_recognition,
+)
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+ENGINES = {"tesseract": Tesseract, "easyocr": EasyOcr}
+FOLDS = 5
+# Paper added above and below the MRZ of the padded copies, as a share of its
+# height, which changes the share of ink the percentile thresholds depend on
+PADDINGS = (0.25, 0.5, 1.0)
+
+
+def degraded_copies(image, seed: int = 0) -> dict[str, np.ndarray]:
+    """Copies of the image as a bad capture would make them"""
+    height, width = image.shape[:2]
+    rows, columns = np.mgrid[:height, :width]
+    copies = {}
+    for sigma in (2, 3, 5):
+        copies[f"blur {sigma}"] = cv2.GaussianBlur(image, (0, 0), sigma)
+    motion = np.full((1, 15), 1 / 15)
+    copies["motion blur"] = cv2.filter2D(image, -1, motion)
+    for radius in (0.2, 0.4):
+        spot = np.exp(
+            -(
+                ((columns - width / 2) / (width * radius)) ** 2
+                + ((rows - height / 2) / (height * radius * 2)) ** 2
+            )
+        )
+        glare = image.astype(float) + spot[..., None] * 400
+        copies[f"glare {radius}"] = np.clip(glare, 0, 255).astype(np.uint8)
+    copies["dark"] = (image * 0.15).astype(np.uint8)
+    paper = np.median(image, axis=(0, 1))
+    noise = np.random.default_rng(seed).normal(0, 8, image.shape)
+    copies["blank"] = np.clip(paper + noise, 0, 255).astype(np.uint8)
+    return copies
+
+
+def padded_copies(image) -> dict[str, np.ndarray]:
+    """Copies of the image with more paper around the MRZ, as a looser crop
+    would make them"""
+    paper = [int(value) for value in np.median(image, axis=(0, 1))]
+    copies = {}
+    for share in PADDINGS:
+        padding = int(image.shape[0] * share)
+        copies[f"padding {share}"] = cv2.copyMakeBorder(
+            image, padding, padding, 0, 0, cv2.BORDER_CONSTANT, value=paper
+        )
+    return copies
+
+
+def threshold_successes(image, label: str, engine_name: str) -> list[bool]:
+    """Whether a single attempt with each threshold of the ladder succeeds"""
+    if engine_name == "separator":
+        image = imutils.resize(image, width=1200)
+        successes = []
+        for threshold in THRESHOLD_LADDER:
+            boxes, _ = get_bounding_boxes(
+                image, PreProcessors(grayscale=True, threshold=threshold)
+            )
+            successes.append(len(boxes) == 88)
+        return successes
+    engine = ENGINES[engine_name]({})
+    postprocessors = PostProcessors(
+        character_height=True, mrz_fields=True, line_lengths=True
+    )
+    successes = []
+    for threshold in THRESHOLD_LADDER:
+        config = (
+            PreProcessors(grayscale=True, threshold=threshold),
+            engine,
+            postprocessors,
+        )
+        _, valid, correct, _, _, _ = check_recognition(
+            (image, label, config, None)
+        )
+        successes.append(valid and correct)
+    return successes
+
+
+def first_success(successes) -> float:
+    """The first threshold of the ladder that succeeded, or NaN if none
+    did"""
+    for threshold, success in zip(THRESHOLD_LADDER, successes):
+        if success:
+            return threshold
+    return np.nan
+
+
+def attempts(successes: list[bool], order: list[int]) -> int:
+    """The number of attempts until the first success, trying the thresholds
+    in the given order. All thresholds are tried if none succeeds."""
+    for attempt, threshold in enumerate(order, start=1):
+        if successes[THRESHOLD_LADDER.index(threshold)]:
+            return attempt
+    return len(order)
+
+
+def fit(features: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """Least squares fit of the features to the target thresholds"""
+    return np.linalg.lstsq(features, targets, rcond=None)[0]
+
+
+def cross_validated_attempts(features, successes, targets, seed=0):
+    """The number of attempts per image with the predicted ordering, where the
+    prediction for every image comes from a fit without that image"""
+    folds = np.random.default_rng(seed).permutation(len(features)) % FOLDS
+    result = np.empty(len(features), dtype=int)
+    for fold in range(FOLDS):
+        held_out = folds == fold
+        train = ~held_out & ~np.isnan(targets)
+        weights = fit(features[train], targets[train])
+        for index in np.flatnonzero(held_out):
+            order = order_ladder(float(features[index] @ weights))
+            result[index] = attempts(successes[index], order)
+    return result
+
+
+def main(args: argparse.Namespace):
+    """Calibrate, report and save the threshold predictor"""
+    labels = label_pairs(load_labels(args.labels))
+    features, successes = [], []
+    for index, (file_name, label) in enumerate(labels, start=1):
+        image = load_image(f"{args.images}/{file_name}")
+        images = {"original": image}
+        if not args.no_synthetic:
+            images.update(degraded_copies(image, seed=index))
+            images.update(padded_copies(image))
+        for copy in images.values():
+            features.append(image_statistics(copy))
+            successes.append(threshold_successes(copy, label, args.engine))
+        print(f"  Processed {index}/{len(labels)}", end="\r")
+    print()
+    features = np.array(features)
+    successes = np.array(successes)
+    # Images where no threshold succeeds cannot be fitted to
+    targets = np.array([first_success(row) for row in successes])
+    if np.sum(~np.isnan(targets)) < len(features[0]):
+        print("Too few images succeeded with any threshold to calibrate")
+        return
+
+    fixed = [attempts(row, THRESHOLD_LADDER) for row in successes]
+    weights = fit(features[~np.isnan(targets)], targets[~np.isnan(targets)])
+    fitted = [
+        attempts(row, order_ladder(float(statistics @ weights)))
+        for statistics, row in zip(features, successes)
+    ]
+    print(
+        f"Images: {len(features)}, readable: {np.mean(successes.any(1)):.0%}"
+    )
+    print(f"Average attempts with the fixed ladder:  {np.mean(fixed):.2f}")
+    print(f"Average attempts, predicted (in sample): {np.mean(fitted):.2f}")
+    if len(features) >= FOLDS:
+        validated = cross_validated_attempts(features, successes, targets)
+        print(
+            f"Average attempts, predicted ({FOLDS}-fold):   "
+            f"{np.mean(validated):.2f}"
+        )
+    if not args.dry_run:
+        save_calibration(weights, args.output)
+        print(f"Saved calibration to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--engine",
+        choices=["separator", *ENGINES],
+        default="separator",
+        help="What a successful threshold is measured by",
+    )
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    parser.add_argument("--output", default=CALIBRATION_PATH)
+    parser.add_argument(
+        "--no-synthetic",
+        action="store_true",
+        help="Only use the labelled images, without synthetic copies",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report, do not save"
+    )
+    main(parser.parse_args())
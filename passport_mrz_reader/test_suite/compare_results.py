@@ -0,0 +1,44 @@
+"""Compare the results of two evaluation runs of test_suite/evaluate.py,
+listing the images that only one of the configurations reads correctly.
+
+    python -m passport_mrz_reader.test_suite.compare_results
+        tesseract.npy deeplearning.npy
+"""
+
+import argparse
+
+import numpy as np
+
+from passport_mrz_reader.utils.dataset import (
+    diff_results,
+    join_results,
+    load_results,
+)
+
+
+def summary(name: str, results: np.ndarray) -> str:
+    """A one line summary of a run"""
+    return (
+        f"  {name}: {len(results)} images    "
+        f"valid: {np.mean(results['valid']):.1%}    "
+        f"correct: {np.mean(results['correct']):.1%}    "
+        f"mean time: {np.mean(results['seconds']):.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("first", help="Results as .npy or JSON lines")
+    parser.add_argument("second", help="Results as .npy or JSON lines")
+    args = parser.parse_args()
+
+    first, second = load_results(args.first), load_results(args.second)
+    print(summary(args.first, first))
+    print(summary(args.second, second))
+    print(f"  Images in both: {len(join_results(first, second))}")
+    for row in diff_results(first, second):
+        better = args.first if row["correct_1"] else args.second
+        print(f"\n{row['ident']}, only correct in {better}")
+        print(f"  Labelled:\n{row['labeled_text_1']}")
+        print(f"  {args.first}:\n{row['read_text_1']}")
+        print(f"  {args.second}:\n{row['read_text_2']}")
@@ -0,0 +1,293 @@
+"""Parallel, resumable evaluation of a configuration on a labelled dataset.
+
+The images are read and recognised by a pool of worker processes sharing the
+preloaded engine, and every result is appended to a JSON lines file as soon
+as it is done. Running the same command again skips the images that already
+have a result, so an interrupted evaluation continues where it stopped. The
+statistics are updated one result at a time, without keeping the results in
+memory. When the run is done, the results are also saved as a structured array
+next to the JSON lines file, for comparing runs with
+test_suite/compare_results.py.
+
+    python -m passport_mrz_reader.test_suite.evaluate results.jsonl
+        --engine tesseract --preprocessors '{"variable_threshold": true}'
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from typing import Iterator, Optional, Union
+
+import numpy as np
+
+from passport_mrz_reader.common.config import ENGINES, load_config
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.common.worker_pool import WorkerPool
+from passport_mrz_reader.test_suite.test import (
+    IMAGES_PATH,
+    LABELS_PATH,
+    check_recognition,
+)
+from passport_mrz_reader.utils.dataset import (
+    RESULT_VERSION,
+    LazyImages,
+    label_pairs,
+    load_labels,
+    load_results,
+    save_array,
+)
+from passport_mrz_reader.utils.image_loading import load_image
+from passport_mrz_reader.utils.shards import read_image, read_index
+
+# The path of an image file, or the (shard path, index) of an image in a shard
+ImageLocation = Union[str, tuple[str, int]]
+
+
+class EvaluationStats:
+    """Aggregate statistics of an evaluation, updated one result at a time"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.processed = 0
+        self.valid = 0
+        self.correct = 0
+        self.seconds = 0.0
+        self.decode_seconds = 0.0
+        self.errors = 0
+        self.reasons: Counter = Counter()
+
+    def add(self, record: dict):
+        """Count a result record"""
+        self.processed += 1
+        self.valid += int(record["valid"])
+        self.correct += int(record["correct"])
+        self.seconds += record["seconds"]
+        self.decode_seconds += record.get("decode_seconds", 0.0)
+        self.errors += int("error" in record)
+        if not record["valid"]:
+            self.reasons.update(record["reasons"] or ["Unknown"])
+
+    def progress(self) -> str:
+        """A one line summary of the progress"""
+        processed = max(self.processed, 1)
+        return (
+            f"  Processed: {self.processed}/{self.total}    "
+            f"Valid: {self.valid / processed:.1%}    "
+            f"Correct: {self.correct / processed:.1%}    "
+            f"Mean time: {self.seconds / processed:.2f} s    "
+            f"Mean decode time: {self.decode_seconds / processed * 1000:.1f} ms"
+            f"    Errors: {self.errors}"
+        )
+
+    def report(self) -> str:
+        """A summary including the number of failures per reason"""
+        lines = [self.progress(), "  Failure reasons:"]
+        lines += [
+            f"    {count:>6}  {reason}"
+            for reason, count in self.reasons.most_common()
+        ]
+        return "\n".join(lines)
+
+
+def read_results(path: str) -> Iterator[dict]:
+    """Read the result records of an earlier run, skipping a last line that
+    was cut off by an interruption"""
+    if not os.path.exists(path):
+        return
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def _end_last_line(path: str):
+    """End a last line that was cut off by an interruption, so the next
+    result is appended on a line of its own"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as file:
+        file.seek(-1, os.SEEK_END)
+        if file.read(1) != b"\n":
+            file.write(b"\n")
+
+
+def _evaluate(
+    workload: tuple[
+        str,
+        str,
+        ImageLocation,
+        tuple[PreProcessors, Engine, PostProcessors],
+    ],
+) -> dict:
+    """Read and recognise one image in a worker process. An image that
+    cannot be decoded or read gives a failed record with the error, so it is
+    not evaluated again when the run is resumed."""
+    ident, label, location, config = workload
+    started = decoded = time.perf_counter()
+    try:
+        image = (
+            read_image(location)
+            if isinstance(location, tuple)
+            else load_image(location)
+        )
+        decoded = time.perf_counter()
+        _, valid, correct, read_text, _, reasons = check_recognition(
+            (image, label, config, ident)
+        )
+    except Exception as error:  # pylint: disable=broad-except
+        message = f"{type(error).__name__}: {error}"
+        return {
+            "ident": ident,
+            "valid": False,
+            "correct": False,
+            "read_text": None,
+            "labeled_text": label,
+            "reasons": [f"Error: {message}"],
+            "seconds": time.perf_counter() - decoded,
+            "decode_seconds": decoded - started,
+            "error": message,
+        }
+    return {
+        "ident": ident,
+        "valid": valid,
+        "correct": correct,
+        "read_text": read_text,
+        "labeled_text": label,
+        "reasons": reasons,
+        "seconds": time.perf_counter() - decoded,
+        "decode_seconds": decoded - started,
+    }
+
+
+def labelled_images(
+    labels: np.ndarray, images_path: str
+) -> list[tuple[str, str, ImageLocation]]:
+    """The ident, labelled text and path of every image of a labelled
+    dataset"""
+    images = LazyImages(labels, images_path)
+    return [
+        (file_name, label, images.path(index))
+        for index, (file_name, label) in enumerate(label_pairs(labels))
+    ]
+
+
+def evaluate(
+    images: list[tuple[str, str, ImageLocation]],
+    config: tuple[PreProcessors, Engine, PostProcessors],
+    output_path: str,
+    processes: Optional[int] = None,
+    start_method: Optional[str] = None,
+) -> EvaluationStats:
+    """Evaluate a configuration on the labelled images, appending the result
+    of every image to the output file. Images that already have a result in
+    the output file are not evaluated again.
+
+    Args:
+        images: (ident, labelled text, location) of every image, from
+            labelled_images or shards.read_index
+        config: tuple of (pre-processors, engine, post-processors)
+        output_path: The JSON lines file to append the results to
+        processes: The number of worker processes, all cores if None
+        start_method: How the workers are started, see WorkerPool
+    """
+    stats = EvaluationStats(len(images))
+    idents = {ident for ident, _, _ in images}
+    done = set()
+    # Only count earlier results of the images evaluated now, the output file
+    # may also hold the results of other images
+    for record in read_results(output_path):
+        if record["ident"] in idents and record["ident"] not in done:
+            done.add(record["ident"])
+            stats.add(record)
+    workloads = [(*image, config) for image in images if image[0] not in done]
+    print(f"Skipping {len(done)} earlier results")
+    _end_last_line(output_path)
+
+    with WorkerPool(
+        [config[1]], processes, start_method=start_method
+    ) as pool, open(output_path, "a", encoding="utf-8") as output:
+        for record in pool.imap_unordered(_evaluate, workloads, chunksize=4):
+            output.write(json.dumps(record) + "\n")
+            output.flush()
+            stats.add(record)
+            print(stats.progress(), end="\r")
+    print()
+    save_array(
+        load_results(output_path),
+        f"{os.path.splitext(output_path)[0]}.npy",
+        RESULT_VERSION,
+    )
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output", help="JSON lines file to append results to")
+    parser.add_argument("--labels", default=LABELS_PATH)
+    parser.add_argument("--images", default=IMAGES_PATH)
+    parser.add_argument(
+        "--shards",
+        help="Directory of shards made by utils/shards.py, used instead of "
+        "--labels and --images",
+    )
+    parser.add_argument("--engine", choices=list(ENGINES), default="tesseract")
+    parser.add_argument(
+        "--preprocessors",
+        type=json.loads,
+        default={"variable_threshold": True},
+        help="JSON object of PreProcessors options",
+    )
+    parser.add_argument(
+        "--postprocessors",
+        type=json.loads,
+        default={
+            "character_height": True,
+            "mrz_fields": True,
+            "line_lengths": True,
+        },
+        help="JSON object of PostProcessors options",
+    )
+    parser.add_argument(
+        "--config",
+        help="Configuration file made by test_suite/autotune.py, used "
+        "instead of --engine, --preprocessors and --postprocessors",
+    )
+    parser.add_argument(
+        "--processes", type=int, help="Number of workers, all cores if unset"
+    )
+    parser.add_argument(
+        "--start-method",
+        choices=["fork", "spawn", "forkserver"],
+        help="How the workers are started, the default of the platform if "
+        "unset. Use spawn when the engine starts threads while loading.",
+    )
+    args = parser.parse_args()
+
+    final_stats = evaluate(
+        (
+            read_index(args.shards)
+            if args.shards
+            else labelled_images(load_labels(args.labels), args.images)
+        ),
+        (
+            load_config(args.config)
+            if args.config
+            else (
+                PreProcessors(**args.preprocessors),
+                ENGINES[args.engine]({}),
+                PostProcessors(**args.postprocessors),
+            )
+        ),
+        args.output,
+        args.processes,
+        args.start_method,
+    )
+    print(final_stats.report())
@@ -1,22 +1,138 @@
+"""Read the MRZ of a batch of images, printing the text read from each.
+
+The inputs are image files, folders of images, or folders of shards made by
+utils/shards.py:
+
+    python -m passport_mrz_reader.test_suite.production
+        "data/images/PRADO MRZ/31028.jpeg" shards/mrz
+"""
+
+import argparse
 import os
-from typing import Optional
+import time
+from dataclasses import replace
+from typing import Iterator, Optional
 
 import numpy as np
-from PIL import Image
 
-from passport_mrz_reader.common.engines import DeepLearning, Tesseract
+from passport_mrz_reader.common.config import ENGINES, load_config
 from passport_mrz_reader.common.interfaces import PreProcessors, PostProcessors
-from passport_mrz_reader.common.process import process
-
-result: Optional[str] = process(
-    np.asarray(
-        Image.open(
-            os.path.dirname(__file__) + "/../../data/images/PRADO MRZ/31028.jpeg"
-        )
-    ),
-    PreProcessors(variable_threshold=True),
-    Tesseract({}),
-    PostProcessors(character_height=True, mrz_fields=True, line_lengths=True)
+from passport_mrz_reader.common.process import process_result
+from passport_mrz_reader.common.worker_pool import WorkerPool
+from passport_mrz_reader.utils.image_loading import (
+    TARGET_WIDTH,
+    timed_load_image,
+)
+from passport_mrz_reader.utils.shards import (
+    is_shard_directory,
+    read_image,
+    read_index,
 )
 
-print(result)
+
+def read_inputs(
+    inputs: list[str], target_width: Optional[int] = TARGET_WIDTH
+) -> Iterator[tuple[str, np.ndarray, float]]:
+    """Read the images of the inputs one at a time, yielding (name, image,
+    seconds spent decoding)
+
+    Args:
+        inputs: Image files, folders of images or folders of shards
+        target_width: The smallest width the images are reduced to, the
+            full resolution if None
+    """
+    for path in inputs:
+        if os.path.isdir(path) and is_shard_directory(path):
+            for key, _, location in read_index(path):
+                started = time.perf_counter()
+                image = read_image(location, target_width)
+                yield key, image, time.perf_counter() - started
+        elif os.path.isdir(path):
+            for file_name in sorted(os.listdir(path)):
+                yield file_name, *timed_load_image(
+                    os.path.join(path, file_name), target_width
+                )
+        else:
+            yield path, *timed_load_image(path, target_width)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[
+            f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ/31028.jpeg"
+        ],
+    )
+    parser.add_argument("--engine", choices=list(ENGINES), default="tesseract")
+    parser.add_argument(
+        "--config",
+        help="Configuration file made by test_suite/autotune.py, used "
+        "instead of --engine",
+    )
+    parser.add_argument(
+        "--locate",
+        action="store_true",
+        help="Find the MRZ first, for images of whole passport pages",
+    )
+    parser.add_argument(
+        "--page",
+        action="store_true",
+        help="Read every MRZ of pages with several documents, like flatbed "
+        "scans, at full resolution and in parallel",
+    )
+    parser.add_argument(
+        "--quality-gate",
+        action="store_true",
+        help="Reject blurry, glare-covered and blank images before reading",
+    )
+    parser.add_argument(
+        "--timing",
+        action="store_true",
+        help="Print the decode time, the time of every stage and the "
+        "attempts of the engine for every image",
+    )
+    args = parser.parse_args()
+
+    if args.config:
+        preprocessors, engine, postprocessors = load_config(args.config)
+    else:
+        preprocessors = PreProcessors(variable_threshold=True)
+        engine = ENGINES[args.engine]({})
+        postprocessors = PostProcessors(
+            character_height=True, mrz_fields=True, line_lengths=True
+        )
+    if args.locate:
+        preprocessors = replace(preprocessors, locate_mrz=True)
+    if args.quality_gate:
+        preprocessors = replace(preprocessors, quality_gate=True)
+    if args.page:
+        with WorkerPool([engine]) as pool:
+            for name, image, _ in read_inputs(args.inputs, None):
+                results = pool.process_page(
+                    image, preprocessors, engine, postprocessors
+                )
+                print(f"{name}: {len(results)} MRZ blocks")
+                for result in results:
+                    print(f"  {result.roi}:")
+                    print(result.text or f"  {result.failure}")
+    else:
+        for name, image, decode_seconds in read_inputs(args.inputs):
+            result = process_result(
+                image, preprocessors, engine, postprocessors
+            )
+            if args.timing:
+                stages = ", ".join(
+                    f"{stage} {seconds * 1000:.1f} ms"
+                    for stage, seconds in result.durations.items()
+                )
+                print(
+                    f"{name}: decoded in {decode_seconds * 1000:.1f} ms, "
+                    f"{stages}, threshold {result.threshold} after "
+                    f"{result.attempts} attempts"
+                )
+            if result.text is None:
+                print(f"{name}: {result.failure}")
+            else:
+                print(f"{name}:\n{result.text}")
@@ -1,9 +1,14 @@
 """Testing of image recognition"""
+import os
 from typing import Optional, Any
 from passport_mrz_reader.common.interfaces import Engine, PostProcessors, PreProcessors
 from passport_mrz_reader.common.process import process
 from passport_mrz_reader.utils.custom_passport_checker import CustomPassportChecker
 
+DATA_ROOT = f"{os.path.dirname(__file__)}/../../data"
+LABELS_PATH = f"{DATA_ROOT}/labeled passport data.csv"
+IMAGES_PATH = f"{DATA_ROOT}/images/PRADO MRZ"
+
 SingleResult = tuple[Optional[str], bool, bool, Optional[str], str, Optional[list[str]]]
 """Tuple of (ident?, valid, correct, read_text, labeled_text, list? of reasons for invalidity)"""
 
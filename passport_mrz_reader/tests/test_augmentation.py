@@ -0,0 +1,84 @@
+"""Tests the in-memory augmentation of the character images"""
+
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.new_training_data.augmentation import (
+    augment_batch,
+    augmented_batches,
+)
+
+CHARACTERS = "0123456789<ABCDEF"
+
+
+def character_images(channels: int) -> tuple[np.ndarray, np.ndarray]:
+    """Black characters drawn on white squares, three of every class but
+    the first, which has one"""
+    images, labels = [], []
+    for label, character in enumerate(CHARACTERS):
+        for _ in range(1 if label == 0 else 3):
+            image = np.full((32, 32, channels), 255, dtype=np.uint8)
+            cv2.putText(
+                image,
+                character,
+                (6, 26),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                1,
+                (0, 0, 0),
+                2,
+            )
+            images.append(image)
+            labels.append(label)
+    return np.stack(images), np.array(labels, dtype=np.int32)
+
+
+def epoch(images, labels, seed: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    """The augmented batches of one epoch drawn with the seed"""
+    rng = np.random.default_rng(seed)
+    return list(augmented_batches(images, labels, 8, rng))
+
+
+class TestAugmentation(unittest.TestCase):
+    """Tests that augmentation is reproducible from the seed"""
+
+    def test_same_seed(self):
+        """Test that the same seed gives identical batches, for grayscale
+        and colour images"""
+        for channels in (1, 3):
+            with self.subTest(channels=channels):
+                images, labels = character_images(channels)
+                first = epoch(images, labels, seed=7)
+                second = epoch(images, labels, seed=7)
+                self.assertEqual(len(first), len(second))
+                for (batch, batch_labels), (other, other_labels) in zip(
+                    first, second
+                ):
+                    self.assertEqual(batch.dtype, np.uint8)
+                    self.assertEqual(batch.shape[1:], images.shape[1:])
+                    np.testing.assert_array_equal(batch, other)
+                    np.testing.assert_array_equal(batch_labels, other_labels)
+
+    def test_other_seed(self):
+        """Test that another seed gives other variations"""
+        images, labels = character_images(1)
+        first = np.concatenate(
+            [batch for batch, _ in epoch(images, labels, 7)]
+        )
+        other = np.concatenate(
+            [batch for batch, _ in epoch(images, labels, 8)]
+        )
+        self.assertFalse(np.array_equal(first, other))
+
+    def test_new_batch(self):
+        """Test that the images given are not changed"""
+        images, _ = character_images(1)
+        original = images.copy()
+        augmented = augment_batch(images, np.random.default_rng(0))
+        np.testing.assert_array_equal(images, original)
+        self.assertFalse(np.array_equal(augmented, original))
+
+
+if __name__ == "__main__":
+    unittest.main()
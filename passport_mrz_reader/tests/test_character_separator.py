@@ -0,0 +1,106 @@
+"""Tests the character separator"""
+
+import os
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.common.interfaces import PreProcessors
+from passport_mrz_reader.common.preprocessing import preprocess
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    FALLBACK_THRESHOLD,
+    estimate_character_size,
+    is_binary,
+    search_character_boxes,
+)
+from passport_mrz_reader.utils.image_loading import load_image
+
+IMAGES_PATH = f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ"
+
+
+def mrz_boxes(scale: float = 1, specks: int = 300) -> np.ndarray:
+    """The (x, y, w, h) boxes of two lines of 44 characters of height 25,
+    70 apart, with small specks of noise and a large smudge, all scaled"""
+    rng = np.random.default_rng(0)
+    characters = [
+        (20 + 24 * index, top, 17, 25)
+        for top in (20, 90)
+        for index in range(44)
+    ]
+    noise = [
+        (x, y, 4, 4)
+        for x, y in zip(
+            rng.integers(0, 1000, specks), rng.integers(0, 140, specks)
+        )
+    ]
+    return np.array([*characters, *noise, (0, 0, 300, 140)]) * scale
+
+
+class TestEstimateCharacterSize(unittest.TestCase):
+    """Tests estimating the height of the characters and the spacing of the
+    lines from the boxes of the components"""
+
+    def test_estimate(self):
+        """Test that the specks and the smudge do not change the estimate,
+        at any resolution"""
+        for scale in (0.5, 1, 2):
+            with self.subTest(scale=scale):
+                height, spacing = estimate_character_size(mrz_boxes(scale))
+                self.assertAlmostEqual(height, 25 * scale)
+                self.assertAlmostEqual(spacing, 70 * scale)
+
+    def test_one_line(self):
+        """Test that a single line has a height but no line spacing"""
+        boxes = mrz_boxes(specks=0)[:44]
+        height, spacing = estimate_character_size(boxes)
+        self.assertEqual(height, 25)
+        self.assertIsNone(spacing)
+
+    def test_too_few(self):
+        """Test that too few components give no estimate"""
+        self.assertEqual(estimate_character_size([]), (None, None))
+        self.assertEqual(
+            estimate_character_size(mrz_boxes(specks=0)[:5]), (None, None)
+        )
+
+
+class TestSearchCharacterBoxes(unittest.TestCase):
+    """Tests finding the 88 characters with the preprocessed image an engine
+    is given"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.images = [
+            load_image(os.path.join(IMAGES_PATH, file_name))
+            for file_name in sorted(os.listdir(IMAGES_PATH))
+        ]
+
+    def test_not_binary(self):
+        """Test that preprocessors without a threshold fall back to
+        thresholding the image, instead of segmenting a gray image"""
+        for preprocessors in (PreProcessors(), PreProcessors(grayscale=True)):
+            for image in self.images:
+                preprocessed = preprocess(image, preprocessors)
+                self.assertFalse(is_binary(preprocessed))
+                segmentation, attempts = search_character_boxes(
+                    image, preprocessed
+                )
+                self.assertEqual(len(segmentation.boxes), 88)
+                self.assertEqual(segmentation.threshold, FALLBACK_THRESHOLD)
+                self.assertEqual(attempts, 1)
+
+    def test_binary(self):
+        """Test that a binary preprocessed image is segmented as it is"""
+        for image in self.images:
+            preprocessed = preprocess(
+                image,
+                PreProcessors(grayscale=True, adaptive_threshold="sauvola"),
+            )
+            self.assertTrue(is_binary(preprocessed))
+            segmentation, _ = search_character_boxes(image, preprocessed)
+            self.assertEqual(len(segmentation.boxes), 88)
+            self.assertIsNone(segmentation.threshold)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests that the pipeline gives the same results when called from many
+threads at once as when called serially"""
+
+import importlib.util
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from passport_mrz_reader.common.engines import (
+    DeepLearning,
+    Template,
+    Tesseract,
+)
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessorMetadata,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.common.mrz_common import MRZ_CHARACTERS
+from passport_mrz_reader.common.process import process
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    SEGMENTATION_CACHE,
+    find_character_boxes,
+)
+from passport_mrz_reader.utils.image_loading import load_image
+
+IMAGES_PATH = f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ"
+CALLS = 240
+THREADS = 16
+CONFIGS = [
+    PreProcessors(variable_threshold=True),
+    PreProcessors(grayscale=True, threshold=10),
+    PreProcessors(grayscale=True, adaptive_threshold="sauvola"),
+    PreProcessors(variable_threshold=True, deskew=True),
+]
+POSTPROCESSORS = PostProcessors(character_height=True, line_lengths=True)
+
+
+class SeparatorEngine(Engine):
+    """An engine using the real character separator, which reads every
+    character as a checksum of its pixels, so any mixed up crop changes the
+    text"""
+
+    def get_mrz_text(self, original_image, preprocessed_image, verbose=False):
+        segmentation = find_character_boxes(
+            original_image, preprocessed_image, verbose
+        )
+        if segmentation is None:
+            return None
+        text = "".join(
+            MRZ_CHARACTERS[int(np.sum(image, dtype=np.int64)) % 37]
+            for image in segmentation.character_images
+        )
+        return f"{text[:44]}\n{text[44:]}", PostProcessorMetadata(
+            box_heights=segmentation.boxes[:, 3].tolist()
+        )
+
+
+def _has_module(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+class TestConcurrency(unittest.TestCase):
+    """Runs hundreds of concurrent process calls and compares them with
+    serial runs"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.images = [
+            load_image(os.path.join(IMAGES_PATH, file_name))
+            for file_name in sorted(os.listdir(IMAGES_PATH))
+        ]
+
+    def _workloads(self):
+        """(image, config) of every call, with a copy of the image with one
+        pixel changed for every call, so no call can reuse another call's
+        cached work"""
+        workloads = []
+        for index in range(CALLS):
+            image = self.images[index % len(self.images)].copy()
+            image[0, index % image.shape[1]] ^= 1
+            workloads.append((image, CONFIGS[index % len(CONFIGS)]))
+        return workloads
+
+    def _assert_concurrent_matches_serial(self, engine: Engine):
+        workloads = self._workloads()
+        serial = [
+            process(image, config, engine, POSTPROCESSORS)
+            for image, config in workloads
+        ]
+        SEGMENTATION_CACHE.clear()
+        with ThreadPoolExecutor(THREADS) as executor:
+            concurrent = list(
+                executor.map(
+                    lambda workload: process(
+                        workload[0], workload[1], engine, POSTPROCESSORS
+                    ),
+                    self._workloads(),
+                )
+            )
+        self.assertTrue(any(result is not None for result in serial))
+        self.assertEqual(serial, concurrent)
+
+    def test_separator(self):
+        """Test the preprocessing, the character separator and its cache"""
+        self._assert_concurrent_matches_serial(SeparatorEngine())
+
+    def test_template(self):
+        """Test the templates of the Template engine"""
+        self._assert_concurrent_matches_serial(Template({}))
+
+    @unittest.skipUnless(_has_module("pytesseract"), "needs pytesseract")
+    def test_tesseract(self):
+        """Test the Tesseract engine"""
+        self._assert_concurrent_matches_serial(Tesseract({}))
+
+    @unittest.skipUnless(_has_module("tensorflow"), "needs TensorFlow")
+    def test_deep_learning(self):
+        """Test the Keras model of the DeepLearning engine"""
+        self._assert_concurrent_matches_serial(DeepLearning({}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""Tests the configuration files and the autotuner writing them"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.common.config import (
+    config_from_dict,
+    load_config,
+    save_config,
+)
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.common.process import process
+from passport_mrz_reader.test_suite.autotune import (
+    Candidate,
+    candidate_configs,
+    pareto_front,
+    pareto_ranks,
+    successive_halving,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+
+class TestConfig(unittest.TestCase):
+    """Tests saving and loading configurations"""
+
+    def test_round_trip(self):
+        """Test that a loaded configuration equals the saved one, and can be
+        passed to process"""
+        config = (
+            PreProcessors(adaptive_threshold="sauvola", deskew=True),
+            Template({}),
+            PostProcessors(mrz_fields=True, line_lengths=True),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            save_config(config, path, {"accuracy": 0.5})
+            with open(path, encoding="utf-8") as file:
+                saved = json.load(file)
+            preprocessors, engine, postprocessors = load_config(path)
+        self.assertEqual(saved["engine"], "template")
+        self.assertNotIn("grayscale", saved["preprocessors"])
+        self.assertEqual(preprocessors, config[0])
+        self.assertIsInstance(engine, Template)
+        self.assertEqual(postprocessors, config[2])
+        file_name, label = label_pairs(load_labels(LABELS_PATH))[0]
+        image = load_image(f"{IMAGES_PATH}/{file_name}")
+        mrz_text = process(image, preprocessors, engine, postprocessors)
+        self.assertEqual(mrz_text.splitlines()[1], label.splitlines()[1])
+
+    def test_invalid(self):
+        """Test that unknown engines and options are rejected"""
+        with self.assertRaises(ValueError):
+            config_from_dict({"engine": "unknown"})
+        with self.assertRaises(ValueError):
+            config_from_dict(
+                {"engine": "template", "preprocessors": {"unknown": True}}
+            )
+
+
+class TestAutotune(unittest.TestCase):
+    """Tests the search of the autotuner"""
+
+    def test_pareto_ranks(self):
+        """Test the layers of accuracy against latency"""
+        ranks = pareto_ranks([0.9, 0.8, 0.8, 0.5, 0.9], [2, 1, 2, 3, 2])
+        np.testing.assert_array_equal(ranks, [0, 0, 1, 2, 0])
+
+    def test_candidates(self):
+        """Test that every candidate is a different configuration"""
+        configs = candidate_configs([Template({})])
+        self.assertEqual(len(configs), 3 * 2 * 2 * 8)
+        self.assertEqual(
+            len({repr((pre, post)) for pre, _, post in configs}), len(configs)
+        )
+
+    def test_successive_halving(self):
+        """Test that only the survivors read every image, and that the
+        budget is kept"""
+        images = [
+            (load_image(f"{IMAGES_PATH}/{file_name}"), label)
+            for file_name, label in label_pairs(load_labels(LABELS_PATH))
+        ]
+        images = images * 3
+        candidates = [
+            Candidate(config)
+            for config in candidate_configs([Template({})])
+            if not config[0].quality_gate and not config[0].deskew
+        ]
+        survivors = successive_halving(
+            candidates, images, 10, min_images=2, min_survivors=3
+        )
+        # 24 candidates read 2 images, the best 8 read all 6
+        self.assertEqual(len(survivors), 8)
+        for candidate in candidates:
+            if candidate not in survivors:
+                self.assertEqual(len(candidate.correct), 2)
+        for candidate in survivors:
+            self.assertEqual(len(candidate.correct), len(images))
+        front = pareto_front(survivors)
+        self.assertEqual(front[-1].accuracy, max(c.accuracy for c in front))
+        self.assertEqual(
+            successive_halving(candidates[:2], images, 0, min_images=2), []
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests the columnar storage of labels and evaluation results"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from passport_mrz_reader.utils.dataset import (
+    LABEL_VERSION,
+    RESULT_VERSION,
+    VERSION_SUFFIX,
+    diff_results,
+    join_results,
+    label_pairs,
+    load_labels,
+    load_results,
+    results_from_records,
+    save_array,
+    saved_version,
+)
+
+
+def record(ident: str, correct: bool, read_text: str = "P<NOR") -> dict:
+    """A result record as written by test_suite/evaluate.py"""
+    return {
+        "ident": ident,
+        "valid": correct,
+        "correct": correct,
+        "read_text": read_text,
+        "labeled_text": "P<NOR",
+        "reasons": [] if correct else ["Invalid checksum", "Wrong length"],
+        "seconds": 1.0,
+    }
+
+
+class TestLabels(unittest.TestCase):
+    """Tests loading labels through the .npy cache"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, "labels.csv")
+        self.cache_path = os.path.join(directory.name, "labels.npy")
+        self.long_name = "a" * 100 + ".jpeg"
+        with open(self.csv_path, "w", encoding="utf-8") as file:
+            file.write("Filnavn,Linje 1,Linje 2\n")
+            file.write(f"{self.long_name},P<NOR,123\n")
+            file.write("short.jpeg,P<SWE,456\n")
+
+    def test_load(self):
+        """Test that long values are kept whole, and that the labels are
+        the same from the cache"""
+        expected = [
+            (self.long_name, "P<NOR\n123"),
+            ("short.jpeg", "P<SWE\n456"),
+        ]
+        self.assertEqual(label_pairs(load_labels(self.csv_path)), expected)
+        self.assertFalse(os.path.exists(self.cache_path))
+        cached = load_labels(self.csv_path, self.cache_path)
+        self.assertEqual(label_pairs(cached), expected)
+        self.assertTrue(os.path.exists(self.cache_path))
+        cached = load_labels(self.csv_path, self.cache_path)
+        self.assertEqual(label_pairs(cached), expected)
+
+    def test_version(self):
+        """Test that a cache saved with another version is rebuilt"""
+        load_labels(self.csv_path, self.cache_path)
+        with open(
+            self.cache_path + VERSION_SUFFIX, "w", encoding="ascii"
+        ) as file:
+            file.write("0")
+        self.assertEqual(len(load_labels(self.csv_path, self.cache_path)), 2)
+        self.assertEqual(saved_version(self.cache_path), LABEL_VERSION)
+
+
+class TestResults(unittest.TestCase):
+    """Tests converting, joining and comparing results"""
+
+    def setUp(self):
+        self.first = results_from_records(
+            [record("a", True), record("b", False), record("c", True)]
+        )
+        self.second = results_from_records(
+            [record("b", True), record("c", True), record("d", False)]
+        )
+
+    def test_records(self):
+        """Test that long text and the reasons are kept"""
+        results = results_from_records([record("a", False, "<" * 300)])
+        self.assertEqual(results["read_text"][0], "<" * 300)
+        self.assertEqual(
+            results["reasons"][0], "Invalid checksum; Wrong length"
+        )
+        self.assertEqual(results["decode_seconds"][0], 0.0)
+
+    def test_join(self):
+        """Test that only the images in both runs are joined"""
+        joined = join_results(self.first, self.second)
+        self.assertEqual(list(joined["ident"]), ["b", "c"])
+        self.assertEqual(list(joined["correct_1"]), [False, True])
+        self.assertEqual(list(joined["correct_2"]), [True, True])
+
+    def test_diff(self):
+        """Test that only the images read correctly by one run differ"""
+        self.assertEqual(
+            list(diff_results(self.first, self.second)["ident"]), ["b"]
+        )
+
+    def test_version(self):
+        """Test that results saved with another version are rebuilt from
+        the JSON lines next to them, and rejected without them"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.npy")
+            save_array(self.first, path, RESULT_VERSION - 1)
+            with self.assertRaises(ValueError):
+                load_results(path)
+            with open(
+                os.path.join(directory, "results.jsonl"), "w", encoding="utf-8"
+            ) as file:
+                for ident in "xy":
+                    file.write(json.dumps(record(ident, True)) + "\n")
+            self.assertEqual(list(load_results(path)["ident"]), ["x", "y"])
+            self.assertEqual(saved_version(path), RESULT_VERSION)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+"""Tests the line detection of the EasyOCR engine"""
+
+import importlib.util
+import unittest
+
+from passport_mrz_reader.easy_ocr.line_boxes import (
+    free_box_rectangles,
+    mrz_line_boxes,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+
+class TestLineBoxes(unittest.TestCase):
+    """Tests merging the boxes of the text detector into the MRZ lines"""
+
+    def test_line_boxes(self):
+        """Test that the pieces of a line are merged, and only the bottom two
+        lines are kept"""
+        boxes = [
+            [0, 100, 10, 30],
+            [0, 500, 100, 130],
+            [520, 1100, 102, 128],
+            [5, 1100, 150, 180],
+        ]
+        self.assertEqual(
+            mrz_line_boxes(boxes), [[0, 1106, 94, 136], [0, 1106, 144, 186]]
+        )
+        self.assertEqual(mrz_line_boxes([]), [])
+
+    def test_free_boxes(self):
+        """Test that a tilted box is merged into its line by its bounding
+        rectangle"""
+        tilted = [[520, 110], [1100, 100], [1100, 126], [520, 136]]
+        self.assertEqual(
+            free_box_rectangles([tilted]), [[520, 1100, 100, 136]]
+        )
+        boxes = [[0, 500, 100, 130], [5, 1100, 150, 180]]
+        self.assertEqual(
+            mrz_line_boxes(boxes + free_box_rectangles([tilted])),
+            [[0, 1107, 93, 143], [0, 1106, 144, 186]],
+        )
+
+
+@unittest.skipUnless(
+    importlib.util.find_spec("easyocr") is not None, "needs EasyOCR"
+)
+class TestEasyOcr(unittest.TestCase):
+    """Tests detecting the lines once and recognising them per threshold"""
+
+    def test_engine(self):
+        """Test that the engine reads two lines, with a confidence for every
+        line and character"""
+        from passport_mrz_reader.easy_ocr.easy_ocr_predict import (
+            get_raw_mrz_text,
+        )
+
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[0]
+        image = load_image(f"{IMAGES_PATH}/{file_name}")
+        mrz_text, metadata = get_raw_mrz_text(image, None)
+        self.assertEqual(len(mrz_text.splitlines()), 2)
+        self.assertEqual(len(metadata.line_confidences), 2)
+        self.assertEqual(
+            len(metadata.confidences), len(mrz_text.replace("\n", ""))
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
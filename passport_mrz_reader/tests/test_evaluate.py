@@ -0,0 +1,130 @@
+"""Tests the resumable evaluation runner"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.test_suite.evaluate import evaluate, read_results
+from passport_mrz_reader.test_suite.test import (
+    IMAGES_PATH,
+    LABELS_PATH,
+    accumulate,
+)
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+
+CONFIG = (
+    PreProcessors(variable_threshold=True),
+    Template({}),
+    PostProcessors(mrz_fields=True, line_lengths=True),
+)
+
+
+class TestEvaluate(unittest.TestCase):
+    """Tests resuming an evaluation and recording the images that fail"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.output = os.path.join(directory.name, "results.jsonl")
+        self.images = [
+            (file_name, label, f"{IMAGES_PATH}/{file_name}")
+            for file_name, label in label_pairs(load_labels(LABELS_PATH))
+        ]
+        broken = os.path.join(directory.name, "broken.jpeg")
+        with open(broken, "wb") as file:
+            file.write(b"not a jpeg")
+        self.images.append(("broken.jpeg", self.images[0][1], broken))
+
+    def test_resume(self):
+        """Test that only the images without a result are evaluated, and
+        that a line cut off by an interruption is ignored"""
+        first_ident = self.images[0][0]
+        with open(self.output, "w", encoding="utf-8") as file:
+            file.write(
+                json.dumps(
+                    {
+                        "ident": first_ident,
+                        "valid": True,
+                        "correct": True,
+                        "read_text": None,
+                        "labeled_text": self.images[0][1],
+                        "reasons": [],
+                        "seconds": 1.0,
+                    }
+                )
+                + "\n"
+                + '{"ident": "cut off'
+            )
+        stats = evaluate(self.images, CONFIG, self.output, processes=2)
+        self.assertEqual(stats.processed, len(self.images))
+        self.assertEqual(stats.errors, 1)
+        # The first image kept its earlier result
+        self.assertGreaterEqual(stats.seconds, 1.0)
+        records = list(read_results(self.output))
+        self.assertEqual(
+            sorted(record["ident"] for record in records),
+            sorted(ident for ident, _, _ in self.images),
+        )
+        self.assertTrue(os.path.exists(self.output[: -len(".jsonl")] + ".npy"))
+
+    def test_other_images(self):
+        """Test that earlier results of images not evaluated now are not
+        counted"""
+        first_ident = self.images[0][0]
+        with open(self.output, "w", encoding="utf-8") as file:
+            for ident in (first_ident, "other.jpeg", first_ident):
+                record = {
+                    "ident": ident,
+                    "valid": False,
+                    "correct": False,
+                    "read_text": None,
+                    "labeled_text": self.images[0][1],
+                    "reasons": [],
+                    "seconds": 1.0,
+                }
+                file.write(json.dumps(record) + "\n")
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            stats = evaluate(self.images, CONFIG, self.output, processes=2)
+        self.assertIn("Skipping 1 earlier results", printed.getvalue())
+        self.assertEqual(stats.processed, len(self.images))
+
+    def test_error(self):
+        """Test that an image that cannot be read is a failed result, and is
+        not evaluated again"""
+        stats = evaluate(self.images, CONFIG, self.output, processes=2)
+        self.assertEqual(stats.errors, 1)
+        self.assertEqual(stats.processed, len(self.images))
+        broken = next(
+            record
+            for record in read_results(self.output)
+            if record["ident"] == "broken.jpeg"
+        )
+        self.assertFalse(broken["valid"])
+        self.assertIn("error", broken)
+        self.assertTrue(broken["reasons"][0].startswith("Error: "))
+
+        again = evaluate(self.images, CONFIG, self.output, processes=2)
+        self.assertEqual(again.processed, len(self.images))
+        self.assertEqual(len(list(read_results(self.output))), 3)
+
+
+class TestAccumulate(unittest.TestCase):
+    """Tests counting the results of check_recognition"""
+
+    def test_does_not_mutate(self):
+        """Test that the results of the previous report are not changed"""
+        results = []
+        result = ("ident", True, False, "text", "text", [])
+        report = accumulate((results, 0, 0, 0, 2), result)
+        self.assertEqual(results, [])
+        self.assertEqual(report, ([result], 1, 1, 0, 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
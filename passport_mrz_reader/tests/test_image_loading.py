@@ -0,0 +1,70 @@
+"""Tests decoding images at a reduced resolution"""
+
+import io
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import TARGET_WIDTH, load_image
+
+
+def encoded(image: np.ndarray, image_format: str) -> bytes:
+    """The image encoded in the format"""
+    buffer = io.BytesIO()
+    Image.fromarray(image).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+class TestLoadImage(unittest.TestCase):
+    """Tests that JPEGs are decoded no smaller than the target width"""
+
+    @classmethod
+    def setUpClass(cls):
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[0]
+        sample = load_image(f"{IMAGES_PATH}/{file_name}", None)
+        # A capture of 5000 pixels wide, reduced by 4 to 1250 when decoding
+        cls.large = cv2.resize(sample, (5000, 800))
+        cls.jpeg = encoded(cls.large, "JPEG")
+
+    def test_draft_width(self):
+        """Test that the largest reduction keeping the target width is
+        used, whatever the image is read from"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "large.jpeg")
+            with open(path, "wb") as file:
+                file.write(self.jpeg)
+            sources = {
+                "path": path,
+                "bytes": self.jpeg,
+                "memoryview": memoryview(self.jpeg),
+                "file": io.BytesIO(self.jpeg),
+            }
+            for name, source in sources.items():
+                with self.subTest(source=name):
+                    image = load_image(source)
+                    self.assertEqual(image.shape, (200, 1250, 3))
+        self.assertEqual(load_image(self.jpeg, 2000).shape[1], 2500)
+        self.assertEqual(load_image(self.jpeg, 700).shape[1], 1250)
+        self.assertEqual(load_image(self.jpeg, 625).shape[1], 625)
+
+    def test_full_resolution(self):
+        """Test that no target width, small images and other formats are
+        decoded at full resolution"""
+        self.assertEqual(load_image(self.jpeg, None).shape[1], 5000)
+        small = self.large[:, :TARGET_WIDTH]
+        self.assertEqual(
+            load_image(encoded(small, "JPEG")).shape[1], TARGET_WIDTH
+        )
+        np.testing.assert_array_equal(
+            load_image(encoded(self.large, "PNG")), self.large
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+"""Tests the memory benchmark of the stages and engines"""
+
+import unittest
+
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.common.process import process_result
+from passport_mrz_reader.test_suite.benchmark_memory import (
+    measure_passport,
+    regressions,
+    rss_bytes,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+PREPROCESSORS = PreProcessors(grayscale=True, threshold=30, deskew=True)
+POSTPROCESSORS = PostProcessors(mrz_fields=True, line_lengths=True)
+
+
+class TestMemory(unittest.TestCase):
+    """Tests measuring the memory of the stages of a passport"""
+
+    @classmethod
+    def setUpClass(cls):
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[0]
+        cls.image = load_image(f"{IMAGES_PATH}/{file_name}")
+
+    def test_stage_hook(self):
+        """Test that the hook is called with every stage that ran, in
+        order"""
+        stages = []
+        result = process_result(
+            self.image,
+            PREPROCESSORS,
+            Template({}),
+            POSTPROCESSORS,
+            stage_hook=stages.append,
+        )
+        self.assertEqual(
+            stages, ["deskew", "preprocess", "engine", "postprocess"]
+        )
+        self.assertEqual(list(result.durations), stages + ["total"])
+
+    def test_measure_passport(self):
+        """Test that every stage gets a peak, and that the thresholded
+        image is found as a hotspot of the preprocessing"""
+        engine = Template({})
+        engine.load()
+        measured = measure_passport(
+            self.image, (PREPROCESSORS, engine, POSTPROCESSORS)
+        )
+        self.assertEqual(
+            list(measured["stages"]),
+            ["deskew", "preprocess", "engine", "postprocess"],
+        )
+        stages = measured["stages"]
+        for stage in stages.values():
+            self.assertGreater(stage["peak"], 0)
+            self.assertLessEqual(stage["retained"], stage["peak"])
+        # The images held by the earlier stages are not part of the peak of
+        # the postprocessing, which only works on the text
+        self.assertLess(stages["postprocess"]["peak"], 100_000)
+        self.assertGreater(stages["preprocess"]["retained"], 500_000)
+        hotspots = stages["preprocess"]["hotspots"]
+        self.assertTrue(
+            any("preprocessing.py" in hotspot["line"] for hotspot in hotspots)
+        )
+        self.assertGreater(rss_bytes(), 0)
+
+    def test_regressions(self):
+        """Test that only growth over the tolerance is a regression"""
+        baseline = {
+            "engines": {"template": {"rss_delta": 100}},
+            "stages": {"template": {"engine": {"max_peak": 1000}}},
+        }
+        measured = {
+            "engines": {"template": {"rss_delta": 105}},
+            "stages": {"template": {"engine": {"max_peak": 1200}}},
+        }
+        found = regressions(measured, baseline, 0.1)
+        self.assertEqual(len(found), 1)
+        self.assertTrue(found[0].startswith("template engine"))
+        self.assertEqual(regressions(measured, baseline, 0.25), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Tests the input of the character classifier"""
+
+import importlib.util
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    find_character_boxes,
+)
+from passport_mrz_reader.deep_learning.model_input import (
+    decode_character,
+    to_model_input,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+
+class TestModelInput(unittest.TestCase):
+    """Tests that the character crops are given to the model the way it was
+    trained on them"""
+
+    @classmethod
+    def setUpClass(cls):
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[0]
+        segmentation = find_character_boxes(
+            load_image(f"{IMAGES_PATH}/{file_name}"), None
+        )
+        cls.crops = segmentation.character_images
+
+    def test_batch(self):
+        """Test the shape and range of the batch, for color and grayscale
+        models"""
+        for channels in (1, 3):
+            with self.subTest(channels=channels):
+                batch = to_model_input(self.crops, 28, 24, channels)
+                self.assertEqual(batch.shape, (88, 28, 24, channels))
+                self.assertEqual(batch.dtype, np.float32)
+                self.assertGreaterEqual(batch.min(), 0)
+                self.assertLessEqual(batch.max(), 255)
+
+    def test_jpeg(self):
+        """Test that the crops go through JPEG like the training files did,
+        which leaves gray pixels at the edges of the binary characters"""
+        crop = self.crops[0]
+        self.assertEqual(set(np.unique(crop)), {0, 255})
+        batch = to_model_input([crop], *crop.shape[:2], 3)
+        _, jpeg = cv2.imencode(".jpeg", np.ascontiguousarray(crop))
+        np.testing.assert_array_equal(batch[0], decode_character(jpeg, 3))
+        self.assertGreater(len(np.unique(batch)), 2)
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("tensorflow") is not None,
+        "needs TensorFlow",
+    )
+    def test_tensorflow(self):
+        """Test that the decoding matches TensorFlow with the same inverse
+        DCT, and the resizing matches tf.image.resize"""
+        import tensorflow as tf
+
+        for crop in self.crops[:10]:
+            _, jpeg = cv2.imencode(".jpeg", np.ascontiguousarray(crop))
+            for channels in (1, 3):
+                decoded = tf.io.decode_jpeg(
+                    jpeg.tobytes(),
+                    channels=channels,
+                    dct_method="INTEGER_ACCURATE",
+                )
+                np.testing.assert_array_equal(
+                    decode_character(jpeg, channels), decoded.numpy()
+                )
+            decoded = decoded.numpy().astype(np.float32)
+            np.testing.assert_allclose(
+                cv2.resize(decoded, (28, 28), interpolation=cv2.INTER_LINEAR),
+                tf.image.resize(decoded, (28, 28)).numpy(),
+                atol=1e-3,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
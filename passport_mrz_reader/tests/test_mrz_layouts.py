@@ -0,0 +1,143 @@
+"""Tests the MRZ layouts and the postprocessing using them"""
+
+import unittest
+
+from passport_mrz_reader.common.mrz_layouts import (
+    TD1,
+    TD2,
+    TD3,
+    check_digit,
+    detect_layout,
+)
+from passport_mrz_reader.common.postprocessing import (
+    fix_line_lengths,
+    replace_based_on_mrz_fields,
+)
+
+# The specimens of ICAO 9303
+TD1_LINES = [
+    "I<UTOD231458907<<<<<<<<<<<<<<<",
+    "7408122F1204159UTO<<<<<<<<<<<6",
+    "ERIKSSON<<ANNA<MARIA<<<<<<<<<<",
+]
+TD2_LINES = [
+    "I<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<",
+    "D231458907UTO7408122F1204159<<<<<<<6",
+]
+TD3_LINES = [
+    "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<",
+    "L898902C36UTO7408122F1204159ZE184226B<<<<<10",
+]
+
+
+class TestMrzLayouts(unittest.TestCase):
+    """Tests the MRZ layouts"""
+
+    def test_check_digit(self):
+        """Test the check digit of a document number"""
+        self.assertEqual(check_digit("L898902C3"), 6)
+
+    def test_detect_layout(self):
+        """Test detecting the layout from the lines"""
+        self.assertIs(detect_layout(TD1_LINES), TD1)
+        self.assertIs(detect_layout(TD2_LINES), TD2)
+        self.assertIs(detect_layout(TD3_LINES), TD3)
+        # A line too few or too many characters is still detected
+        self.assertIs(detect_layout([TD2_LINES[0], TD2_LINES[1][:-2]]), TD2)
+        self.assertIs(detect_layout([TD3_LINES[0], TD3_LINES[1] + "<"]), TD3)
+        self.assertIsNone(detect_layout(TD3_LINES[:1]))
+
+    def test_detect_layout_tie(self):
+        """Test that the number of lines decides before the length, and that
+        a length halfway between TD2 and TD3 is taken as TD3"""
+        self.assertIs(detect_layout([line[:40] for line in TD3_LINES]), TD3)
+        self.assertIs(
+            detect_layout([TD2_LINES[0] + "<<<<", TD2_LINES[1]]), TD3
+        )
+        three_lines = [line + "<" * 10 for line in TD1_LINES]
+        self.assertIs(detect_layout(three_lines), TD1)
+        self.assertIs(detect_layout([TD3_LINES[0], *TD3_LINES]), TD1)
+
+    def test_valid_specimens(self):
+        """Test that the specimens are valid"""
+        self.assertEqual(TD1.validate(TD1_LINES), [])
+        self.assertEqual(TD2.validate(TD2_LINES), [])
+        self.assertEqual(TD3.validate(TD3_LINES), [])
+
+    def test_failed_check_digit(self):
+        """Test a birth date that does not match its check digit"""
+        lines = [TD1_LINES[0], "7408132F1204159UTO<<<<<<<<<<<6", TD1_LINES[2]]
+        self.assertEqual(
+            TD1.validate(lines),
+            [
+                "Check digit of birth date failed",
+                "Check digit of composite failed",
+            ],
+        )
+
+    def test_wrong_format(self):
+        """Test a letter in a date"""
+        lines = [TD2_LINES[0], "D231458907UTO74O8122F1204159<<<<<<<6"]
+        self.assertIn("Wrong format for line 2", TD2.validate(lines))
+
+    def test_wrong_length(self):
+        """Test a line that is too short"""
+        self.assertEqual(
+            TD3.validate([TD3_LINES[0], TD3_LINES[1][:-1]]),
+            ["Line 2 is not 44 characters"],
+        )
+
+
+class TestLayoutPostprocessing(unittest.TestCase):
+    """Tests the postprocessing of the different layouts"""
+
+    def test_td3_fields(self):
+        """Test replacing characters in the fields of a passport"""
+        mrz_text = (
+            "P<UT0ERIKSS0N<<ANNA<MAR1A<<<<<<<<<<<<<<<<<<<\n"
+            "L898902C36UT07408I22F1204159ZE184226B<<<<<1O"
+        )
+        self.assertEqual(
+            replace_based_on_mrz_fields(mrz_text), "\n".join(TD3_LINES)
+        )
+
+    def test_td1_fields(self):
+        """Test replacing characters in the fields of an ID card"""
+        mrz_text = (
+            "I<UT0D231458907<<<<<<<<<<<<<<<\n"
+            "74O8122F12O4I59UT0<<<<<<<<<<<6\n"
+            "ER1KSS0N<<ANNA<MAR1A<<<<<<<<<<"
+        )
+        self.assertEqual(
+            replace_based_on_mrz_fields(mrz_text), "\n".join(TD1_LINES)
+        )
+
+    def test_td2_fields(self):
+        """Test that the document number keeps both letters and digits"""
+        mrz_text = (
+            "I<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<\n"
+            "D231458907UTO7408122F12O4159<<<<<<<6"
+        )
+        self.assertEqual(
+            replace_based_on_mrz_fields(mrz_text), "\n".join(TD2_LINES)
+        )
+
+    def test_fix_line_lengths(self):
+        """Test padding the name line of every layout"""
+        self.assertEqual(
+            fix_line_lengths(
+                "\n".join([*TD1_LINES[:2], "ERIKSSON<<ANNA<MARIA<<<"])
+            ),
+            "\n".join(TD1_LINES),
+        )
+        self.assertEqual(
+            fix_line_lengths(
+                "\n".join(["I<UTOERIKSSON<<ANNA<MARIA<<<", TD2_LINES[1]])
+            ),
+            "\n".join(TD2_LINES),
+        )
+        self.assertIsNone(fix_line_lengths(TD3_LINES[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
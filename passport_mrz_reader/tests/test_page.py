@@ -0,0 +1,111 @@
+"""Tests reading every MRZ of a page with several documents"""
+
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.find_mrz_region import find_mrz_blocks
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.common.process import process_page
+from passport_mrz_reader.common.worker_pool import WorkerPool
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+PREPROCESSORS = PreProcessors(variable_threshold=True)
+POSTPROCESSORS = PostProcessors(
+    character_height=True, mrz_fields=True, line_lengths=True
+)
+
+
+def _page(mrz_images, positions) -> np.ndarray:
+    """A page of noisy paper with the MRZ images at the (x, y) positions,
+    and a paragraph of long lines of other text"""
+    noise = np.random.default_rng(0).normal(0, 4, (3000, 2500, 3))
+    page = np.clip(235 + noise, 0, 255).astype(np.uint8)
+    for image, (x, y) in zip(mrz_images, positions):
+        page[y : y + image.shape[0], x : x + image.shape[1]] = image
+    for line in range(6):
+        cv2.putText(
+            page,
+            "SURNAME DUPUIS GIVEN NAMES JEAN",
+            (150, 200 + line * 90),
+            cv2.FONT_HERSHEY_SIMPLEX,
+            1.6,
+            (40, 40, 40),
+            3,
+        )
+    return page
+
+
+class TestPage(unittest.TestCase):
+    """Tests finding the MRZ blocks of a page and reading every one"""
+
+    @classmethod
+    def setUpClass(cls):
+        labelled = label_pairs(load_labels(LABELS_PATH))
+        images = [
+            load_image(f"{IMAGES_PATH}/{file_name}")
+            for file_name, _ in labelled
+        ]
+        labels = [label for _, label in labelled]
+        cls.positions = [(100, 1200), (1350, 1300), (60, 2700), (1380, 2600)]
+        cls.labels = [labels[0], labels[1], labels[1], labels[0]]
+        cls.page = _page(
+            [images[0], images[1], images[1], images[0]], cls.positions
+        )
+
+    def test_find_blocks(self):
+        """Test that every MRZ is found around its position, and the
+        paragraph is not"""
+        blocks = find_mrz_blocks(self.page)
+        self.assertEqual(len(blocks), 4)
+        found = sorted((block.x, block.y) for block in blocks)
+        for (x, y), (block_x, block_y) in zip(sorted(self.positions), found):
+            self.assertLess(abs(x - block_x), 60)
+            self.assertLess(abs(y - block_y), 60)
+
+    def test_blank_page(self):
+        """Test a page without any text"""
+        self.assertEqual(
+            find_mrz_blocks(np.full((800, 600, 3), 235, np.uint8)), []
+        )
+
+    def test_process_page(self):
+        """Test that every block is read, serially and in workers"""
+        expected = {
+            position: label.splitlines()[1]
+            for position, label in zip(self.positions, self.labels)
+        }
+        serial = process_page(
+            self.page, PREPROCESSORS, Template({}), POSTPROCESSORS
+        )
+        with WorkerPool([Template({})], processes=2) as pool:
+            parallel = pool.process_page(
+                self.page, PREPROCESSORS, Template({}), POSTPROCESSORS
+            )
+        self.assertEqual(
+            [result.text for result in serial],
+            [result.text for result in parallel],
+        )
+        self.assertEqual(
+            [result.roi for result in serial],
+            [result.roi for result in parallel],
+        )
+        for serial_result, parallel_result in zip(serial, parallel):
+            np.testing.assert_allclose(
+                serial_result.boxes, parallel_result.boxes
+            )
+        for result in serial:
+            position = min(
+                expected,
+                key=lambda xy: abs(xy[0] - result.roi.x)
+                + abs(xy[1] - result.roi.y),
+            )
+            self.assertEqual(result.lines[1], expected[position])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+"""Tests the postprocessing based on the heights of the character boxes"""
+
+import unittest
+
+from passport_mrz_reader.common.postprocessing import (
+    replace_based_on_box_heights,
+)
+
+
+def _heights(line: str, tall=(), low=()) -> list[int]:
+    """Heights of 20 for the letters and < and 24 for the digits of a line,
+    with 30 at the tall and 16 at the low indices"""
+    heights = [24 if character.isdigit() else 20 for character in line]
+    for index in tall:
+        heights[index] = 30
+    for index in low:
+        heights[index] = 16
+    return heights
+
+
+class TestBoxHeights(unittest.TestCase):
+    """Tests replacing characters based on the box heights"""
+
+    def test_tall_letter(self):
+        """Test that a letter much taller than the letters is a digit"""
+        line = "ABCDEF<123456O"
+        self.assertEqual(
+            replace_based_on_box_heights(line, _heights(line, tall={13})),
+            "ABCDEF<1234560",
+        )
+
+    def test_low_digit(self):
+        """Test that a digit much lower than the digits is a letter"""
+        line = "AB5DEF<123456"
+        self.assertEqual(
+            replace_based_on_box_heights(line, _heights(line, low={2})),
+            "ABSDEF<123456",
+        )
+
+    def test_second_line(self):
+        """Test that the heights of the second line are aligned with its
+        characters, not counting the line break"""
+        line_1, line_2 = "P<UTOERIKSSON<<ANNA", "L898902C36UTO7408122I"
+        heights = _heights(line_1) + _heights(line_2, tall={20})
+        self.assertEqual(
+            replace_based_on_box_heights(f"{line_1}\n{line_2}", heights),
+            f"{line_1}\nL898902C36UTO74081221",
+        )
+
+    def test_means_per_line(self):
+        """Test that the mean letter height is computed for every line
+        separately"""
+        line_1, line_2 = "ABCDE12", "FGHIJ34"
+        # The letters of the first line are all tall, which would hide the
+        # tall I of the second line if the means were shared
+        heights = [40] * 5 + [24] * 2 + [20] * 3 + [30] + [20] + [24] * 2
+        self.assertEqual(
+            replace_based_on_box_heights(f"{line_1}\n{line_2}", heights),
+            f"{line_1}\nFGH1J34",
+        )
+
+    def test_line_ids(self):
+        """Test that the lines found by the engine are used instead of the
+        lines of the text"""
+        line_1, line_2 = "ABCDE12", "FGHIJ34"
+        heights = [40] * 5 + [24] * 2 + [20] * 3 + [30] + [20] + [24] * 2
+        line_ids = [0] * 7 + [1] * 7
+        # Without the line break, only the line ids separate the lines
+        self.assertEqual(
+            replace_based_on_box_heights(line_1 + line_2, heights, line_ids),
+            "ABCDE12FGH1J34",
+        )
+
+    def test_line_without_digits(self):
+        """Test that a line without digits or letters is left as it is"""
+        line = "ERIKSSON<<ANNA<MARIA"
+        self.assertEqual(
+            replace_based_on_box_heights(line, _heights(line, tall={1})),
+            line,
+        )
+        line = "123456789"
+        self.assertEqual(
+            replace_based_on_box_heights(line, _heights(line, low={0})),
+            line,
+        )
+
+    def test_missing_heights(self):
+        """Test that characters without a box height are left as they are"""
+        line = "ABCDEF<123456O"
+        self.assertEqual(
+            replace_based_on_box_heights(line, _heights(line)[:-1]), line
+        )
+        self.assertEqual(replace_based_on_box_heights(line, []), line)
+
+    def test_other_characters(self):
+        """Test that characters that are not MRZ characters are kept"""
+        line = "AÄBC<12é34O"
+        heights = _heights(line, tall={10})
+        self.assertEqual(
+            replace_based_on_box_heights(line, heights), "AÄBC<12é340"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
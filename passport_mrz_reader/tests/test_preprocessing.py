@@ -0,0 +1,155 @@
+"""Tests the preprocessing of the MRZ images"""
+
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.common.preprocessing import (
+    MIN_SKEW_ANGLE,
+    SAUVOLA_K,
+    SAUVOLA_R,
+    adaptive_threshold,
+    deskew,
+    deskew_matrix,
+    estimate_skew_angle,
+    sauvola_threshold,
+    unrotate_boxes,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+
+def rotated(image, angle: float) -> np.ndarray:
+    """The image on a larger sheet of its paper, rotated counterclockwise by
+    the angle in degrees"""
+    height = image.shape[0]
+    paper = [int(value) for value in np.median(image, axis=(0, 1))]
+    sheet = cv2.copyMakeBorder(
+        image, height, height, 50, 50, cv2.BORDER_CONSTANT, value=paper
+    )
+    sheet_height, sheet_width = sheet.shape[:2]
+    matrix = cv2.getRotationMatrix2D(
+        (sheet_width / 2, sheet_height / 2), angle, 1.0
+    )
+    return cv2.warpAffine(
+        sheet,
+        matrix,
+        (sheet_width, sheet_height),
+        borderMode=cv2.BORDER_REPLICATE,
+    )
+
+
+class TestDeskew(unittest.TestCase):
+    """Tests estimating and correcting the skew of the MRZ"""
+
+    @classmethod
+    def setUpClass(cls):
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[-1]
+        cls.image = load_image(f"{IMAGES_PATH}/{file_name}")
+
+    def test_straight(self):
+        """Test that a straight MRZ is left unchanged"""
+        angle = estimate_skew_angle(self.image)
+        self.assertLess(abs(angle), MIN_SKEW_ANGLE)
+        deskewed, _ = deskew(self.image)
+        self.assertIs(deskewed, self.image)
+
+    def test_rotated(self):
+        """Test that the rotation of a rotated sample is found, and that the
+        deskewed image is straight"""
+        for rotation in (-6, -3, 3, 6):
+            with self.subTest(rotation=rotation):
+                image = rotated(self.image, rotation)
+                self.assertAlmostEqual(
+                    estimate_skew_angle(image), -rotation, delta=0.5
+                )
+                deskewed, angle = deskew(image)
+                self.assertAlmostEqual(angle, -rotation, delta=0.5)
+                self.assertEqual(deskewed.shape, image.shape)
+                self.assertLess(
+                    abs(estimate_skew_angle(deskewed)), MIN_SKEW_ANGLE
+                )
+
+    def test_unrotate_boxes(self):
+        """Test that a box found in the deskewed image is mapped back around
+        the same pixels of the image before deskewing"""
+        image = np.zeros((200, 400), np.uint8)
+        image[80:100, 150:170] = 255
+        self.assertIsNone(deskew_matrix(image.shape, 0.1))
+        matrix = deskew_matrix(image.shape, 5)
+        deskewed = cv2.warpAffine(image, matrix, (400, 200))
+        box = cv2.boundingRect(cv2.findNonZero(deskewed))
+        ((x, y, width, height),) = unrotate_boxes([box], matrix)
+        self.assertLessEqual(x, 150)
+        self.assertLessEqual(y, 80)
+        self.assertGreaterEqual(x + width, 170)
+        self.assertGreaterEqual(y + height, 100)
+        self.assertAlmostEqual(x + width / 2, 160, delta=1)
+        self.assertAlmostEqual(y + height / 2, 90, delta=1)
+        self.assertEqual(
+            unrotate_boxes(np.zeros((0, 4)), matrix).shape, (0, 4)
+        )
+
+    def test_no_lines(self):
+        """Test that an image without text lines has no skew"""
+        blank = np.full((100, 800), 200, dtype=np.uint8)
+        self.assertIsNone(estimate_skew_angle(blank))
+        deskewed, angle = deskew(blank)
+        self.assertIsNone(angle)
+        self.assertIs(deskewed, blank)
+
+
+class TestSauvola(unittest.TestCase):
+    """Tests Sauvola thresholding with integral images"""
+
+    def test_reference(self):
+        """Test that the thresholds match the mean and standard deviation of
+        every window, computed directly, also where the windows are cut off
+        at the edges"""
+        gray = np.random.default_rng(0).integers(0, 256, (20, 25), np.uint8)
+        radius = 3
+        expected = np.zeros_like(gray)
+        for row in range(gray.shape[0]):
+            for column in range(gray.shape[1]):
+                window = gray[
+                    max(row - radius, 0) : row + radius + 1,
+                    max(column - radius, 0) : column + radius + 1,
+                ].astype(float)
+                threshold = window.mean() * (
+                    1 + SAUVOLA_K * (window.std() / SAUVOLA_R - 1)
+                )
+                expected[row, column] = (
+                    255 if gray[row, column] > threshold else 0
+                )
+        np.testing.assert_array_equal(
+            sauvola_threshold(gray, window_size=2 * radius + 1), expected
+        )
+
+    def test_uneven_lighting(self):
+        """Test that dark text is found on both the dark and the light side
+        of a background no global threshold separates it from"""
+        background = np.tile(np.linspace(60, 250, 400), (60, 1))
+        text = np.zeros_like(background, dtype=bool)
+        for left in range(10, 390, 20):
+            text[20:40, left : left + 6] = True
+        gray = np.where(text, background * 0.4, background).astype(np.uint8)
+        self.assertLess(gray[~text].min(), gray[text].max())
+        binary = sauvola_threshold(gray)
+        self.assertTrue(np.all(binary[text] == 0))
+        self.assertGreater(np.mean(binary[~text] == 255), 0.95)
+
+    def test_channels(self):
+        """Test that a color image gives a binary color image"""
+        color = np.full((40, 60, 3), 220, dtype=np.uint8)
+        color[10:30, 20:26] = 30
+        binary = adaptive_threshold(color, "sauvola")
+        self.assertEqual(binary.shape, color.shape)
+        self.assertEqual(set(np.unique(binary)), {0, 255})
+        with self.assertRaises(ValueError):
+            adaptive_threshold(color, "otsu")
+
+
+if __name__ == "__main__":
+    unittest.main()
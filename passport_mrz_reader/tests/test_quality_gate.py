@@ -0,0 +1,103 @@
+"""Tests the quality gate rejecting unreadable images before they are read"""
+
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.common.process import process_result
+from passport_mrz_reader.common.quality_gate import (
+    BLURRY,
+    GLARE,
+    NO_TEXT_BAND,
+    QualityLimits,
+    check_quality,
+    load_limits,
+    save_limits,
+)
+from passport_mrz_reader.utils.image_loading import load_image
+
+IMAGES_PATH = f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ"
+
+
+def _blank_paper():
+    """An image of paper without any text, with a bit of sensor noise"""
+    noise = np.random.default_rng(0).normal(0, 8, (140, 1100, 3))
+    return np.clip(200 + noise, 0, 255).astype(np.uint8)
+
+
+class FailingEngine(Engine):
+    """An engine that fails the test if it is asked to read"""
+
+    def get_mrz_text(self, original_image, preprocessed_image, verbose=False):
+        raise AssertionError("The engine should not be called")
+
+
+class TestQualityGate(unittest.TestCase):
+    """Tests the measures and limits of the quality gate"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.images = [
+            load_image(os.path.join(IMAGES_PATH, file_name))
+            for file_name in sorted(os.listdir(IMAGES_PATH))
+        ]
+
+    def test_readable(self):
+        """Test that the labelled images pass, also when they are dark"""
+        for image in self.images:
+            self.assertIsNone(check_quality(image, QualityLimits()))
+            self.assertIsNone(
+                check_quality((image * 0.15).astype(np.uint8), QualityLimits())
+            )
+
+    def test_blurry(self):
+        """Test that an image out of focus is rejected"""
+        for image in self.images:
+            blurred = cv2.GaussianBlur(image, (0, 0), 8)
+            self.assertEqual(check_quality(blurred, QualityLimits()), BLURRY)
+
+    def test_glare(self):
+        """Test that an image mostly blown out is rejected"""
+        for image in self.images:
+            glare = image.copy()
+            glare[:, : image.shape[1] // 2] = 255
+            self.assertEqual(check_quality(glare, QualityLimits()), GLARE)
+
+    def test_no_text(self):
+        """Test that an image of blank paper is rejected"""
+        self.assertEqual(
+            check_quality(_blank_paper(), QualityLimits()), NO_TEXT_BAND
+        )
+
+    def test_saved_limits(self):
+        """Test that saved limits are loaded"""
+        limits = QualityLimits(min_sharpness=1.3, max_saturated=0.2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "limits.json")
+            self.assertEqual(load_limits(path), QualityLimits())
+            save_limits(limits, path)
+            self.assertEqual(load_limits(path), limits)
+
+    def test_process(self):
+        """Test that a rejected image is never read by the engine"""
+        result = process_result(
+            _blank_paper(),
+            PreProcessors(variable_threshold=True, quality_gate=True),
+            FailingEngine(),
+            PostProcessors(),
+        )
+        self.assertIsNone(result.text)
+        self.assertEqual(result.reasons, [NO_TEXT_BAND])
+        self.assertIn("quality_gate", result.durations)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+"""Tests reading only a region of interest of an image"""
+
+import os
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.find_mrz_region import locate_mrz
+from passport_mrz_reader.common.interfaces import (
+    PostProcessors,
+    PreProcessors,
+    RegionOfInterest,
+)
+from passport_mrz_reader.common.process import process_result
+from passport_mrz_reader.common.result import EMPTY_REGION
+from passport_mrz_reader.utils.image_loading import load_image
+
+IMAGES_PATH = f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ"
+PREPROCESSORS = PreProcessors(variable_threshold=True)
+POSTPROCESSORS = PostProcessors(mrz_fields=True, line_lengths=True)
+# Where the MRZ is put on the page
+X, Y = 150, 700
+
+
+class TestRegionOfInterest(unittest.TestCase):
+    """Tests cropping to a region and mapping the boxes back"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.mrz = load_image(f"{IMAGES_PATH}/25899.jpeg")
+        height, width = cls.mrz.shape[:2]
+        cls.page = np.full((1000, 1400, 3), 235, np.uint8)
+        cls.page[Y : Y + height, X : X + width] = cls.mrz
+        cls.region = RegionOfInterest(X, Y, width, height)
+
+    def test_clamp(self):
+        """Test that a region is cut off at the edges of the image"""
+        shape = (100, 200, 3)
+        self.assertEqual(
+            RegionOfInterest(-10, 50, 100, 100).clamp(shape),
+            RegionOfInterest(0, 50, 90, 50),
+        )
+        self.assertEqual(
+            RegionOfInterest(300, 300, 10, 10).clamp(shape),
+            RegionOfInterest(300, 300, 0, 0),
+        )
+
+    def test_crop(self):
+        """Test that the crop is a view of the region"""
+        crop = self.region.crop(self.page)
+        self.assertTrue(np.shares_memory(crop, self.page))
+        np.testing.assert_array_equal(crop, self.mrz)
+
+    def test_locate_mrz(self):
+        """Test that the MRZ is found around where it was put"""
+        region = locate_mrz(self.page)
+        self.assertIsNotNone(region)
+        self.assertLess(abs(region.x - X), 40)
+        self.assertLess(abs(region.y - Y), 40)
+        self.assertLess(abs(region.width - self.region.width), 80)
+
+    def test_outside(self):
+        """Test that a region outside the image is a failure, not an
+        error"""
+        result = process_result(
+            self.mrz,
+            PREPROCESSORS,
+            Template({}),
+            POSTPROCESSORS,
+            roi=RegionOfInterest(5000, 5000, 100, 100),
+        )
+        self.assertIsNone(result.text)
+        self.assertEqual(result.failure, EMPTY_REGION)
+
+    def test_boxes(self):
+        """Test that the boxes of a region are in pixels of the page"""
+        alone = process_result(
+            self.mrz, PREPROCESSORS, Template({}), POSTPROCESSORS
+        )
+        in_page = process_result(
+            self.page,
+            PREPROCESSORS,
+            Template({}),
+            POSTPROCESSORS,
+            roi=self.region,
+        )
+        self.assertEqual(in_page.text, alone.text)
+        self.assertEqual(len(in_page.boxes), 88)
+        np.testing.assert_allclose(in_page.boxes, alone.boxes + (X, Y, 0, 0))
+        # The boxes are in pixels of the image, not of the resized region
+        self.assertLess(in_page.boxes[:, 0].max(), X + self.mrz.shape[1])
+
+    def test_deskewed_boxes(self):
+        """Test that the boxes of a deskewed region are rotated back onto the
+        characters of the skewed page"""
+        height, width = self.page.shape[:2]
+        centre = (X + self.mrz.shape[1] / 2, Y + self.mrz.shape[0] / 2)
+        matrix = cv2.getRotationMatrix2D(centre, 4, 1.0)
+        skewed = cv2.warpAffine(
+            self.page, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE
+        )
+        region = RegionOfInterest(
+            X - 30, Y - 60, self.mrz.shape[1] + 60, self.mrz.shape[0] + 120
+        )
+        straight = process_result(
+            self.page, PREPROCESSORS, Template({}), POSTPROCESSORS, roi=region
+        )
+        deskewed = process_result(
+            skewed,
+            PreProcessors(variable_threshold=True, deskew=True),
+            Template({}),
+            POSTPROCESSORS,
+            roi=region,
+        )
+        self.assertIn("deskew", deskewed.durations)
+        self.assertEqual(len(deskewed.boxes), 88)
+        centres = deskewed.boxes[:, :2] + deskewed.boxes[:, 2:] / 2
+        # Both lines follow the skew of the page
+        for line in (centres[:44], centres[44:]):
+            slope = np.polyfit(line[:, 0], line[:, 1], 1)[0]
+            self.assertAlmostEqual(
+                slope, matrix[1, 0] / matrix[0, 0], delta=0.01
+            )
+        # Undoing the skew of the page puts them on the straight characters
+        inverse = cv2.invertAffineTransform(matrix)
+        unskewed = centres @ inverse[:, :2].T + inverse[:, 2]
+        expected = straight.boxes[:, :2] + straight.boxes[:, 2:] / 2
+        np.testing.assert_allclose(
+            np.sort(unskewed, axis=0), np.sort(expected, axis=0), atol=3
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+"""Tests the result of processing an image and the fields parsed from it"""
+
+import datetime
+import pickle
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.common.interfaces import (
+    Engine,
+    PostProcessorMetadata,
+    PostProcessors,
+    PreProcessors,
+)
+from passport_mrz_reader.common.process import process, process_result
+from passport_mrz_reader.common.result import (
+    NO_TEXT,
+    REJECTED,
+    UNKNOWN_LAYOUT,
+    MrzResult,
+)
+
+TD1_TEXT = (
+    "I<UTOD231458907<<<<<<<<<<<<<<<\n"
+    "7408122F1204159UTO<<<<<<<<<<<6\n"
+    "ERIKSSON<<ANNA<MARIA<<<<<<<<<<"
+)
+TD3_TEXT = (
+    "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<\n"
+    "L898902C36UTO7408122F1204159ZE184226B<<<<<10"
+)
+IMAGE = np.full((60, 400, 3), 255, dtype=np.uint8)
+
+
+class FixedEngine(Engine):
+    """An engine reading the same text with the same metadata from every
+    image"""
+
+    def __init__(self, text, metadata=None):
+        self.text = text
+        self.metadata = metadata
+
+    def get_mrz_text(self, original_image, preprocessed_image, verbose=False):
+        if self.metadata is None:
+            return None
+        return self.text, self.metadata
+
+
+class TestMrzResult(unittest.TestCase):
+    """Tests the fields and validity of a result"""
+
+    def test_td3_fields(self):
+        """Test the fields of a passport"""
+        result = MrzResult(TD3_TEXT)
+        self.assertTrue(result.valid)
+        self.assertEqual(result.layout.name, "TD3")
+        self.assertEqual(result.document_number, "L898902C3")
+        self.assertEqual(result.nationality, "UTO")
+        self.assertEqual(result.surname, "ERIKSSON")
+        self.assertEqual(result.given_names, "ANNA MARIA")
+        self.assertEqual(result.birth_date, datetime.date(1974, 8, 12))
+        self.assertEqual(result.expiry_date, datetime.date(2012, 4, 15))
+
+    def test_td1_fields(self):
+        """Test the fields of an ID card, with the name on the third line"""
+        result = MrzResult(TD1_TEXT)
+        self.assertTrue(result.valid)
+        self.assertEqual(result.document_number, "D23145890")
+        self.assertEqual(result.surname, "ERIKSSON")
+
+    def test_invalid(self):
+        """Test the reasons of a text without a layout, a failed check
+        digit and a failed read"""
+        self.assertEqual(MrzResult("P<UTO<<<<<<<<").reasons, [UNKNOWN_LAYOUT])
+        self.assertEqual(MrzResult("P<UTO<<<<<<<<").fields, {})
+        result = MrzResult(TD3_TEXT.replace("7408122", "7408132"))
+        self.assertFalse(result.valid)
+        self.assertIn("Check digit of birth date failed", result.reasons)
+        self.assertEqual(MrzResult(None).reasons, [NO_TEXT])
+        self.assertIsNone(MrzResult(None).document_number)
+
+    def test_date_not_a_date(self):
+        """Test that a misread date is not parsed"""
+        result = MrzResult(TD3_TEXT.replace("7408122", "74O8122"))
+        self.assertIsNone(result.birth_date)
+
+    def test_pickle(self):
+        """Test that a result can be sent between processes"""
+        result = MrzResult(TD3_TEXT, threshold=8, attempts=2)
+        self.assertEqual(result.document_number, "L898902C3")
+        copy = pickle.loads(pickle.dumps(result))
+        self.assertEqual(copy.document_number, "L898902C3")
+        self.assertEqual((copy.threshold, copy.attempts), (8, 2))
+
+    def test_slots(self):
+        """Test that a result has no dictionary of attributes"""
+        with self.assertRaises(AttributeError):
+            MrzResult(TD3_TEXT).other = 1
+
+
+class TestProcessResult(unittest.TestCase):
+    """Tests processing an image into a result"""
+
+    def test_metadata(self):
+        """Test that the threshold, attempts and confidences of the engine
+        are kept, and the stages are timed"""
+        engine = FixedEngine(
+            TD3_TEXT,
+            PostProcessorMetadata(
+                threshold=12, attempts=3, confidences=[0.5] * 88
+            ),
+        )
+        result = process_result(
+            IMAGE,
+            PreProcessors(variable_threshold=True),
+            engine,
+            PostProcessors(mrz_fields=True),
+        )
+        self.assertEqual(result.text, TD3_TEXT)
+        self.assertTrue(result.valid)
+        self.assertEqual((result.threshold, result.attempts), (12, 3))
+        self.assertEqual(result.min_confidence, 0.5)
+        self.assertEqual(
+            set(result.durations), {"engine", "postprocess", "total"}
+        )
+        self.assertEqual(
+            process(
+                IMAGE,
+                PreProcessors(variable_threshold=True),
+                engine,
+                PostProcessors(mrz_fields=True),
+            ),
+            TD3_TEXT,
+        )
+
+    def test_fixed_threshold(self):
+        """Test that the threshold of the preprocessors is reported when the
+        engine does not try several"""
+        result = process_result(
+            IMAGE,
+            PreProcessors(grayscale=True, threshold=10),
+            FixedEngine(TD3_TEXT, PostProcessorMetadata()),
+            PostProcessors(),
+        )
+        self.assertEqual(result.threshold, 10)
+        self.assertIn("preprocess", result.durations)
+
+    def test_failures(self):
+        """Test the failure of an engine without text, and of a text the
+        postprocessing rejects"""
+        preprocessors = PreProcessors(variable_threshold=True)
+        result = process_result(
+            IMAGE, preprocessors, FixedEngine(None), PostProcessors()
+        )
+        self.assertIsNone(result.text)
+        self.assertEqual(result.reasons, [NO_TEXT])
+        result = process_result(
+            IMAGE,
+            preprocessors,
+            FixedEngine("P<UTO", PostProcessorMetadata()),
+            PostProcessors(line_lengths=True),
+        )
+        self.assertIsNone(result.text)
+        self.assertEqual(result.reasons, [REJECTED])
+
+
+if __name__ == "__main__":
+    unittest.main()
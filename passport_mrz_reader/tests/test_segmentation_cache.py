@@ -0,0 +1,93 @@
+"""Tests the cache of the character segmentations"""
+
+import os
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.custom_character_separator.custom_character_separator import (
+    SEGMENTATION_CACHE,
+    Segmentation,
+    SegmentationCache,
+    image_key,
+    segment,
+    segmentation_image,
+)
+from passport_mrz_reader.utils.image_loading import load_image
+
+IMAGES_PATH = f"{os.path.dirname(__file__)}/../../data/images/PRADO MRZ"
+
+
+class TestSegmentationCache(unittest.TestCase):
+    """Tests that segmentations are reused for the same pixels only"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.image = load_image(f"{IMAGES_PATH}/25899.jpeg")
+
+    def setUp(self):
+        SEGMENTATION_CACHE.clear()
+
+    def test_hit(self):
+        """Test that a copy of the image reuses its segmentation"""
+        segmentation = segment(self.image, 10)
+        self.assertIs(segment(self.image.copy(), 10), segmentation)
+        self.assertIsNot(segment(self.image, 20), segmentation)
+        self.assertEqual(len(segmentation.boxes), 88)
+        self.assertFalse(segmentation.character_images[0].flags.writeable)
+        # The crops are copies, not views keeping the binary image alive
+        self.assertIsNone(segmentation.character_images[0].base)
+
+    def test_segmentation_image(self):
+        """Test that the key is the hash of the small grayscale image, so an
+        image and its segmentation image share their segmentations"""
+        gray = segmentation_image(self.image)
+        self.assertEqual(gray.shape[1], 1200)
+        self.assertEqual(gray.ndim, 2)
+        self.assertIs(segmentation_image(gray), gray)
+        segmentation = segment(self.image, 10)
+        self.assertIs(segment(gray, 10), segmentation)
+
+    def test_mutation(self):
+        """Test that an image changed in place is segmented again"""
+        image = self.image.copy()
+        segmentation = segment(image, 10)
+        image[:, : image.shape[1] // 2] = 255
+        changed = segment(image, 10)
+        self.assertIsNot(changed, segmentation)
+        self.assertLess(len(changed.boxes), len(segmentation.boxes))
+
+    def test_view(self):
+        """Test that a view has the same key as a copy of it"""
+        view = self.image[10:-10, 20:-20]
+        self.assertFalse(view.flags.c_contiguous)
+        self.assertEqual(image_key(view), image_key(view.copy()))
+        self.assertNotEqual(image_key(view), image_key(self.image))
+
+    def test_eviction(self):
+        """Test that the least recently used segmentation is evicted"""
+        cache = SegmentationCache(2)
+        keys = [
+            image_key(np.full((4, 4), value, np.uint8)) for value in range(3)
+        ]
+        segmentations = [
+            Segmentation(np.zeros((0, 4), int), [], 10) for _ in range(3)
+        ]
+        cache.put(keys[0], 10, segmentations[0])
+        cache.put(keys[1], 10, segmentations[1])
+        # Using the first one makes the second one the least recently used
+        self.assertIs(cache.get(keys[0], 10), segmentations[0])
+        cache.put(keys[2], 10, segmentations[2])
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(keys[1], 10))
+        self.assertIsNotNone(cache.get(keys[0], 10))
+        self.assertIsNone(cache.get(keys[0], 20))
+
+    def test_binary_not_cached(self):
+        """Test that an already binary image is not cached"""
+        segment(np.full((300, 1200), 255, np.uint8), None)
+        self.assertEqual(len(SEGMENTATION_CACHE), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Tests packing images into shards and reading them back"""
+
+import os
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.image_loading import load_image
+from passport_mrz_reader.utils.shards import (
+    ShardReader,
+    ShardWriter,
+    character_items,
+    decode_characters,
+    labelled_items,
+    open_shard,
+    read_image,
+    read_index,
+    shard_paths,
+    write_files,
+)
+
+
+class TestShards(unittest.TestCase):
+    """Tests the round trip of images through shards"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(open_shard.cache_clear)
+        self.directory = directory.name
+
+    def test_labelled(self):
+        """Test that every image is read back as it was written, from
+        several shards, with its key and label"""
+        items = list(labelled_items(LABELS_PATH, IMAGES_PATH))
+        output = os.path.join(self.directory, "shards")
+        # Every image starts a new shard
+        self.assertEqual(write_files(items * 2, output, shard_size=1), 4)
+        self.assertEqual(len(shard_paths(output)), 4)
+        index = read_index(output)
+        self.assertEqual(
+            [(key, label) for key, label, _ in index],
+            [(key, label) for key, label, _ in items * 2],
+        )
+        for (_, _, location), (_, _, path) in zip(index, items * 2):
+            with open(path, "rb") as file:
+                data = file.read()
+            shard = ShardReader(location[0])
+            self.assertEqual(bytes(shard.encoded(location[1])), data)
+            np.testing.assert_array_equal(
+                read_image(location), load_image(path)
+            )
+            np.testing.assert_array_equal(
+                read_image(location, None), load_image(path, None)
+            )
+
+    def test_writer(self):
+        """Test that keys and labels are not truncated, and that a shard is
+        only split once it is full"""
+        output = os.path.join(self.directory, "shards")
+        key, label = "k" * 100, "<" * 200
+        with ShardWriter(output, shard_size=10) as writer:
+            writer.write(key, label, b"12345")
+            writer.write("second", "label", b"67890")
+            writer.write("third", "label", b"")
+        paths = shard_paths(output)
+        self.assertEqual(len(paths), 2)
+        first, second = ShardReader(paths[0]), ShardReader(paths[1])
+        self.assertEqual(len(first), 2)
+        self.assertEqual(str(first.index["key"][0]), key)
+        self.assertEqual(str(first.index["label"][0]), label)
+        self.assertEqual(bytes(first.encoded(1)), b"67890")
+        self.assertEqual(len(second), 1)
+        self.assertEqual(bytes(second.encoded(0)), b"")
+
+    def test_characters(self):
+        """Test that character images are decoded with their class"""
+        data_dir = os.path.join(self.directory, "characters")
+        images = {}
+        for class_name, value in (("A", 0), ("B", 128)):
+            os.makedirs(os.path.join(data_dir, class_name))
+            image = np.full((20, 14), value, dtype=np.uint8)
+            cv2.imwrite(os.path.join(data_dir, class_name, "0.png"), image)
+            images[class_name] = image
+        output = os.path.join(self.directory, "shards")
+        self.assertEqual(write_files(character_items(data_dir), output), 2)
+        decoded = list(decode_characters(output, grayscale=True))
+        self.assertEqual([label for label, _ in decoded], ["A", "B"])
+        for label, image in decoded:
+            np.testing.assert_array_equal(image, images[label])
+
+
+if __name__ == "__main__":
+    unittest.main()
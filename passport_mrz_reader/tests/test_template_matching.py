@@ -0,0 +1,76 @@
+"""Tests the template matching engine"""
+
+import os
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.common.engines import Template
+from passport_mrz_reader.common.mrz_common import MRZ_CHARACTERS
+from passport_mrz_reader.template_matching.build_templates import (
+    read_characters,
+)
+from passport_mrz_reader.template_matching.template_predict import (
+    load_templates,
+    normalise_glyphs,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+TEST_PATH = (
+    f"{os.path.dirname(__file__)}/../../data/images/test/variable_treshold"
+)
+
+
+class TestTemplateMatching(unittest.TestCase):
+    """Tests the templates and the engine using them"""
+
+    def test_test_characters(self):
+        """Test classifying the characters held out from the templates"""
+        images, characters = read_characters(TEST_PATH)
+        predicted, correlations = load_templates().classify(images)
+        correct = np.mean([a == b for a, b in zip(predicted, characters)])
+        self.assertGreaterEqual(correct, 0.9)
+        self.assertTrue(np.all(correlations <= 1))
+
+    def test_contrast(self):
+        """Test that the glyphs do not depend on the contrast"""
+        images, _ = read_characters(TEST_PATH)
+        dim = [(image * 0.5 + 60).astype(np.uint8) for image in images]
+        np.testing.assert_allclose(
+            normalise_glyphs(images), normalise_glyphs(dim), atol=0.02
+        )
+
+    def test_templates(self):
+        """Test that there is a template of every character"""
+        classifier = load_templates()
+        self.assertEqual(sorted(classifier.classes), sorted(MRZ_CHARACTERS))
+        np.testing.assert_allclose(
+            np.linalg.norm(classifier.templates, axis=1), 1, rtol=1e-5
+        )
+
+    def test_engine(self):
+        """Test that the engine reads almost every character of the labelled
+        images, and reports its confidence in every one"""
+        engine = Template({})
+        for file_name, label in label_pairs(load_labels(LABELS_PATH)):
+            image = load_image(f"{IMAGES_PATH}/{file_name}")
+            mrz_text, metadata = engine.get_mrz_text(image, None)
+            correct = sum(a == b for a, b in zip(mrz_text, label))
+            self.assertGreaterEqual(correct, 86)
+            self.assertEqual(len(metadata.confidences), 88)
+            self.assertEqual(metadata.attempts, 1)
+
+    def test_no_characters(self):
+        """Test an image without characters"""
+        blank = np.full((100, 800, 3), 255, dtype=np.uint8)
+        mrz_text, metadata = Template({}).get_mrz_text(
+            blank, blank[..., 0].copy()
+        )
+        self.assertIsNone(mrz_text)
+        self.assertEqual(metadata.attempts, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
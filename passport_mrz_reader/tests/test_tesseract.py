@@ -0,0 +1,63 @@
+"""Tests reading the characters of Tesseract's hOCR"""
+
+import unittest
+
+import numpy as np
+
+from passport_mrz_reader.pure_tesseract.hocr import (
+    misplaced_boxes,
+    parse_hocr_symbols,
+)
+
+HOCR = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <body>
+  <div class='ocr_page' id='page_1' title='bbox 0 0 1200 200'>
+   <p class='ocr_par' id='par_1_1' title="bbox 10 10 300 90">
+    <span class='ocr_line' id='line_1_1' title="bbox 10 10 300 40">
+     <span class='ocrx_word' id='word_1_1' title='bbox 10 10 300 40; x_wconf 90'>
+      <span class='ocrx_cinfo' title='x_bboxes 10 10 30 40; x_conf 99.5'>P</span>
+      <span class='ocrx_cinfo' title='x_bboxes 32 10 52 40; x_conf 80'>&lt;</span>
+      <span class='ocrx_cinfo' title='x_bboxes 40 5 50 45; x_conf 20'>1</span>
+      <span class='ocrx_cinfo' title='x_bboxes 54 10 74 40; x_conf 97'>U</span>
+     </span>
+    </span>
+    <span class='ocr_line' id='line_1_2' title="bbox 10 60 300 90">
+     <span class='ocrx_word' id='word_1_2' title='bbox 10 60 300 90; x_wconf 95'>
+      <span class='ocrx_cinfo' title='x_bboxes 10 60 30 90; x_conf 95'>L</span>
+      <span class='ocrx_cinfo' title='x_bboxes 32 60 52 90; x_conf 90'>8</span>
+     </span>
+    </span>
+   </p>
+  </div>
+ </body>
+</html>
+"""
+
+
+class TestTesseract(unittest.TestCase):
+    """Tests the characters, boxes, confidences and lines of hOCR"""
+
+    def test_parse_hocr(self):
+        """Test that every character gets its box, confidence and line"""
+        symbols = parse_hocr_symbols(HOCR)
+        self.assertEqual(symbols.characters, "P<1UL8")
+        np.testing.assert_array_equal(symbols.line_ids, [0, 0, 0, 0, 1, 1])
+        np.testing.assert_allclose(
+            symbols.confidences, [0.995, 0.8, 0.2, 0.97, 0.95, 0.9]
+        )
+        np.testing.assert_array_equal(symbols.boxes[2], [40, 5, 50, 45])
+
+    def test_misplaced_boxes(self):
+        """Test that a high box overlapping its neighbours is dropped, and
+        that the boxes at the ends of the lines are kept"""
+        np.testing.assert_array_equal(
+            misplaced_boxes(parse_hocr_symbols(HOCR)),
+            [False, False, True, False, False, False],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
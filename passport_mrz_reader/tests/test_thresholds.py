@@ -0,0 +1,86 @@
+"""Tests predicting and ordering the percentile thresholds"""
+
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from passport_mrz_reader.common import thresholds
+from passport_mrz_reader.common.thresholds import (
+    FEATURES,
+    THRESHOLD_LADDER,
+    image_statistics,
+    load_calibration,
+    order_ladder,
+    predict_threshold,
+    save_calibration,
+    threshold_ladder,
+)
+from passport_mrz_reader.test_suite.calibrate_thresholds import (
+    attempts,
+    first_success,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+
+class TestThresholds(unittest.TestCase):
+    """Tests the threshold predictor and the ladder ordering"""
+
+    def test_order_ladder(self):
+        """Test that the ladder is ordered by the distance to the prediction,
+        keeping the fixed order between equally close thresholds"""
+        self.assertEqual(order_ladder(None), THRESHOLD_LADDER)
+        self.assertEqual(order_ladder(10), THRESHOLD_LADDER)
+        self.assertEqual(order_ladder(7), [8, 6, 10, 12, 14])
+        self.assertEqual(order_ladder(30), [14, 12, 10, 8, 6])
+
+    def test_predict(self):
+        """Test that a calibration predicts from the statistics of the image,
+        and that the ladder starts closest to it"""
+        file_name, _ = label_pairs(load_labels(LABELS_PATH))[0]
+        image = load_image(f"{IMAGES_PATH}/{file_name}")
+        weights = np.array([12.0, -0.1, 2.0, -3.0])
+        with mock.patch(f"{thresholds.__name__}.load_calibration") as load:
+            load.return_value = weights
+            predicted = predict_threshold(image)
+            self.assertAlmostEqual(
+                predicted, image_statistics(image) @ weights
+            )
+            self.assertEqual(threshold_ladder(image), order_ladder(predicted))
+            load.return_value = None
+            self.assertIsNone(predict_threshold(image))
+            self.assertEqual(threshold_ladder(image), THRESHOLD_LADDER)
+
+    def test_calibration_file(self):
+        """Test saving and loading weights, and that a calibration of other
+        features is rejected"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "calibration.json")
+            self.assertIsNone(load_calibration(path))
+            save_calibration(np.array([1.0, 2.0, 3.0, 4.0]), path)
+            self.assertEqual(list(load_calibration(path)), [1, 2, 3, 4])
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({"features": FEATURES[:2], "weights": [1, 2]}, file)
+            load_calibration.cache_clear()
+            with self.assertRaises(ValueError):
+                load_calibration(path)
+        load_calibration.cache_clear()
+
+    def test_targets(self):
+        """Test that the target is the first threshold of the ladder that
+        succeeded, which the predicted ordering then tries first"""
+        successes = [False, True, False, True, False]
+        self.assertEqual(first_success(successes), 8)
+        self.assertEqual(attempts(successes, THRESHOLD_LADDER), 2)
+        self.assertEqual(attempts(successes, order_ladder(8)), 1)
+        self.assertTrue(np.isnan(first_success([False] * 5)))
+        self.assertEqual(attempts([False] * 5, THRESHOLD_LADDER), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
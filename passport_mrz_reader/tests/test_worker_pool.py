@@ -0,0 +1,141 @@
+"""Tests the pool of worker processes"""
+
+import importlib.util
+import multiprocessing
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import cv2
+
+from passport_mrz_reader.common.engines import DeepLearning, Template
+from passport_mrz_reader.common.interfaces import PostProcessors, PreProcessors
+from passport_mrz_reader.common.process import process
+from passport_mrz_reader.common.worker_pool import (
+    THREAD_ENVIRONMENT_VARIABLES,
+    WorkerPool,
+)
+from passport_mrz_reader.test_suite.test import IMAGES_PATH, LABELS_PATH
+from passport_mrz_reader.utils.dataset import label_pairs, load_labels
+from passport_mrz_reader.utils.image_loading import load_image
+
+PREPROCESSORS = PreProcessors(variable_threshold=True)
+POSTPROCESSORS = PostProcessors(mrz_fields=True, line_lengths=True)
+
+
+def _thread_settings(_=None) -> tuple:
+    """The thread environment variables and OpenCV threads of a process"""
+    return (
+        tuple(os.environ.get(name) for name in THREAD_ENVIRONMENT_VARIABLES),
+        cv2.getNumThreads(),
+    )
+
+
+def _tensorflow_threads(_=None) -> tuple[int, int]:
+    """The intra- and inter-op threads of TensorFlow in a process"""
+    # pylint: disable=import-outside-toplevel
+    import tensorflow as tf
+
+    return (
+        tf.config.threading.get_intra_op_parallelism_threads(),
+        tf.config.threading.get_inter_op_parallelism_threads(),
+    )
+
+
+def _save_model(path: str):
+    """Save a small Keras model with weights"""
+    # pylint: disable=import-outside-toplevel
+    import tensorflow as tf
+
+    tf.keras.Sequential(
+        [
+            tf.keras.Input((28, 28, 1)),
+            tf.keras.layers.Flatten(),
+            tf.keras.layers.Dense(37),
+        ]
+    ).save(path)
+
+
+def _forked_tensorflow_threads(model_path: str) -> tuple[int, int]:
+    """The TensorFlow threads of a forked worker of a pool with the model"""
+    with WorkerPool(
+        [DeepLearning({"model_path": model_path})],
+        processes=1,
+        threads_per_worker=2,
+        start_method="fork",
+    ) as pool:
+        return next(pool.imap_unordered(_tensorflow_threads, [None]))
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Tests starting the workers and limiting their threads"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.images = [
+            load_image(f"{IMAGES_PATH}/{file_name}")
+            for file_name, _ in label_pairs(load_labels(LABELS_PATH))
+        ]
+
+    def test_parent_threads(self):
+        """Test that only the workers are limited, not the process creating
+        the pool"""
+        with mock.patch.dict(os.environ):
+            before = _thread_settings()
+            with WorkerPool(
+                [Template({})], processes=1, threads_per_worker=2
+            ) as pool:
+                settings, threads = next(
+                    pool.imap_unordered(_thread_settings, [None])
+                )
+            self.assertEqual(_thread_settings(), before)
+        self.assertEqual(set(settings), {"2"})
+        self.assertEqual(threads, 2)
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("tensorflow") is not None, "needs TensorFlow"
+    )
+    def test_forked_tensorflow(self):
+        """Test that the Keras model loaded in the parent before forking
+        leaves the workers with TensorFlow limited to their threads"""
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, "model.keras")
+            spawn = multiprocessing.get_context("spawn")
+            # Saved in another process, so TensorFlow is first initialised
+            # when the pool loads the model
+            with spawn.Pool(1) as saver:
+                saver.apply(_save_model, (model_path,))
+            # The pool is made in a new process too, as other tests may have
+            # initialised TensorFlow in this one
+            with ProcessPoolExecutor(1, mp_context=spawn) as executor:
+                threads = executor.submit(
+                    _forked_tensorflow_threads, model_path
+                ).result()
+        self.assertEqual(threads, (2, 2))
+
+    def test_start_methods(self):
+        """Test that spawned and forked workers read what this process
+        reads"""
+        serial = [
+            process(image, PREPROCESSORS, Template({}), POSTPROCESSORS)
+            for image in self.images
+        ]
+        for start_method in ("spawn", "fork"):
+            with self.subTest(start_method=start_method), WorkerPool(
+                [Template({})], processes=2, start_method=start_method
+            ) as pool:
+                self.assertEqual(
+                    pool.map(
+                        self.images,
+                        PREPROCESSORS,
+                        Template({}),
+                        POSTPROCESSORS,
+                    ),
+                    serial,
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+"""Columnar storage of labelled datasets and evaluation results.
+
+Labels and results are kept in NumPy structured arrays, one fixed width column
+per field, and saved as .npy files that are memory-mapped when loaded. Large
+corpora can then be loaded, filtered and compared across runs without parsing
+CSV or JSON again, and images are only read when they are accessed.
+
+The string columns are widened to the longest value of an array, so no value
+is truncated. Every saved array has a version file next to it, and arrays
+saved with an older version of their fields are rebuilt from their source.
+"""
+
+import csv
+import json
+import os
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from numpy.lib import recfunctions
+
+from passport_mrz_reader.utils.image_loading import load_image
+
+# The least width of the string columns, which are widened to fit the
+# longest value
+LABEL_DTYPE = np.dtype(
+    [("file_name", "U64"), ("line_1", "U44"), ("line_2", "U44")]
+)
+RESULT_DTYPE = np.dtype(
+    [
+        ("ident", "U64"),
+        ("valid", "?"),
+        ("correct", "?"),
+        ("read_text", "U128"),
+        ("labeled_text", "U96"),
+        # The reasons for invalidity, separated by REASON_SEPARATOR
+        ("reasons", "U256"),
+        # The seconds spent recognising and decoding the image
+        ("seconds", "f8"),
+        ("decode_seconds", "f8"),
+    ]
+)
+REASON_SEPARATOR = "; "
+# Increased whenever the fields of the dtype change, so arrays saved with
+# other fields are rebuilt instead of read. Version 2 added decode_seconds.
+LABEL_VERSION = 1
+RESULT_VERSION = 2
+VERSION_SUFFIX = ".version"
+
+
+def sized_dtype(dtype: np.dtype, rows: list[tuple]) -> np.dtype:
+    """The structured dtype with every string field widened to the longest
+    value of that field in the rows, so that no value is truncated"""
+    fields = []
+    for index, name in enumerate(dtype.names):
+        field = dtype[name]
+        if field.kind == "U":
+            longest = max((len(row[index]) for row in rows), default=0)
+            field = np.dtype(f"U{max(longest, field.itemsize // 4)}")
+        fields.append((name, field))
+    return np.dtype(fields)
+
+
+def labels_from_csv(path: str) -> np.ndarray:
+    """Load labels from a CSV file with the columns Filnavn, Linje 1 and
+    Linje 2 into an array of LABEL_DTYPE"""
+    with open(path, encoding="utf-8") as file:
+        rows = [
+            (row["Filnavn"], row["Linje 1"], row["Linje 2"])
+            for row in csv.DictReader(file)
+        ]
+    return np.array(rows, dtype=sized_dtype(LABEL_DTYPE, rows))
+
+
+def save_array(array: np.ndarray, path: str, version: int):
+    """Save a structured array as a .npy file, and the version of its fields
+    next to it"""
+    np.save(path, array, allow_pickle=False)
+    with open(path + VERSION_SUFFIX, "w", encoding="ascii") as file:
+        file.write(str(version))
+
+
+def saved_version(path: str) -> Optional[int]:
+    """The version of the fields of a saved array, or None if it has none"""
+    try:
+        with open(path + VERSION_SUFFIX, encoding="ascii") as file:
+            return int(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def load_array(path: str) -> np.ndarray:
+    """Load a structured array from a .npy file, memory-mapped read-only"""
+    return np.load(path, mmap_mode="r", allow_pickle=False)
+
+
+def load_labels(csv_path: str, cache_path: Optional[str] = None) -> np.ndarray:
+    """Load the labels of a CSV file. With a cache path, they are loaded
+    through a .npy cache there, which is made on the first load and remade
+    when the CSV file is newer than it or it was saved with another
+    LABEL_VERSION. Without one, nothing is written, so the labels can be
+    loaded from read-only folders.
+
+    Args:
+        csv_path: The CSV file with the labels
+        cache_path: The .npy file to cache the labels in, or None to parse
+            the CSV file every time
+    """
+    if cache_path is None:
+        return labels_from_csv(csv_path)
+    if (
+        not os.path.exists(cache_path)
+        or os.path.getmtime(cache_path) < os.path.getmtime(csv_path)
+        or saved_version(cache_path) != LABEL_VERSION
+    ):
+        save_array(labels_from_csv(csv_path), cache_path, LABEL_VERSION)
+    return load_array(cache_path)
+
+
+def labeled_text(labels: np.ndarray) -> np.ndarray:
+    """The labelled MRZ text of every label, with the lines joined by a
+    newline"""
+    return np.char.add(np.char.add(labels["line_1"], "\n"), labels["line_2"])
+
+
+def label_pairs(labels: np.ndarray) -> list[tuple[str, str]]:
+    """The file name and the labelled MRZ text of every label"""
+    return [
+        (str(file_name), str(text))
+        for file_name, text in zip(labels["file_name"], labeled_text(labels))
+    ]
+
+
+class LazyImages:
+    """The images of a labelled dataset, read from disk only when accessed"""
+
+    def __init__(self, labels: np.ndarray, images_path: str):
+        self.labels = labels
+        self.images_path = images_path
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def path(self, index: int) -> str:
+        """The path of the image at the index"""
+        return os.path.join(self.images_path, self.labels["file_name"][index])
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return load_image(self.path(index))
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return (self[index] for index in range(len(self)))
+
+
+def results_from_records(records: Iterable[dict]) -> np.ndarray:
+    """Convert result records, as written by test_suite/evaluate.py, into an
+    array of RESULT_DTYPE"""
+    rows = [
+        (
+            record["ident"],
+            record["valid"],
+            record["correct"],
+            record["read_text"] or "",
+            record["labeled_text"],
+            REASON_SEPARATOR.join(record["reasons"] or []),
+            record["seconds"],
+            record.get("decode_seconds", 0.0),
+        )
+        for record in records
+    ]
+    return np.array(rows, dtype=sized_dtype(RESULT_DTYPE, rows))
+
+
+def load_results(path: str) -> np.ndarray:
+    """Load evaluation results from a .npy file or a JSON lines file. A .npy
+    file saved with another RESULT_VERSION is rebuilt from the JSON lines
+    file next to it, which test_suite/evaluate.py writes it from, and a
+    ValueError is raised if there is none.
+    """
+    if path.endswith(".npy"):
+        if saved_version(path) == RESULT_VERSION:
+            return load_array(path)
+        source = f"{os.path.splitext(path)[0]}.jsonl"
+        if not os.path.exists(source):
+            raise ValueError(
+                f"{path} was not saved with version {RESULT_VERSION} of the "
+                f"results, and there is no {source} to rebuild it from"
+            )
+        save_array(load_results(source), path, RESULT_VERSION)
+        return load_array(path)
+    with open(path, encoding="utf-8") as file:
+        records = []
+        for line in file:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return results_from_records(records)
+
+
+def filter_results(
+    results: np.ndarray,
+    valid: Optional[bool] = None,
+    correct: Optional[bool] = None,
+    reason: Optional[str] = None,
+) -> np.ndarray:
+    """The results matching every given condition
+
+    Args:
+        results: An array of RESULT_DTYPE
+        valid: Whether the result passed the checker
+        correct: Whether the result matched the label
+        reason: A reason for invalidity the result must include
+    """
+    mask = np.ones(len(results), dtype=bool)
+    if valid is not None:
+        mask &= results["valid"] == valid
+    if correct is not None:
+        mask &= results["correct"] == correct
+    if reason is not None:
+        mask &= np.char.find(results["reasons"], reason) >= 0
+    return results[mask]
+
+
+def join_results(
+    first: np.ndarray, second: np.ndarray, postfixes=("_1", "_2")
+) -> np.ndarray:
+    """Join two result arrays on the ident, keeping the images present in
+    both. The fields other than the ident get the postfix of their array."""
+    return recfunctions.join_by(
+        "ident",
+        np.asarray(first),
+        np.asarray(second),
+        jointype="inner",
+        r1postfix=postfixes[0],
+        r2postfix=postfixes[1],
+        usemask=False,
+    )
+
+
+def diff_results(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """The joined results of the images that are correct in one of the
+    arrays but not in the other"""
+    joined = join_results(first, second)
+    return joined[joined["correct_1"] != joined["correct_2"]]
@@ -0,0 +1,99 @@
+"""Loading of input images, decoding JPEGs at a reduced resolution.
+
+The pipeline resizes every image to a width of 1200 pixels before doing
+anything else, so decoding a 12 megapixel capture at full resolution throws
+most of the work away. JPEG decoders can scale the image down by 1/2, 1/4 or
+1/8 while decoding, which skips most of the inverse DCT and colour
+conversion. load_image uses the largest reduction that still leaves the image
+at least as wide as the target width, so the result of the later resize is
+practically unchanged. Other formats are decoded at full resolution.
+
+Images can be loaded from a path, from bytes, or from a buffer like a
+memoryview of a memory-mapped shard, which is read without copying it first.
+"""
+
+import io
+import time
+from typing import BinaryIO, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+# The width preprocess and the character separator resize images to
+TARGET_WIDTH = 1200
+
+ImageSource = Union[str, bytes, memoryview, BinaryIO]
+
+
+class _BufferFile(io.RawIOBase):
+    """A read-only file over a buffer, so PIL can read from a memoryview
+    without the copy io.BytesIO would make"""
+
+    def __init__(self, buffer):
+        super().__init__()
+        self._buffer = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        end = min(self._position + len(buffer), len(self._buffer))
+        count = end - self._position
+        memoryview(buffer).cast("B")[:count] = self._buffer[
+            self._position : end
+        ]
+        self._position = end
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        start = {
+            io.SEEK_SET: 0,
+            io.SEEK_CUR: self._position,
+            io.SEEK_END: len(self._buffer),
+        }[whence]
+        self._position = max(start + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def _open(source: ImageSource) -> Image.Image:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return Image.open(io.BufferedReader(_BufferFile(source)))
+    return Image.open(source)
+
+
+def load_image(
+    source: ImageSource, target_width: Optional[int] = TARGET_WIDTH
+) -> np.ndarray:
+    """Decode an image into an array, as np.asarray(Image.open(source))
+    does, but at a reduced resolution for JPEGs.
+
+    Args:
+        source: A path, bytes, a buffer or a binary file
+        target_width: The smallest width the image is reduced to, the full
+            resolution if None
+    """
+    with _open(source) as image:
+        if target_width is not None and image.width > target_width:
+            # The draft size is a lower bound, the decoder picks the
+            # smallest scale that keeps the image at least this large
+            image.draft(
+                None,
+                (target_width, image.height * target_width // image.width),
+            )
+        return np.asarray(image)
+
+
+def timed_load_image(
+    source: ImageSource, target_width: Optional[int] = TARGET_WIDTH
+) -> tuple[np.ndarray, float]:
+    """Load an image like load_image, also returning the seconds it took"""
+    started = time.perf_counter()
+    image = load_image(source, target_width)
+    return image, time.perf_counter() - started
@@ -0,0 +1,255 @@
+"""Packed image shards, for fast bulk loading of evaluation and training
+corpora.
+
+A shard is one large file with the encoded images stored back to back,
+unchanged, and an index with the key, label, offset and length of every image.
+Reading a corpus is then a few large sequential reads instead of thousands of
+small files, which matters most on a cold cache and on network storage. The
+shard files are memory-mapped, so several processes can read the same shards
+in parallel without copying them.
+
+A directory of shards is made from a labelled dataset or from a directory
+with one folder of character images per class:
+
+    python -m passport_mrz_reader.utils.shards labelled
+        "data/labeled passport data.csv" "data/images/PRADO MRZ" shards/mrz
+    python -m passport_mrz_reader.utils.shards characters
+        data/images/train/final_trainingset shards/train
+"""
+
+import argparse
+import mmap
+import os
+import pathlib
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from passport_mrz_reader.utils.dataset import (
+    labeled_text,
+    labels_from_csv,
+    sized_dtype,
+)
+from passport_mrz_reader.utils.image_loading import TARGET_WIDTH, load_image
+
+# The key and label columns are widened to the longest of a shard
+INDEX_DTYPE = np.dtype(
+    [("key", "U64"), ("label", "U96"), ("offset", "u8"), ("length", "u8")]
+)
+SHARD_SIZE = 256 * 1024 * 1024
+DATA_SUFFIX = ".shard"
+INDEX_SUFFIX = ".index.npy"
+
+
+class ShardWriter:
+    """Writes (key, label, encoded image) items into numbered shards of a
+    directory, starting a new shard when the current one exceeds shard_size
+    bytes. Use as a context manager, so the last index is written."""
+
+    def __init__(self, directory: str, shard_size: int = SHARD_SIZE):
+        self.directory = directory
+        self.shard_size = shard_size
+        self.shard_number = 0
+        self._file = None
+        self._index: list[tuple[str, str, int, int]] = []
+        os.makedirs(directory, exist_ok=True)
+
+    def _shard_path(self) -> str:
+        return os.path.join(self.directory, f"{self.shard_number:05}")
+
+    def _finish_shard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        index_dtype = sized_dtype(INDEX_DTYPE, self._index)
+        np.save(
+            self._shard_path() + INDEX_SUFFIX,
+            np.array(self._index, dtype=index_dtype),
+            allow_pickle=False,
+        )
+        self._file = None
+        self._index = []
+        self.shard_number += 1
+
+    def write(self, key: str, label: str, data: bytes):
+        """Append an encoded image to the current shard"""
+        if self._file is None:
+            # pylint: disable=consider-using-with
+            self._file = open(self._shard_path() + DATA_SUFFIX, "wb")
+        offset = self._file.tell()
+        self._file.write(data)
+        self._index.append((key, label, offset, len(data)))
+        if self._file.tell() >= self.shard_size:
+            self._finish_shard()
+
+    def close(self):
+        """Write the index of the last shard"""
+        self._finish_shard()
+
+    def __enter__(self) -> "ShardWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class ShardReader:
+    """Reads the images of a single shard through a memory map"""
+
+    def __init__(self, path: str):
+        """Open the shard at a path without suffix, like shards/00000"""
+        self.path = path
+        self.index = np.load(path + INDEX_SUFFIX, allow_pickle=False)
+        with open(path + DATA_SUFFIX, "rb") as file:
+            # An empty file cannot be mapped
+            self._data = (
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if os.fstat(file.fileno()).st_size
+                else b""
+            )
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def encoded(self, index: int) -> memoryview:
+        """The encoded bytes of the image at the index, without copying"""
+        entry = self.index[index]
+        offset, length = int(entry["offset"]), int(entry["length"])
+        return memoryview(self._data)[offset : offset + length]
+
+    def read(
+        self, index: int, target_width: Optional[int] = TARGET_WIDTH
+    ) -> np.ndarray:
+        """The decoded image at the index, see image_loading.load_image"""
+        return load_image(self.encoded(index), target_width)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.read(index)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        return (self[index] for index in range(len(self)))
+
+
+def shard_paths(directory: str) -> list[str]:
+    """The paths, without suffix, of the shards in a directory, in order"""
+    return sorted(
+        str(path)[: -len(INDEX_SUFFIX)]
+        for path in pathlib.Path(directory).glob(f"*{INDEX_SUFFIX}")
+    )
+
+
+def is_shard_directory(directory: str) -> bool:
+    """Whether the directory contains shards"""
+    return bool(shard_paths(directory))
+
+
+@lru_cache(maxsize=None)
+def open_shard(path: str) -> ShardReader:
+    """Open a shard once per process, so workers can read images by
+    (shard path, index) without reopening the shard for every image"""
+    return ShardReader(path)
+
+
+def read_image(
+    location: tuple[str, int], target_width: Optional[int] = TARGET_WIDTH
+) -> np.ndarray:
+    """Read the image at a (shard path, index) location"""
+    path, index = location
+    return open_shard(path).read(index, target_width)
+
+
+def read_index(directory: str) -> list[tuple[str, str, tuple[str, int]]]:
+    """The key, label and (shard path, index) location of every image in the
+    shards of a directory, without reading any image"""
+    return [
+        (str(entry["key"]), str(entry["label"]), (path, index))
+        for path in shard_paths(directory)
+        for index, entry in enumerate(open_shard(path).index)
+    ]
+
+
+def decode_characters(
+    directory: str, grayscale: bool
+) -> Iterator[tuple[str, np.ndarray]]:
+    """Decode the images of the shards in a directory the way cv2.imread
+    does, yielding (label, image). Images that cannot be decoded are
+    skipped."""
+    flags = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    for path in shard_paths(directory):
+        shard = open_shard(path)
+        for index, label in enumerate(shard.index["label"]):
+            image = cv2.imdecode(
+                np.frombuffer(shard.encoded(index), dtype=np.uint8), flags
+            )
+            if image is not None:
+                yield str(label), image
+
+
+def write_files(
+    items: Iterable[tuple[str, str, str]],
+    directory: str,
+    shard_size: int = SHARD_SIZE,
+) -> int:
+    """Pack image files into shards, returning the number of images.
+
+    Args:
+        items: (key, label, file path) of every image
+        directory: The directory to write the shards to
+        shard_size: The approximate size of every shard in bytes
+    """
+    count = 0
+    with ShardWriter(directory, shard_size) as writer:
+        for key, label, file_path in items:
+            with open(file_path, "rb") as file:
+                writer.write(key, label, file.read())
+            count += 1
+    return count
+
+
+def labelled_items(
+    labels_path: str, images_path: str
+) -> Iterator[tuple[str, str, str]]:
+    """(file name, labelled MRZ text, path) of every image of a labelled
+    dataset"""
+    labels = labels_from_csv(labels_path)
+    for file_name, text in zip(labels["file_name"], labeled_text(labels)):
+        yield str(file_name), str(text), os.path.join(images_path, file_name)
+
+
+def character_items(directory: str) -> Iterator[tuple[str, str, str]]:
+    """(relative path, class name, path) of every image in a directory with
+    one folder of character images per class"""
+    for class_dir in sorted(pathlib.Path(directory).iterdir()):
+        if not class_dir.is_dir():
+            continue
+        for file in sorted(class_dir.iterdir()):
+            yield f"{class_dir.name}/{file.name}", class_dir.name, str(file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--shard-size", type=int, default=SHARD_SIZE, help="Bytes per shard"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    labelled = subparsers.add_parser(
+        "labelled", help="Pack the images of a labels CSV file"
+    )
+    labelled.add_argument("labels")
+    labelled.add_argument("images")
+    labelled.add_argument("output")
+    characters = subparsers.add_parser(
+        "characters", help="Pack a directory of character classes"
+    )
+    characters.add_argument("data_dir")
+    characters.add_argument("output")
+    args = parser.parse_args()
+
+    if args.command == "labelled":
+        source = labelled_items(args.labels, args.images)
+    else:
+        source = character_items(args.data_dir)
+    written = write_files(source, args.output, args.shard_size)
+    print(f"Packed {written} images into {args.output}")